@@ -0,0 +1,278 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from main import create_app, DEFAULT_CONFIG, PRODUCTION_CONFIG
+from models import db, User
+from engine_profile import dispose_inherited_connections
+from credentials import is_password_hash, CredentialsBusy
+
+
+class TestAppFactory(unittest.TestCase):
+    def test_production_config(self):
+        app = create_app({**PRODUCTION_CONFIG, 'SECRET_KEY': 'production-test', 'DASHBOARD_PAGE_SIZE': 25})
+        self.assertFalse(app.debug)
+        self.assertFalse(app.config['TEMPLATES_AUTO_RELOAD'])
+        self.assertEqual(app.config['DASHBOARD_PAGE_SIZE'], 25)
+        self.assertEqual(app.test_client().get('/api/v2/stats').status_code, 200)
+
+    def test_production_config_needs_a_secret_key(self):
+        with self.assertRaises(ValueError):
+            create_app(PRODUCTION_CONFIG)
+        with self.assertRaises(ValueError):
+            create_app({**PRODUCTION_CONFIG, 'SECRET_KEY': DEFAULT_CONFIG['SECRET_KEY']})
+
+    def test_apps_are_independent(self):
+        first = create_app({'RESPONSE_CACHE_TTL': 30})
+        second = create_app()
+        self.assertIsNot(first, second)
+        self.assertEqual(first.config['RESPONSE_CACHE_TTL'], 30)
+        self.assertNotIn('RESPONSE_CACHE_TTL', second.config)
+        first_cache, second_cache = first.extensions['response_cache'], second.extensions['response_cache']
+        self.assertEqual((first_cache.ttl, second_cache.ttl), (30, 60))
+        self.assertIsNot(first_cache.backend, second_cache.backend)
+
+    def test_identity_caches_are_per_app(self):
+        first = create_app({'IDENTITY_CACHE_TTL': 1})
+        second = create_app()
+        self.assertEqual((first.extensions['identity_cache'].ttl, second.extensions['identity_cache'].ttl), (1, 300))
+        client = first.test_client()
+        user = {'email': 'per-app@example.com', 'password': 'securepassword', 'name': 'Per App', 'city_from': 'Omsk'}
+        user_id = client.post('/api/v2/users', json=user).get_json()['user']['id']
+        try:
+            with first.app_context():
+                self.assertEqual(first.extensions['identity_cache'].load(user_id).name, 'Per App')
+            self.assertEqual(first.extensions['identity_cache'].stats()['size'], 1)
+            self.assertEqual(second.extensions['identity_cache'].stats()['size'], 0)
+        finally:
+            client.delete(f'/api/users/{user_id}')
+        production = create_app({**PRODUCTION_CONFIG, 'SECRET_KEY': 'production-test'})
+        self.assertEqual(production.extensions['identity_cache'].ttl, 5)
+
+    def test_dispose_inherited_connections(self):
+        app = create_app()
+        with app.app_context():
+            with db.engine.connect():
+                pass
+            self.assertGreater(db.engine.pool.checkedin(), 0)
+        dispose_inherited_connections(app, db)
+        with app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+
+    def test_metrics_endpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = {'METRICS_SAMPLE_RATE': 1.0, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/metrics.db'}
+            app, other = create_app(config), create_app(config)
+            with app.app_context():
+                db.session.add(User(id=1, email='admin@example.com', name='Admin', password='x', city_from='Moscow'))
+                db.session.commit()
+            client = app.test_client()
+            self.assertEqual(client.get('/metrics').status_code, 403)
+            with client.session_transaction() as session:
+                session['_user_id'] = '1'
+            client.get('/api/v2/jobs')
+            client.get('/api/v2/jobs/999999')
+            other.test_client().get('/api/v2/jobs')
+            body = client.get('/metrics').get_data(as_text=True)
+            for each in (app, other):
+                with each.app_context():
+                    db.engine.dispose()
+        self.assertIn('http_requests_total{endpoint="jobslistresource",method="GET",status="200"} 1', body)
+        self.assertIn('http_requests_total{endpoint="jobsresource",method="GET",status="404"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="jobslistresource",method="GET"} 1', body)
+        self.assertRegex(body, r'http_request_sql_statements_total\{endpoint="jobslistresource",method="GET"\} [1-9]')
+
+    def test_metrics_token(self):
+        client = create_app({'METRICS_TOKEN': 's3cret', 'TASK_WORKERS': 0}).test_client()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+        response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_requests_total counter', response.get_data(as_text=True))
+        self.assertEqual(create_app().test_client().get('/metrics', headers={'Authorization': 'Bearer '}).status_code,
+                         403)
+
+    def test_slow_query_log(self):
+        app = create_app({'SLOW_QUERY_THRESHOLD_MS': 0, 'TASK_WORKERS': 0})
+        with self.assertLogs('slow_queries', 'WARNING') as logs:
+            app.test_client().get('/api/v2/jobs/1')
+        self.assertIn('on jobsresource', logs.output[0])
+        self.assertIn('parameters:', logs.output[0])
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.app = create_app({'PROFILE_DIR': self.profile_dir.name, 'PROFILE_KEEP': 2,
+                               'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.database_dir.name}/profiler.db'})
+        with self.app.app_context():
+            db.session.add_all([User(id=1, email='admin@example.com', name='Admin', password='x', city_from='Moscow'),
+                                User(id=2, email='user@example.com', name='User', password='x', city_from='Moscow')])
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.profile_dir.cleanup()
+        self.database_dir.cleanup()
+
+    def log_in(self, user_id):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+
+    def test_profile_requires_admin(self):
+        response = self.client.get('/api/v2/users', headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.log_in(2)
+        response = self.client.get('/api/v2/users?_profile=1')
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.assertEqual(self.client.get('/api/v2/profiles').status_code, 403)
+
+    def test_profile_is_stored(self):
+        self.log_in(1)
+        response = self.client.get('/api/v2/users', headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers['X-Profile-Id']
+
+        profile = self.client.get(f'/api/v2/profiles/{profile_id}').get_json()['profile']
+        self.assertEqual(profile['endpoint'], 'userslistresource')
+        self.assertGreater(profile['sql_count'], 0)
+        self.assertIn('SELECT', profile['sql'][0]['statement'])
+        dump = self.client.get(f'/api/v2/profiles/{profile_id}/pstats')
+        self.assertEqual(dump.status_code, 200)
+        self.assertGreater(len(dump.data), 0)
+
+    def test_profiles_stay_with_their_app(self):
+        with tempfile.TemporaryDirectory() as other_dir:
+            other = create_app({'PROFILE_DIR': other_dir,
+                                'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI']})
+            self.log_in(1)
+            profile_id = self.client.get('/api/v2/jobs?_profile=1').headers['X-Profile-Id']
+            self.assertEqual(os.listdir(other_dir), [])
+            with other.app_context():
+                db.engine.dispose()
+        self.assertIn(f'{profile_id}.json', os.listdir(self.profile_dir.name))
+
+    def test_profiles_are_bounded(self):
+        self.log_in(1)
+        for _ in range(3):
+            self.client.get('/api/v2/jobs?_profile=1')
+        self.assertEqual(len(self.client.get('/api/v2/profiles').get_json()['profiles']), 2)
+        self.assertEqual(self.client.get('/api/v2/profiles/123').status_code, 404)
+
+
+class TestCredentials(unittest.TestCase):
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        self.database_uri = f'sqlite:///{self.database_dir.name}/credentials.db'
+        self.app = create_app({'WTF_CSRF_ENABLED': False, 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+                               'AUTH_THROTTLE_EMAIL_BURST': 2, 'SQLALCHEMY_DATABASE_URI': self.database_uri})
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.session.add(User(email='legacy@example.com', name='Legacy', password='plaintext', city_from='Moscow'))
+            db.session.commit()
+
+    def tearDown(self):
+        for app in (self.app, *getattr(self, 'other_apps', [])):
+            with app.app_context():
+                db.engine.dispose()
+        self.database_dir.cleanup()
+
+    def stored_password(self, email):
+        with self.app.app_context():
+            return db.session.execute(db.select(User.password).where(User.email == email)).scalar()
+
+    def log_in(self, email, password):
+        return self.client.post('/login', data={'email': email, 'password': password})
+
+    def test_api_users_get_hashed_passwords(self):
+        body = {'email': 'hashed@example.com', 'password': 'secret', 'name': 'Hashed', 'city_from': 'Moscow'}
+        self.assertEqual(self.client.post('/api/v2/users', json=body).status_code, 201)
+        self.assertTrue(self.stored_password('hashed@example.com').startswith('pbkdf2:sha256:1000$'))
+        with self.app.app_context():
+            user_id = db.session.execute(db.select(User.id).where(User.email == 'legacy@example.com')).scalar()
+        self.assertEqual(self.client.put(f'/api/users/{user_id}', json={'password': 'changed'}).status_code, 200)
+        self.assertTrue(self.stored_password('legacy@example.com').startswith('pbkdf2:sha256:1000$'))
+
+    def test_login_rehashes_outdated_passwords(self):
+        self.assertEqual(self.log_in('legacy@example.com', 'wrong').status_code, 200)
+        self.assertEqual(self.stored_password('legacy@example.com'), 'plaintext')
+        self.assertEqual(self.log_in('legacy@example.com', 'plaintext').status_code, 302)
+        stored = self.stored_password('legacy@example.com')
+        self.assertTrue(is_password_hash(stored))
+
+        self.app.extensions['credentials'].method = 'pbkdf2:sha256:2000'
+        self.app.extensions['auth_throttle'].reset()
+        self.client.get('/logout')
+        self.assertEqual(self.log_in('legacy@example.com', 'plaintext').status_code, 302)
+        self.assertTrue(self.stored_password('legacy@example.com').startswith('pbkdf2:sha256:2000$'))
+
+    def test_login_is_throttled_per_email(self):
+        for _ in range(2):
+            self.assertEqual(self.log_in('legacy@example.com', 'wrong').status_code, 200)
+        response = self.log_in('LEGACY@example.com', 'plaintext')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        self.assertEqual(self.log_in('other@example.com', 'wrong').status_code, 200)
+
+    def test_throttle_uses_forwarded_address_behind_trusted_proxy(self):
+        proxied = create_app({'WTF_CSRF_ENABLED': False, 'TRUSTED_PROXY_COUNT': 1, 'AUTH_THROTTLE_IP_BURST': 1,
+                              'SQLALCHEMY_DATABASE_URI': self.database_uri})
+        self.other_apps = [proxied]
+        client = proxied.test_client()
+        for address in ('198.51.100.1', '198.51.100.2'):
+            response = client.post('/login', data={'email': f'{address}@example.com', 'password': 'wrong'},
+                                   headers={'X-Forwarded-For': address})
+            self.assertEqual(response.status_code, 200, address)
+        response = client.post('/login', data={'email': 'again@example.com', 'password': 'wrong'},
+                               headers={'X-Forwarded-For': '198.51.100.1'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.log_in('legacy@example.com', 'wrong').status_code, 200)
+
+    def busy_app(self, **config):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': self.database_uri, 'PASSWORD_HASH_WORKERS': 1,
+                          'PASSWORD_HASH_QUEUE': 0, **config})
+        self.other_apps = [app]
+        return app, app.extensions['credentials']
+
+    def test_hash_timeout_keeps_its_slot(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        _, service = self.busy_app(PASSWORD_HASH_TIMEOUT=0.01)
+        try:
+            with self.assertRaises(CredentialsBusy):
+                service._run(slow_hash)
+            self.assertTrue(started.is_set())
+            with self.assertRaises(CredentialsBusy):
+                service._run(str)
+            release.set()
+            service.timeout = 5
+            deadline = time.monotonic() + 5
+            while not service._slots.acquire(blocking=False) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            service._slots.release()
+            self.assertEqual(service._run(str, 'hash'), 'hash')
+        finally:
+            release.set()
+
+    def test_hashing_queue_is_bounded(self):
+        app, service = self.busy_app()
+        service._slots.acquire()
+        response = app.test_client().post('/api/v2/users', json={
+            'email': 'busy@example.com', 'password': 'secret', 'name': 'Busy', 'city_from': 'Moscow'
+        })
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.post('/api/v2/users', json={
+            'email': 'free@example.com', 'password': 'secret', 'name': 'Free', 'city_from': 'Moscow'
+        }).status_code, 201)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+"""ASGI entry point: the hot /api/v2 reads run as async views, everything else is the WSGI app.
+
+Run with any ASGI server, for example:
+
+    uvicorn asgi:application --workers 4
+
+Requires ``aiosqlite`` and ``greenlet`` (SQLAlchemy's asyncio extension) and ``asgiref``.
+GET /api/v2/jobs, /api/v2/jobs/<id>, /api/v2/users and /api/v2/users/<id> are answered
+on the event loop through an async engine, with the same ETags, 304 answers and response
+cache entries as the WSGI views. All other requests, including every write, are handed to
+the Flask app on the asgiref thread pool, so the WSGI entry point (wsgi.py) keeps working
+unchanged. The async views bypass the Flask request hooks, so /metrics and the request
+profiler do not see them. Each server process starts its task workers on lifespan
+startup and stops them on shutdown.
+"""
+import re
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+
+from main import create_app, PRODUCTION_CONFIG
+from models import db, Jobs, User
+from core_lists import JOB_LIST_STATEMENTS, USER_LIST_STATEMENT, split_group
+from engine_profile import get_profile, install_pragmas
+from listing import job_filters, parse_page_args
+from serializers import dumps, job_schema, user_schema
+from versions import (collect_table_versions, entity_etag, entity_version_statement, list_etag,
+                      matches_client_copy, table_versions_statement)
+
+
+def create_engine_for(flask_app):
+    with flask_app.app_context():
+        url = db.engine.url
+    profile = get_profile(flask_app.config)
+    engine = create_async_engine(
+        url.set(drivername='sqlite+aiosqlite'),
+        pool_size=profile['pool_size'],
+        max_overflow=profile['max_overflow'],
+        connect_args={'timeout': profile['pragmas'].get('busy_timeout', 5000) / 1000},
+    )
+    install_pragmas(engine.sync_engine, profile['pragmas'])
+    return engine
+
+
+async def cached_body(cache, key, build, version):
+    """Like ``AppResponseCache.json_response``: a cached body is only served for ``version``."""
+    if cache.enabled:
+        cached = cache.backend.get(key)
+        if cached is not None and cached[0] == version:
+            return 200, cached[1]
+    payload, status = await build()
+    body = dumps(payload) + b'\n'
+    if cache.enabled and status == 200:
+        cache.backend.set(key, (version, body), cache.ttl)
+    return status, body
+
+
+async def conditional_body(cache, client, key, validators, build):
+    """The async ``versions.conditional_response``: returns status, body, ETag and Last-Modified."""
+    etag, last_modified = validators
+    if etag is not None and matches_client_copy(*client, etag, last_modified):
+        return 304, b'', etag, last_modified
+    status, body = await cached_body(cache, key, build, etag)
+    if status != 200:
+        return status, body, None, None
+    return status, body, etag, last_modified
+
+
+async def list_validators(engine, view, args, tables):
+    async with engine.connect() as connection:
+        rows = (await connection.execute(table_versions_statement(tables))).all()
+    return list_etag(view, args, tables, collect_table_versions(tables, rows))
+
+
+async def entity_validators(engine, model, entity_id, view):
+    async with engine.connect() as connection:
+        row = (await connection.execute(entity_version_statement(model, entity_id))).first()
+    return entity_etag(view, entity_id, row)
+
+
+async def list_jobs(engine, cache, args, client):
+    try:
+        after_id, limit = parse_page_args(args)
+        filters = job_filters(args)
+    except ValueError as e:
+        return 400, dumps({'error': str(e)}), None, None
+
+    async def build():
+        _, _, statement = JOB_LIST_STATEMENTS[False]
+        if after_id is not None:
+            filters.append(Jobs.id > after_id)
+        statement = statement.where(*filters).order_by(Jobs.id).limit(limit + 1)
+        async with engine.connect() as connection:
+            rows = (await connection.execute(statement)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].id
+        jobs_list = [job_schema.dump_row(row, categories=split_group(row[-1])) for row in rows]
+        return {'jobs': jobs_list, 'next': next_cursor}, 200
+
+    validators = await list_validators(engine, 'jobs-v2', args, ('jobs',))
+    return await conditional_body(cache, client, cache.list_key('jobs', 'v2', args), validators, build)
+
+
+async def show_job(engine, cache, args, client, job_id):
+    async def build():
+        _, _, statement = JOB_LIST_STATEMENTS[False]
+        async with engine.connect() as connection:
+            row = (await connection.execute(statement.where(Jobs.id == job_id))).first()
+        if row is None:
+            return {'error': 'Job not found'}, 404
+        return {'job': job_schema.dump_row(row, categories=split_group(row[-1]))}, 200
+
+    validators = await entity_validators(engine, Jobs, job_id, 'jobs-v2')
+    return await conditional_body(cache, client, cache.entity_key('jobs', 'v2', job_id), validators, build)
+
+
+async def list_users(engine, cache, args, client):
+    async def build():
+        async with engine.connect() as connection:
+            rows = (await connection.execute(USER_LIST_STATEMENT)).all()
+        return {'users': user_schema.dump_rows(rows)}, 200
+
+    validators = await list_validators(engine, 'users-v2', args, ('users',))
+    return await conditional_body(cache, client, cache.list_key('users', 'v2', args), validators, build)
+
+
+async def show_user(engine, cache, args, client, user_id):
+    async def build():
+        async with engine.connect() as connection:
+            row = (await connection.execute(USER_LIST_STATEMENT.where(User.id == user_id))).first()
+        if row is None:
+            return {'error': 'User not found'}, 404
+        return {'user': user_schema.dump_row(row)}, 200
+
+    validators = await entity_validators(engine, User, user_id, 'users-v2')
+    return await conditional_body(cache, client, cache.entity_key('users', 'v2', user_id), validators, build)
+
+
+ROUTES = [
+    (re.compile(r'/api/v2/jobs'), list_jobs),
+    (re.compile(r'/api/v2/jobs/(\d+)'), show_job),
+    (re.compile(r'/api/v2/users'), list_users),
+    (re.compile(r'/api/v2/users/(\d+)'), show_user),
+]
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = create_engine_for(flask_app)
+        self.cache = flask_app.extensions['response_cache']
+        self.task_queue = flask_app.extensions['task_queue']
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for pattern, view in ROUTES:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    return await self.respond(scope, send, view, match)
+        return await self.wsgi(scope, receive, send)
+
+    async def respond(self, scope, send, view, match):
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        headers = dict(scope['headers'])
+        client = (parse_etags(headers.get(b'if-none-match', b'').decode('latin-1') or None),
+                  parse_date(headers.get(b'if-modified-since', b'').decode('latin-1') or None))
+        try:
+            status, body, etag, last_modified = await view(
+                self.engine, self.cache, args, client, *(int(group) for group in match.groups())
+            )
+        except Exception as e:
+            status, body, etag, last_modified = 500, dumps({'error': f"Database error: {str(e)}"}), None, None
+        response_headers = [(b'content-length', str(len(body)).encode())]
+        if status != 304:
+            response_headers.append((b'content-type', b'application/json'))
+        if etag is not None:
+            response_headers.append((b'etag', quote_etag(etag).encode()))
+        if last_modified is not None:
+            response_headers.append((b'last-modified', http_date(last_modified).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.task_queue.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.task_queue.stop(timeout=5)
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncAPI(create_app(PRODUCTION_CONFIG))
@@ -0,0 +1,95 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sqlite3
+import unittest
+from main import create_app
+from models import db
+
+app = create_app()
+ASYNC_DEPENDENCIES = all(importlib.util.find_spec(name) for name in ('aiosqlite', 'asgiref', 'greenlet'))
+
+
+async def call(application, method, path, query=b'', headers=()):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': query,
+             'headers': [(b'host', b'testserver'), *headers], 'server': ('testserver', 80),
+             'client': ('127.0.0.1', 1234)}
+    await application(scope, receive, send)
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return status, body, dict(messages[0]['headers'])
+
+
+@unittest.skipUnless(ASYNC_DEPENDENCIES, "aiosqlite, asgiref and greenlet are required for the ASGI app")
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault('FLASK_SECRET_KEY', 'asgi-test')
+        from asgi import application
+        self.application = application
+        self.client = app.test_client()
+
+    def test_async_views_match_wsgi_views(self):
+        job_data = {
+            "job_title": "Async job",
+            "team_leader_id": 1,
+            "work_size": 5,
+            "collaborators": "2",
+            "category_ids": [1]
+        }
+        job_id = json.loads(self.client.post('/api/v2/jobs', json=job_data).data)['job']['id']
+        for path, query in (('/api/v2/jobs', b'limit=5'), (f'/api/v2/jobs/{job_id}', b''), ('/api/v2/users', b'')):
+            with self.subTest(path=path):
+                status, body, _ = asyncio.run(call(self.application, 'GET', path, query))
+                self.assertEqual(status, 200)
+                expected = self.client.get(f'{path}?{query.decode()}')
+                self.assertEqual(json.loads(body), json.loads(expected.data))
+
+    def test_async_views_answer_conditional_requests(self):
+        job_data = {"job_title": "Async etag", "team_leader_id": 1, "work_size": 3}
+        job_id = json.loads(self.client.post('/api/v2/jobs', json=job_data).data)['job']['id']
+        path = f'/api/v2/jobs/{job_id}'
+        status, _, headers = asyncio.run(call(self.application, 'GET', path))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'etag'].decode(), self.client.get(path).headers['ETag'])
+        self.assertIn(b'last-modified', headers)
+        conditional = [(b'if-none-match', headers[b'etag'])]
+        status, body, _ = asyncio.run(call(self.application, 'GET', path, headers=conditional))
+        self.assertEqual((status, body), (304, b''))
+
+        with app.app_context():
+            database = db.engine.url.database
+        connection = sqlite3.connect(database)
+        with connection:
+            connection.execute('UPDATE jobs SET job_title = ?, version = version + 1 WHERE id = ?',
+                               ('Edited elsewhere', job_id))
+        connection.close()
+        status, body, changed = asyncio.run(call(self.application, 'GET', path, headers=conditional))
+        self.assertEqual(status, 200)
+        self.assertNotEqual(changed[b'etag'], headers[b'etag'])
+        self.assertEqual(json.loads(body)['job']['job_title'], 'Edited elsewhere')
+        self.client.delete(path)
+
+    def test_writes_fall_through_to_wsgi(self):
+        status, body, _ = asyncio.run(call(self.application, 'DELETE', '/api/v2/jobs/999999'))
+        self.assertEqual(status, 404)
+        self.assertEqual(json.loads(body)['error'], 'Job not found')
+
+    def test_async_view_errors(self):
+        status, body, _ = asyncio.run(call(self.application, 'GET', '/api/v2/jobs', b'limit=0'))
+        self.assertEqual(status, 400)
+        status, body, _ = asyncio.run(call(self.application, 'GET', '/api/v2/jobs/999999'))
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Generate seeded synthetic databases for the benchmark suite.
+
+Run from the repository root:
+
+    python -m benchmarks.dataset --scale 100k --path /tmp/bench-100k.db
+
+The same scale and seed always produce the same rows, so results taken on
+different commits are comparable. The rows come from data_cli.synthetic_tables
+and are written by data_cli.load_tables, the loader behind `flask data seed`.
+"""
+import argparse
+import os
+import time
+
+from main import create_app
+from models import db
+from data_cli import load_tables, synthetic_shape, synthetic_tables
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+# Part of the cached file name: bump it whenever synthetic_tables generates different
+# rows, so that benchmarks never reuse a database built by an older generator.
+DATASET_VERSION = 1
+
+dataset_shape = synthetic_shape
+
+
+def dataset_path(directory, scale, seed):
+    return os.path.join(directory, f'bench-{scale}-seed{seed}-v{DATASET_VERSION}.db')
+
+
+def build_database(path, job_count, seed=42):
+    """Create (or reuse) a database file at ``path`` holding the synthetic dataset."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    building = path + '.building'
+    if os.path.exists(building):
+        os.remove(building)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(building)}',
+                      'DATABASE_PROFILE': 'default', 'METRICS_ENABLED': False, 'PROFILER_ENABLED': False})
+    with app.app_context():
+        load_tables(db.engine, synthetic_tables(job_count, seed))
+        db.engine.dispose()
+    os.replace(building, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--path', required=True)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build_database(args.path, SCALES[args.scale], args.seed)
+    shape = dataset_shape(SCALES[args.scale])
+    print(f'{args.path}: {shape} in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
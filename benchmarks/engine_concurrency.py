@@ -0,0 +1,97 @@
+"""Compare request throughput of the SQLite engine profiles under concurrent load.
+
+Run from the repository root:
+
+    python -m benchmarks.engine_concurrency --threads 16 --seconds 5
+
+Each worker thread runs a mix of short read and write transactions, the same
+shape as the API's GET and PUT handlers, against a fresh temporary database.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from engine_profile import PROFILES, get_profile, engine_options, install_pragmas
+
+
+def prepare_database(engine, rows):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE jobs (id INTEGER PRIMARY KEY, job_title VARCHAR NOT NULL, '
+            'work_size INTEGER NOT NULL, is_finished BOOLEAN)'
+        ))
+        connection.execute(
+            text('INSERT INTO jobs (job_title, work_size, is_finished) VALUES (:title, :size, 0)'),
+            [{'title': f'Job {index}', 'size': index % 100} for index in range(rows)]
+        )
+
+
+def worker(engine, rows, write_ratio, deadline, counters, lock):
+    done = errors = 0
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        job_id = rng.randint(1, rows)
+        try:
+            if rng.random() < write_ratio:
+                with engine.begin() as connection:
+                    connection.execute(
+                        text('UPDATE jobs SET is_finished = NOT is_finished WHERE id = :id'), {'id': job_id}
+                    )
+            else:
+                with engine.connect() as connection:
+                    connection.execute(text('SELECT * FROM jobs WHERE id = :id'), {'id': job_id}).fetchall()
+                    connection.execute(text('SELECT count(*) FROM jobs WHERE work_size > 50')).scalar()
+            done += 1
+        except OperationalError:
+            errors += 1
+    with lock:
+        counters['ops'] += done
+        counters['errors'] += errors
+
+
+def run_profile(name, threads, seconds, rows, write_ratio):
+    directory = tempfile.mkdtemp()
+    uri = f'sqlite:///{os.path.join(directory, "bench.db")}'
+    profile = get_profile({'DATABASE_PROFILE': name})
+    engine = create_engine(uri, **engine_options(profile, uri))
+    install_pragmas(engine, profile['pragmas'])
+    prepare_database(engine, rows)
+
+    counters = {'ops': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    pool = [threading.Thread(target=worker, args=(engine, rows, write_ratio, deadline, counters, lock))
+            for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    engine.dispose()
+    return counters['ops'] / seconds, counters['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES))
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.profiles:
+        results[name] = run_profile(name, args.threads, args.seconds, args.rows, args.write_ratio)
+        print(f'{name:>10}: {results[name][0]:10.0f} ops/s  {results[name][1]:6d} lock errors')
+    if 'default' in results and 'wal' in results and results['default'][0]:
+        print(f'{"speedup":>10}: {results["wal"][0] / results["default"][0]:10.2f}x')
+
+
+if __name__ == '__main__':
+    main()
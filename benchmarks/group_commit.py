@@ -0,0 +1,110 @@
+"""Compare PUT /api/v2/jobs/<id> throughput with and without group commit.
+
+Run from the repository root:
+
+    python -m benchmarks.group_commit --threads 32 --seconds 5
+
+Concurrent threads flip is_finished on random jobs of a seeded synthetic
+database (see benchmarks.dataset) through the Flask test client, first with one
+commit per request and then with GROUP_COMMIT_ENABLED, once for every
+synchronous setting. Each run works on a fresh copy of the database.
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from main import create_app, PRODUCTION_CONFIG
+from models import db
+from benchmarks.dataset import SCALES, build_database, dataset_path, dataset_shape
+from benchmarks.http_load import percentile_ms
+
+
+def writer(app, shape, deadline, seed, latencies, statuses, lock):
+    rng = random.Random(seed)
+    client = app.test_client()
+    local_latencies = []
+    local_statuses = {}
+    while time.perf_counter() < deadline:
+        body = {'job_title': f'Benchmark job {seed}', 'team_leader_id': rng.randint(1, shape['users']),
+                'work_size': rng.randint(1, 100), 'is_finished': rng.random() < 0.5}
+        started = time.perf_counter()
+        response = client.put(f'/api/v2/jobs/{rng.randint(1, shape["jobs"])}', json=body)
+        response.get_data()
+        local_latencies.append(time.perf_counter() - started)
+        local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+    with lock:
+        latencies.extend(local_latencies)
+        for status, count in local_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+
+def run_mode(dataset, shape, synchronous, group, args):
+    with tempfile.TemporaryDirectory() as scratch:
+        path = shutil.copyfile(dataset, os.path.join(scratch, 'bench.db'))
+        app = create_app({
+            **PRODUCTION_CONFIG,
+            'SECRET_KEY': 'benchmark',
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'SQLITE_PRAGMAS': {'synchronous': synchronous},
+            'DATABASE_POOL_SIZE': args.threads + 1,
+            'METRICS_ENABLED': False,
+            'PROFILER_ENABLED': False,
+            'TASK_WORKERS': 0,
+            'GROUP_COMMIT_ENABLED': group,
+            'GROUP_COMMIT_WINDOW_MS': args.window_ms,
+        })
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        threads = [threading.Thread(target=writer, args=(app, shape, deadline, seed, latencies, statuses, lock))
+                   for seed in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        app.extensions['task_queue'].stop(timeout=5)
+        with app.app_context():
+            db.engine.dispose()
+    latencies.sort()
+    return {
+        'writes_per_second': statuses.get(200, 0) / args.seconds,
+        'p50_ms': percentile_ms(latencies, 0.50),
+        'p99_ms': percentile_ms(latencies, 0.99),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='10k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--window-ms', type=float, default=5)
+    parser.add_argument('--synchronous', nargs='+', default=['NORMAL', 'FULL'])
+    parser.add_argument('--data-dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+    logging.getLogger('slow_queries').setLevel(logging.ERROR)
+
+    job_count = SCALES[args.scale]
+    dataset = build_database(dataset_path(args.data_dir, args.scale, args.seed), job_count, args.seed)
+    shape = dataset_shape(job_count)
+    for synchronous in args.synchronous:
+        results = {}
+        for name, group in (('per-request', False), ('group', True)):
+            results[name] = result = run_mode(dataset, shape, synchronous, group, args)
+            print(f'synchronous={synchronous:<6} {name:>11}: {result["writes_per_second"]:8.0f} writes/s  '
+                  f'p50 {result["p50_ms"]:7.2f} ms  p99 {result["p99_ms"]:7.2f} ms  statuses {result["statuses"]}')
+        if results['per-request']['writes_per_second']:
+            speedup = results['group']['writes_per_second'] / results['per-request']['writes_per_second']
+            print(f'synchronous={synchronous:<6} {"speedup":>11}: {speedup:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
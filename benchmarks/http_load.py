@@ -0,0 +1,121 @@
+"""Closed-loop HTTP load generator for comparing deployment modes.
+
+Start the server under test, then point the generator at it, e.g.:
+
+    flask --app main run --port 5000 --with-threads
+    uvicorn asgi:application --port 8000 --workers 1
+    python -m benchmarks.http_load --connections 1000 --seconds 10 \\
+        http://127.0.0.1:5000/api/v2/jobs http://127.0.0.1:8000/api/v2/jobs
+
+Each connection sends keep-alive GET requests back to back (reconnecting when the
+server closes the connection) and the tool reports throughput, latency percentiles
+and failures per URL.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        headers['connection'] = 'close'
+    return status, headers.get('connection', '').lower() == 'close'
+
+
+async def connection_loop(url, deadline, latencies, failures):
+    parts = urlsplit(url)
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = (f'GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: keep-alive\r\n\r\n').encode()
+    writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            writer.write(request)
+            status, closed = await read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+            continue
+        if status >= 400:
+            failures[f'HTTP {status}'] = failures.get(f'HTTP {status}', 0) + 1
+        else:
+            latencies.append(time.perf_counter() - started)
+        if closed:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile_ms(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def run(url, connections, seconds):
+    latencies = []
+    failures = {}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(connection_loop(url, deadline, latencies, failures) for _ in range(connections)))
+    latencies.sort()
+    return {
+        'url': url,
+        'connections': connections,
+        'seconds': seconds,
+        'requests': len(latencies),
+        'throughput': len(latencies) / seconds,
+        'p50_ms': percentile_ms(latencies, 0.50),
+        'p95_ms': percentile_ms(latencies, 0.95),
+        'p99_ms': percentile_ms(latencies, 0.99),
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--json', action='store_true', help='print raw results as JSON')
+    args = parser.parse_args()
+
+    results = [asyncio.run(run(url, args.connections, args.seconds)) for url in args.urls]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        latency = '  '.join(f'{name} {result[name + "_ms"]:8.1f} ms' if result[name + '_ms'] is not None
+                            else f'{name}      n/a' for name in ('p50', 'p95', 'p99'))
+        print(f'{result["url"]}\n  {result["throughput"]:9.1f} req/s  {latency}  failures {result["failures"]}')
+
+
+if __name__ == '__main__':
+    main()
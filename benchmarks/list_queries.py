@@ -0,0 +1,117 @@
+"""Compare list endpoint throughput of the ORM path and the Core fast path.
+
+Run from the repository root:
+
+    python -m benchmarks.list_queries --jobs 100000 --limit 100
+
+Builds a temporary database with the application's schema, then walks the whole
+jobs table page by page the way GET /api/v2/jobs does, and times a full
+GET /api/users listing, once through ORM instances and once through core_lists.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask import Flask
+
+from models import db, Jobs, User, Category, job_category
+from loading import JOBS_LIST_LOADING, USERS_LIST_LOADING
+from listing import keyset_page
+from serializers import dumps, job_schema, user_v1_schema
+from core_lists import fast_job_list, fast_user_v1_list
+
+CATEGORIES = ['Engineering', 'Science', 'Management', 'Research', 'Operations']
+
+
+def seed(job_count, user_count, seed_value=42):
+    rng = random.Random(seed_value)
+    with db.engine.begin() as connection:
+        connection.execute(db.insert(Category), [{'name': name} for name in CATEGORIES])
+        connection.execute(db.insert(User), [
+            {'email': f'user{index}@example.com', 'password': 'x', 'name': f'User {index}', 'city_from': 'Moscow'}
+            for index in range(1, user_count + 1)
+        ])
+        connection.execute(db.insert(Jobs), [
+            {'job_title': f'Job {index}', 'team_leader_id': rng.randint(1, user_count),
+             'work_size': rng.randint(1, 100), 'collaborators': f'{rng.randint(1, user_count)}',
+             'is_finished': rng.random() < 0.3}
+            for index in range(1, job_count + 1)
+        ])
+        connection.execute(job_category.insert(), [
+            {'job_id': job_id, 'category_id': category_id}
+            for job_id in range(1, job_count + 1)
+            for category_id in rng.sample(range(1, len(CATEGORIES) + 1), rng.randint(0, 3))
+        ])
+
+
+def orm_job_page(after_id, limit):
+    jobs, next_cursor = keyset_page(Jobs.query.options(*JOBS_LIST_LOADING), Jobs.id, after_id, limit)
+    return dumps({'jobs': job_schema.dump_many(jobs), 'next': next_cursor}), next_cursor
+
+
+def core_job_page(after_id, limit):
+    jobs_list, next_cursor = fast_job_list([], after_id, limit)
+    return dumps({'jobs': jobs_list, 'next': next_cursor}), next_cursor
+
+
+def orm_users():
+    return dumps({'users': user_v1_schema.dump_many(User.query.options(*USERS_LIST_LOADING).all())})
+
+
+def core_users():
+    return dumps({'users': fast_user_v1_list()})
+
+
+def walk_jobs(page, limit):
+    pages = 0
+    after_id = None
+    started = time.perf_counter()
+    while True:
+        _, after_id = page(after_id, limit)
+        db.session.remove()
+        pages += 1
+        if after_id is None:
+            return pages, time.perf_counter() - started
+
+
+def time_users(listing, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        listing()
+        db.session.remove()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed(args.jobs, args.users)
+        assert orm_job_page(None, args.limit)[0] == core_job_page(None, args.limit)[0]
+
+        print(f'{args.jobs} jobs, {args.users} users, page size {args.limit}')
+        results = {}
+        for name, page in (('orm', orm_job_page), ('core', core_job_page)):
+            pages, elapsed = walk_jobs(page, args.limit)
+            results[name] = pages / elapsed
+            print(f'{"jobs " + name:>12}: {results[name]:10.1f} pages/s  {args.jobs / elapsed:12.0f} rows/s')
+        print(f'{"speedup":>12}: {results["core"] / results["orm"]:10.2f}x')
+        for name, listing in (('orm', orm_users), ('core', core_users)):
+            results[name] = time_users(listing, args.repeat)
+            print(f'{"users " + name:>12}: {results[name] * 1000:10.1f} ms per listing')
+        print(f'{"speedup":>12}: {results["orm"] / results["core"]:10.2f}x')
+
+
+if __name__ == '__main__':
+    main()
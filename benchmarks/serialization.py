@@ -0,0 +1,96 @@
+"""Compare the hand-built dict + stdlib json path with the precompiled serializers.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization --rows 10000 --repeat 20
+
+Rows come from an in-memory SQLite jobs table, read once as plain objects (the
+shape the ORM hands to the resources) and once as Core result rows.
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+from serializers import JSON_BACKEND, dumps, job_schema
+
+
+def load_rows(count):
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE jobs (id INTEGER PRIMARY KEY, job_title VARCHAR, team_leader_id INTEGER, '
+            'work_size INTEGER, collaborators VARCHAR, is_finished BOOLEAN)'
+        ))
+        connection.execute(
+            text('INSERT INTO jobs (job_title, team_leader_id, work_size, collaborators, is_finished) '
+                 'VALUES (:title, :leader, :size, :collaborators, :finished)'),
+            [{'title': f'Job number {index} – проверка', 'leader': index % 50, 'size': index % 100,
+              'collaborators': '2, 3, 5', 'finished': index % 3 == 0} for index in range(count)]
+        )
+        rows = connection.execute(text(f'SELECT {", ".join(job_schema.fields)} FROM jobs ORDER BY id')).all()
+    categories = ['Engineering', 'Science']
+    objects = [SimpleNamespace(**row._mapping, categories=[SimpleNamespace(name=name) for name in categories])
+               for row in rows]
+    return objects, rows, {row.id: categories for row in rows}
+
+
+def handwritten(jobs, categories):
+    jobs_list = []
+    for job in jobs:
+        job_dict = {
+            'id': job.id,
+            'job_title': job.job_title,
+            'team_leader_id': job.team_leader_id,
+            'work_size': job.work_size,
+            'collaborators': job.collaborators,
+            'is_finished': job.is_finished,
+            'categories': [category.name for category in job.categories]
+        }
+        jobs_list.append(job_dict)
+    return json.dumps({'jobs': jobs_list}).encode()
+
+
+def schema_objects(jobs, categories):
+    return dumps({'jobs': job_schema.dump_many(jobs)})
+
+
+def schema_rows(rows, categories):
+    return dumps({'jobs': [job_schema.dump_row(row, categories=categories[row[0]]) for row in rows]})
+
+
+def measure(function, source, categories, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(source, categories)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    objects, rows, categories = load_rows(args.rows)
+    assert json.loads(handwritten(objects, categories)) == json.loads(schema_objects(objects, categories))
+    assert json.loads(schema_objects(objects, categories)) == json.loads(schema_rows(rows, categories))
+
+    print(f'{args.rows} rows, best of {args.repeat}, JSON backend: {JSON_BACKEND}')
+    baseline = None
+    for name, function, source in (('handwritten + json', handwritten, objects),
+                                   ('schema (objects)', schema_objects, objects),
+                                   ('schema (core rows)', schema_rows, rows)):
+        elapsed = measure(function, source, categories, args.repeat)
+        baseline = baseline or elapsed
+        print(f'{name:>20}: {elapsed * 1000:8.2f} ms  {args.rows / elapsed:12.0f} rows/s  '
+              f'{baseline / elapsed:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
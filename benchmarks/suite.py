@@ -0,0 +1,261 @@
+"""Reproducible benchmark suite for the /api and /api/v2 endpoints.
+
+Run from the repository root:
+
+    python -m benchmarks.suite --scale 1k --scale 100k --output results.json
+    python -m benchmarks.suite --scale 1m --requests 50 --http-seconds 10 --output results-1m.json
+
+For every scale a seeded synthetic database is generated once (see
+benchmarks.dataset) and copied to a scratch file, so write scenarios never leak
+into the next run. Every endpoint is then driven through the Flask test client,
+and the read endpoints are driven through a real HTTP server with the
+benchmarks.http_load generator. p50/p95/p99 latency, throughput, status counts
+and the process peak RSS are written to a JSON file that can be diffed across
+commits with --compare.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from main import create_app, PRODUCTION_CONFIG
+from models import db
+from benchmarks.dataset import SCALES, build_database, dataset_path, dataset_shape
+from benchmarks.http_load import percentile_ms, run as run_http_load
+
+SEARCH_TERMS = ['rover', 'solar', 'oxygen', 'antenna', 'habitat', 'Watney', 'Lewis']
+STATS_GROUPS = ['leaders', 'categories', 'departments']
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def read_endpoints(shape):
+    """(name, share of --requests, url factory) for every GET endpoint under /api."""
+    jobs, users, departments = shape['jobs'], shape['users'], shape['departments']
+    return [
+        ('GET /api/jobs', 1, lambda rng: f'/api/jobs?after_id={rng.randint(0, jobs)}'),
+        ('GET /api/jobs/<id>', 1, lambda rng: f'/api/jobs/{rng.randint(1, jobs)}'),
+        ('GET /api/users', 0.1, lambda rng: '/api/users'),
+        ('GET /api/users/<id>', 1, lambda rng: f'/api/users/{rng.randint(1, users)}'),
+        ('GET /users_show/<id>', 1, lambda rng: f'/users_show/{rng.randint(1, users)}'),
+        ('GET /api/v2/jobs', 1, lambda rng: f'/api/v2/jobs?after_id={rng.randint(0, jobs)}'),
+        ('GET /api/v2/jobs?filters', 1, lambda rng: f'/api/v2/jobs?is_finished=true&category_id={rng.randint(1, 20)}'),
+        ('GET /api/v2/jobs/<id>', 1, lambda rng: f'/api/v2/jobs/{rng.randint(1, jobs)}'),
+        ('GET /api/v2/jobs/search', 1, lambda rng: f'/api/v2/jobs/search?q={rng.choice(SEARCH_TERMS)}'),
+        ('GET /api/v2/jobs/export', 0.05, lambda rng: '/api/v2/jobs/export'),
+        ('GET /api/v2/users', 0.1, lambda rng: '/api/v2/users'),
+        ('GET /api/v2/users/<id>', 1, lambda rng: f'/api/v2/users/{rng.randint(1, users)}'),
+        ('GET /api/v2/users/<id>/jobs', 1, lambda rng: f'/api/v2/users/{rng.randint(1, users)}/jobs'),
+        ('GET /api/v2/users/search', 1, lambda rng: f'/api/v2/users/search?q={rng.choice(["Mark", "Beth", "Rick"])}'),
+        ('GET /api/v2/users/export', 0.05, lambda rng: '/api/v2/users/export'),
+        ('GET /api/v2/departments/search', 1,
+         lambda rng: f'/api/v2/departments/search?q=department+{rng.randint(1, departments)}'),
+        ('GET /api/v2/stats', 1, lambda rng: '/api/v2/stats'),
+        ('GET /api/v2/stats/<group>', 1, lambda rng: f'/api/v2/stats/{rng.choice(STATS_GROUPS)}'),
+        ('GET /api/v2/cache/stats', 1, lambda rng: '/api/v2/cache/stats'),
+    ]
+
+
+class Recorder:
+    def __init__(self):
+        self.results = {}
+
+    def call(self, name, send, *args, **kwargs):
+        started = time.perf_counter()
+        response = send(*args, **kwargs)
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        entry = self.results.setdefault(name, {'latencies': [], 'statuses': {}})
+        entry['latencies'].append(elapsed)
+        entry['statuses'][response.status_code] = entry['statuses'].get(response.status_code, 0) + 1
+        return response
+
+    def summary(self):
+        summary = []
+        for name, entry in self.results.items():
+            latencies = sorted(entry['latencies'])
+            summary.append({
+                'endpoint': name,
+                'requests': len(latencies),
+                'throughput': len(latencies) / sum(latencies),
+                'p50_ms': percentile_ms(latencies, 0.50),
+                'p95_ms': percentile_ms(latencies, 0.95),
+                'p99_ms': percentile_ms(latencies, 0.99),
+                'statuses': {str(status): count for status, count in sorted(entry['statuses'].items())},
+            })
+        return summary
+
+
+def write_jobs(client, recorder, rng, shape, serial):
+    body = {'job_title': f'Benchmark job {serial}', 'team_leader_id': rng.randint(1, shape['users']),
+            'work_size': rng.randint(1, 100), 'collaborators': str(rng.randint(1, shape['users'])),
+            'category_ids': [rng.randint(1, shape['categories'])]}
+    created = recorder.call('POST /api/v2/jobs', client.post, '/api/v2/jobs', json=body).get_json() or {}
+    if 'job' in created:
+        job_id = created['job']['id']
+        recorder.call('PUT /api/v2/jobs/<id>', client.put, f'/api/v2/jobs/{job_id}',
+                      json={**body, 'work_size': rng.randint(1, 100), 'is_finished': True})
+        recorder.call('DELETE /api/v2/jobs/<id>', client.delete, f'/api/v2/jobs/{job_id}')
+
+    body = {'job_title': f'Benchmark v1 job {serial}', 'team_leader_id': rng.randint(1, shape['users']),
+            'work_size': rng.randint(1, 100), 'collaborators': str(rng.randint(1, shape['users'])),
+            'categories': [rng.randint(1, shape['categories'])]}
+    created = recorder.call('POST /api/jobs', client.post, '/api/jobs', json=body).get_json() or {}
+    if 'job' in created:
+        job_id = created['job']['id']
+        recorder.call('PUT /api/jobs/<id>', client.put, f'/api/jobs/{job_id}', json={'work_size': 7})
+        recorder.call('DELETE /api/jobs/<id>', client.delete, f'/api/jobs/{job_id}')
+
+    items = [{'job_title': f'Bulk job {serial}-{index}', 'team_leader_id': rng.randint(1, shape['users']),
+              'work_size': rng.randint(1, 100), 'collaborators': ''} for index in range(50)]
+    results = recorder.call('POST /api/v2/jobs/bulk', client.post, '/api/v2/jobs/bulk', json=items).get_json()
+    job_ids = [result['id'] for result in (results or {}).get('results', []) if 'id' in result]
+    if job_ids:
+        recorder.call('POST /api/v2/jobs/bulk', client.post, '/api/v2/jobs/bulk',
+                      json=[{'op': 'delete', 'id': job_id} for job_id in job_ids])
+
+
+def write_users(client, recorder, rng, serial):
+    body = {'email': f'bench{serial}-{rng.random()}@example.com', 'password': 'benchmark', 'name': f'Bench {serial}',
+            'city_from': 'Moscow'}
+    created = recorder.call('POST /api/v2/users', client.post, '/api/v2/users', json=body).get_json() or {}
+    recorder.call('POST /api/users', client.post, '/api/users', json={**body, 'email': 'v1-' + body['email']})
+    if 'user' in created:
+        user_id = created['user']['id']
+        recorder.call('PUT /api/v2/users/<id>', client.put, f'/api/v2/users/{user_id}',
+                      json={**body, 'city_from': 'London'})
+        recorder.call('PUT /api/users/<id>', client.put, f'/api/users/{user_id}', json={'name': f'Bench v1 {serial}'})
+        recorder.call('DELETE /api/v2/users/<id>', client.delete, f'/api/v2/users/{user_id}')
+
+
+def run_test_client(app, shape, requests, seed):
+    rng = random.Random(seed)
+    recorder = Recorder()
+    client = app.test_client()
+    for name, share, url in read_endpoints(shape):
+        for _ in range(max(1, int(requests * share))):
+            recorder.call(name, client.get, url(rng))
+    for serial in range(max(1, requests // 10)):
+        write_jobs(client, recorder, rng, shape, serial)
+        write_users(client, recorder, rng, serial)
+    return recorder.summary()
+
+
+def run_http(app, shape, connections, seconds, seed):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    rng = random.Random(seed)
+    results = []
+    try:
+        for name, share, url in read_endpoints(shape):
+            if share < 1:
+                continue
+            result = asyncio.run(run_http_load(f'http://127.0.0.1:{server.port}{url(rng)}', connections, seconds))
+            results.append({'endpoint': name, **result})
+    finally:
+        server.shutdown()
+        thread.join()
+    return results
+
+
+def benchmark_scale(scale, args):
+    job_count = SCALES[scale]
+    dataset = build_database(dataset_path(args.data_dir, scale, args.seed), job_count, args.seed)
+    with tempfile.TemporaryDirectory() as scratch:
+        path = shutil.copyfile(dataset, os.path.join(scratch, 'bench.db'))
+        app = create_app({
+            **PRODUCTION_CONFIG,
+            'SECRET_KEY': 'benchmark',
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+            'RESPONSE_CACHE_ENABLED': args.response_cache,
+        })
+        shape = dataset_shape(job_count)
+        result = {'scale': scale, 'dataset': shape}
+        started = time.perf_counter()
+        result['test_client'] = run_test_client(app, shape, args.requests, args.seed)
+        result['test_client_seconds'] = time.perf_counter() - started
+        if args.http_seconds:
+            result['http'] = run_http(app, shape, args.connections, args.http_seconds, args.seed)
+        app.extensions['task_queue'].stop(timeout=5)
+        with app.app_context():
+            db.engine.dispose()
+    result['peak_rss_kb'] = peak_rss_kb()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    before = {(run['scale'], entry['endpoint']): entry
+              for run in previous['runs'] for entry in run['test_client']}
+    for run in current['runs']:
+        for entry in run['test_client']:
+            old = before.get((run['scale'], entry['endpoint']))
+            if old is None or not old['p50_ms']:
+                continue
+            change = (entry['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            print(f'{run["scale"]:>5} {entry["endpoint"]:<34} p50 {old["p50_ms"]:8.2f} -> {entry["p50_ms"]:8.2f} ms '
+                  f'({change:+.0f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', action='append', choices=SCALES, help='repeatable; defaults to 1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='test client requests per read endpoint')
+    parser.add_argument('--http-seconds', type=float, default=5, help='0 skips the HTTP phase')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--response-cache', action='store_true', help='keep the response cache enabled')
+    parser.add_argument('--data-dir', default=tempfile.gettempdir(), help='where generated datasets are kept')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='earlier results file to compare p50 latencies against')
+    args = parser.parse_args()
+    # Large scales make the slow-query log fire on every search and export; keep the output readable.
+    logging.getLogger('slow_queries').setLevel(logging.ERROR)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'settings': {name: getattr(args, name) for name in
+                     ('seed', 'requests', 'http_seconds', 'connections', 'response_cache')},
+        'runs': [],
+    }
+    for scale in args.scale or ['1k']:
+        run = benchmark_scale(scale, args)
+        results['runs'].append(run)
+        print(f'{scale}: {len(run["test_client"])} endpoints via test client in {run["test_client_seconds"]:.1f}s, '
+              f'peak RSS {run["peak_rss_kb"] / 1024:.0f} MiB')
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,68 @@
 from flask import Blueprint, jsonify, request, abort
 from models import db, Jobs, Category
+from listing import job_filters, parse_page_args, keyset_page
+from loading import JOBS_LIST_LOADING
+from cache import response_cache
+from versions import conditional_response, list_validators, entity_validators
+from serializers import job_v1_schema
+from core_lists import use_fast_path, fast_job_list
 
 jobs_api_blueprint = Blueprint('jobs_api', __name__)
 
 
 @jobs_api_blueprint.route('/api/jobs', methods=['GET'])
 def get_jobs():
-    jobs = Jobs.query.all()
-    jobs_list = []
-    for job in jobs:
-        job_dict = {
-            'id': job.id,
-            'job_title': job.job_title,
-            'team_leader_id': job.team_leader_id,
-            'work_size': job.work_size,
-            'collaborators': job.collaborators,
-            'is_finished': job.is_finished,
-            'categories': [category.id for category in job.categories]
-        }
-        jobs_list.append(job_dict)
-    return jsonify({'jobs': jobs_list})
+    return conditional_response(
+        list_validators('jobs-v1', ('jobs',)),
+        lambda etag: response_cache.json_response(response_cache.list_key('jobs', 'v1'), list_jobs, etag)
+    )
+
+
+def list_jobs():
+    try:
+        after_id, limit = parse_page_args(request.args)
+        filters = job_filters(request.args)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    if use_fast_path('jobs-v1'):
+        jobs_list, next_cursor = fast_job_list(filters, after_id, limit, category_ids=True)
+    else:
+        query = Jobs.query.options(*JOBS_LIST_LOADING).filter(*filters)
+        jobs, next_cursor = keyset_page(query, Jobs.id, after_id, limit)
+        jobs_list = job_v1_schema.dump_many(jobs)
+    return {'jobs': jobs_list, 'next': next_cursor}, 200
+
+
+def show_job(job_id):
+    job = db.session.get(Jobs, job_id)
+    if job is None:
+        return {'error': 'Job not found'}, 404
+
+    return {'job': job_v1_schema.dump(job)}, 200
 
 
 @jobs_api_blueprint.route('/api/jobs/<int:job_id>', methods=['GET', 'DELETE'])
 def job_handler(job_id):
+    if request.method == 'GET':
+        key = response_cache.entity_key('jobs', 'v1', job_id)
+        return conditional_response(
+            entity_validators(Jobs, job_id, 'jobs-v1'),
+            lambda etag: response_cache.json_response(key, lambda: show_job(job_id), etag)
+        )
+
     job = Jobs.query.get(job_id)
     if job is None:
         return jsonify({'error': 'Job not found'}), 404
 
-    if request.method == 'GET':
-        job_dict = {
-            'id': job.id,
-            'job_title': job.job_title,
-            'team_leader_id': job.team_leader_id,
-            'work_size': job.work_size,
-            'collaborators': job.collaborators,
-            'is_finished': job.is_finished,
-            'categories': [category.id for category in job.categories]
-        }
-        return jsonify({'job': job_dict}), 200
-
-    elif request.method == 'DELETE':
-        try:
-            db.session.delete(job)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({'error': f"Database error: {str(e)}"}), 500
-
-        return jsonify({'success': True, 'message': 'Job deleted successfully'}), 200
+    try:
+        db.session.delete(job)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f"Database error: {str(e)}"}), 500
+
+    return jsonify({'success': True, 'message': 'Job deleted successfully'}), 200
 
 
 @jobs_api_blueprint.route('/api/jobs', methods=['POST'])
@@ -91,18 +105,7 @@ def add_job():
         db.session.rollback()
         return jsonify({'error': f"Database error: {str(e)}"}), 500
 
-    return jsonify({
-        'success': True,
-        'job': {
-            'id': new_job.id,
-            'job_title': new_job.job_title,
-            'team_leader_id': new_job.team_leader_id,
-            'work_size': new_job.work_size,
-            'collaborators': new_job.collaborators,
-            'is_finished': new_job.is_finished,
-            'categories': [category.id for category in new_job.categories]
-        }
-    }), 201
+    return jsonify({'success': True, 'job': job_v1_schema.dump(new_job)}), 201
 
 
 @jobs_api_blueprint.route('/api/jobs/<int:job_id>', methods=['PUT'])
@@ -141,16 +144,4 @@ def update_job(job_id):
         db.session.rollback()
         return jsonify({'error': f"Database error: {str(e)}"}), 500
 
-    return jsonify({
-        'success': True,
-        'message': 'Job updated successfully',
-        'job': {
-            'id': job.id,
-            'job_title': job.job_title,
-            'team_leader_id': job.team_leader_id,
-            'work_size': job.work_size,
-            'collaborators': job.collaborators,
-            'is_finished': job.is_finished,
-            'categories': [category.id for category in job.categories]
-        }
-    }), 200
+    return jsonify({'success': True, 'message': 'Job updated successfully', 'job': job_v1_schema.dump(job)}), 200
@@ -1,37 +1,45 @@
 from flask import Blueprint, jsonify, request, abort, render_template
 from models import db, User
+from loading import USERS_LIST_LOADING
+from cache import response_cache
+from versions import conditional_response, list_validators, entity_validators
+from serializers import user_v1_schema
+from core_lists import use_fast_path, fast_user_v1_list
+from credentials import credentials, CredentialsBusy
 
 users_api_blueprint = Blueprint('users_api', __name__)
 
 
 @users_api_blueprint.route('/api/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    users_list = []
-    for user in users:
-        user_dict = {
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'jobs': [job.id for job in user.jobs]
-        }
-        users_list.append(user_dict)
-    return jsonify({'users': users_list})
+    return conditional_response(
+        list_validators('users-v1', ('users', 'jobs')),
+        lambda etag: response_cache.json_response(response_cache.list_key('users', 'v1'), list_users, etag)
+    )
+
+
+def list_users():
+    if use_fast_path('users-v1'):
+        return {'users': fast_user_v1_list()}, 200
+    users = User.query.options(*USERS_LIST_LOADING).all()
+    return {'users': user_v1_schema.dump_many(users)}, 200
 
 
 @users_api_blueprint.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    user = User.query.get(user_id)
+    key = response_cache.entity_key('users', 'v1', user_id)
+    return conditional_response(
+        entity_validators(User, user_id, 'users-v1', ('jobs',)),
+        lambda etag: response_cache.json_response(key, lambda: show_user(user_id), etag)
+    )
+
+
+def show_user(user_id):
+    user = db.session.get(User, user_id)
     if user is None:
-        return jsonify({'error': 'User not found'}), 404
+        return {'error': 'User not found'}, 404
 
-    user_dict = {
-        'id': user.id,
-        'email': user.email,
-        'name': user.name,
-        'jobs': [job.id for job in user.jobs]
-    }
-    return jsonify({'user': user_dict})
+    return {'user': user_v1_schema.dump(user)}, 200
 
 
 @users_api_blueprint.route('/api/users', methods=['POST'])
@@ -46,9 +54,13 @@ def add_user():
     if existing_user:
         return jsonify({'error': "Email already exists"}), 400
 
+    try:
+        password = credentials.hash_password(data['password'])
+    except CredentialsBusy:
+        return jsonify({'error': 'Too many password operations in progress, retry shortly'}), 503
     new_user = User(
         email=data['email'],
-        password=data['password'],
+        password=password,
         name=data['name']
     )
     try:
@@ -58,15 +70,7 @@ def add_user():
         db.session.rollback()
         return jsonify({'error': f"Database error: {str(e)}"}), 500
 
-    return jsonify({
-        'success': True,
-        'user': {
-            'id': new_user.id,
-            'email': new_user.email,
-            'name': new_user.name,
-            'jobs': []
-        }
-    }), 201
+    return jsonify({'success': True, 'user': user_v1_schema.dump(new_user, jobs=[])}), 201
 
 
 @users_api_blueprint.route('/api/users/<int:user_id>', methods=['PUT'])
@@ -82,27 +86,20 @@ def update_user(user_id):
                 return jsonify({'error': "Email already exists"}), 400
             user.email = data['email']
         if 'password' in data:
-            user.password = data['password']
+            credentials.set_password(user, data['password'])
         if 'name' in data:
             user.name = data['name']
     except (ValueError, TypeError):
         return jsonify({'error': "Invalid data type for one or more fields"}), 400
+    except CredentialsBusy:
+        return jsonify({'error': 'Too many password operations in progress, retry shortly'}), 503
 
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f"Database error: {str(e)}"}), 500
-    return jsonify({
-        'success': True,
-        'message': 'User updated successfully',
-        'user': {
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'jobs': [job.id for job in user.jobs]
-        }
-    }), 200
+    return jsonify({'success': True, 'message': 'User updated successfully', 'user': user_v1_schema.dump(user)}), 200
 
 
 @users_api_blueprint.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -0,0 +1,277 @@
+import json
+
+from sqlalchemy import bindparam
+from models import db, Jobs, Category, job_category, utcnow
+from versions import bump_table_versions
+from cache import response_cache
+from collaborators import sync_collaborators, delete_collaborators
+from stats import StatsDelta, job_stat_values
+from tasks import TaskLost
+
+OPERATIONS = ('create', 'update', 'delete')
+REQUIRED_CREATE_FIELDS = ('job_title', 'team_leader_id', 'work_size')
+SQLITE_MAX_PARAMS = 900
+
+
+def parse_items(body, ndjson=False):
+    if ndjson:
+        items = []
+        for number, line in enumerate(body.splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {number}")
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise ValueError("Request body must be a JSON array")
+    if not isinstance(items, list):
+        raise ValueError("Request body must be a JSON array")
+    return items
+
+
+def chunked(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def existing_ids(column, ids):
+    found = set()
+    for chunk in chunked(ids, SQLITE_MAX_PARAMS):
+        found.update(db.session.execute(db.select(column).where(column.in_(chunk))).scalars())
+    return found
+
+
+def validate_item(item):
+    if not isinstance(item, dict):
+        raise ValueError("Item must be a JSON object")
+    op = item.get('op', 'create')
+    if op not in OPERATIONS:
+        raise ValueError(f"Unknown operation: {op}")
+
+    values = {}
+    if op != 'create':
+        try:
+            values['id'] = int(item['id'])
+        except KeyError:
+            raise ValueError("Missing required field: id")
+        except (ValueError, TypeError):
+            raise ValueError("Invalid data type for id")
+    if op == 'delete':
+        return op, values, None
+
+    if op == 'create':
+        for field in REQUIRED_CREATE_FIELDS:
+            if field not in item:
+                raise ValueError(f"Missing required field: {field}")
+    if 'job_title' in item and not item['job_title']:
+        raise ValueError("Job title cannot be blank!")
+    if 'job_title' in item and not isinstance(item['job_title'], str):
+        raise ValueError("Invalid data type for job_title")
+    for field in ('team_leader_id', 'work_size'):
+        if field in item and (not isinstance(item[field], int) or isinstance(item[field], bool)):
+            raise ValueError(f"Invalid data type for {field}")
+    if item.get('collaborators') is not None and not isinstance(item['collaborators'], str):
+        raise ValueError("Invalid data type for collaborators")
+    for field in ('job_title', 'team_leader_id', 'work_size', 'collaborators'):
+        if field in item:
+            values[field] = item[field]
+    if 'is_finished' in item:
+        values['is_finished'] = bool(item['is_finished'])
+    if op == 'create':
+        values.setdefault('collaborators', None)
+        values.setdefault('is_finished', False)
+
+    category_ids = item.get('category_ids')
+    if category_ids is not None:
+        if not isinstance(category_ids, list) or not all(isinstance(cat, int) for cat in category_ids):
+            raise ValueError("Invalid category IDs")
+        category_ids = list(dict.fromkeys(category_ids))
+    return op, values, category_ids
+
+
+def validate_items(items):
+    validated = []
+    results = []
+    for index, item in enumerate(items):
+        try:
+            op, values, category_ids = validate_item(item)
+        except ValueError as e:
+            op = item.get('op', 'create') if isinstance(item, dict) else None
+            results.append({'index': index, 'op': op, 'status': 'error', 'error': str(e)})
+            continue
+        results.append({'index': index, 'op': op, 'status': 'pending'})
+        validated.append((index, op, values, category_ids))
+
+    referenced_categories = {cat for _, _, _, category_ids in validated for cat in category_ids or ()}
+    known_categories = set()
+    if referenced_categories:
+        known_categories = set(db.session.execute(
+            db.select(Category.id).where(Category.id.in_(referenced_categories))
+        ).scalars())
+    known_jobs = existing_ids(Jobs.id, {values['id'] for _, op, values, _ in validated if op != 'create'})
+
+    # A chunk applies its creates, updates and deletes as groups, so a job may only be
+    # touched once per request for the results to match the order of the items.
+    valid = []
+    touched = set()
+    for index, op, values, category_ids in validated:
+        if category_ids and not known_categories.issuperset(category_ids):
+            results[index].update(status='error', error='One or more categories do not exist')
+        elif op != 'create' and values['id'] not in known_jobs:
+            results[index].update(status='error', id=values['id'], error='Job not found')
+        elif op != 'create' and values['id'] in touched:
+            results[index].update(status='error', id=values['id'], error='Job is changed more than once')
+        else:
+            if op != 'create':
+                touched.add(values['id'])
+            valid.append((index, op, values, category_ids))
+    return valid, results
+
+
+def chunk_stats_delta(connection, chunk):
+    delta = StatsDelta()
+    previous = job_stat_values(connection, {values['id'] for _, op, values, _ in chunk if op != 'create'})
+    final = {}
+    for job_id, (team_leader_id, category_ids, work_size, is_finished) in previous.items():
+        delta.remove(team_leader_id, category_ids, work_size, is_finished)
+        final[job_id] = [team_leader_id, category_ids, work_size, is_finished]
+    for _, op, values, category_ids in chunk:
+        if op == 'create':
+            delta.add(values['team_leader_id'], category_ids or (), values['work_size'], values['is_finished'])
+        elif op == 'update' and values['id'] in final:
+            state = final[values['id']]
+            state[0] = values.get('team_leader_id', state[0])
+            state[2] = values.get('work_size', state[2])
+            state[3] = values.get('is_finished', state[3])
+            if category_ids is not None:
+                state[1] = set(category_ids)
+    for _, op, values, _ in chunk:
+        if op == 'delete':
+            final.pop(values['id'], None)
+    for team_leader_id, category_ids, work_size, is_finished in final.values():
+        delta.add(team_leader_id, category_ids, work_size, is_finished)
+    return delta
+
+
+def apply_chunk(chunk):
+    connection = db.session.connection()
+    jobs = Jobs.__table__
+    now = utcnow()
+    outcomes = {}
+    collaborators = {}
+    stats_delta = chunk_stats_delta(connection, chunk)
+
+    creates = [(index, values, category_ids) for index, op, values, category_ids in chunk if op == 'create']
+    if creates:
+        rows = [{**values, 'version': 1, 'updated_at': now} for _, values, _ in creates]
+        new_ids = connection.execute(
+            jobs.insert().returning(jobs.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        links = []
+        for (index, values, category_ids), job_id in zip(creates, new_ids):
+            outcomes[index] = ('created', job_id)
+            collaborators[job_id] = values['collaborators']
+            links.extend({'job_id': job_id, 'category_id': cat} for cat in category_ids or ())
+        if links:
+            connection.execute(job_category.insert(), links)
+
+    updates = {}
+    for index, op, values, category_ids in chunk:
+        if op == 'update':
+            fields = tuple(sorted(field for field in values if field != 'id'))
+            updates.setdefault(fields, []).append((index, values, category_ids))
+    for fields, group in updates.items():
+        if fields:
+            statement = (
+                jobs.update()
+                .where(jobs.c.id == bindparam('b_id'))
+                .values({field: bindparam(f'b_{field}') for field in fields})
+                .values(version=jobs.c.version + 1, updated_at=now)
+            )
+            connection.execute(statement, [
+                {f'b_{field}': value for field, value in values.items()} for _, values, _ in group
+            ])
+        replaced = [(values['id'], category_ids) for _, values, category_ids in group if category_ids is not None]
+        if replaced:
+            for ids in chunked([job_id for job_id, _ in replaced], SQLITE_MAX_PARAMS):
+                connection.execute(job_category.delete().where(job_category.c.job_id.in_(ids)))
+            links = [{'job_id': job_id, 'category_id': cat}
+                     for job_id, category_ids in replaced for cat in category_ids]
+            if links:
+                connection.execute(job_category.insert(), links)
+            if not fields:
+                connection.execute(
+                    jobs.update().where(jobs.c.id == bindparam('b_id'))
+                    .values(version=jobs.c.version + 1, updated_at=now),
+                    [{'b_id': job_id} for job_id, _ in replaced]
+                )
+        for index, values, _ in group:
+            outcomes[index] = ('updated', values['id'])
+            if 'collaborators' in values:
+                collaborators[values['id']] = values['collaborators']
+    if collaborators:
+        sync_collaborators(connection, collaborators)
+
+    deletes = [(index, values['id']) for index, op, values, _ in chunk if op == 'delete']
+    for group in chunked(deletes, SQLITE_MAX_PARAMS):
+        ids = [job_id for _, job_id in group]
+        connection.execute(job_category.delete().where(job_category.c.job_id.in_(ids)))
+        delete_collaborators(connection, ids)
+        connection.execute(jobs.delete().where(jobs.c.id.in_(ids)))
+        for index, job_id in group:
+            outcomes[index] = ('deleted', job_id)
+
+    stats_delta.apply(connection)
+    bump_table_versions(connection, {'jobs'})
+    return outcomes
+
+
+def run_bulk(items, chunk_size=1000, checkpoint=None, resume=None):
+    """Validate and apply ``items`` chunk by chunk, one transaction per chunk.
+
+    ``checkpoint(applied, settled)`` is called inside each chunk's transaction with the
+    index of its last item and the results settled since the previous checkpoint (the
+    chunk's own and those of chunks that failed in between). Resuming with
+    ``resume=(last applied, every settled result checkpointed so far)`` skips the items
+    that were already committed and reuses their results.
+    """
+    valid, results = validate_items(items)
+    db.session.commit()
+    if resume is not None:
+        applied, previous = resume
+        valid = [item for item in valid if item[0] > applied]
+        for result in previous:
+            results[result['index']] = result
+    unsaved = []
+    for chunk in chunked(valid, chunk_size):
+        try:
+            outcomes = apply_chunk(chunk)
+            committed = [dict(results[index], status=status, id=job_id)
+                         for index, (status, job_id) in outcomes.items()]
+            if checkpoint is not None:
+                checkpoint(chunk[-1][0], unsaved + committed)
+            db.session.commit()
+        except TaskLost:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            for index, _, _, _ in chunk:
+                results[index].update(status='error', error=f"Database error: {str(e)}")
+                unsaved.append(results[index])
+            continue
+        unsaved = []
+        for result in committed:
+            results[result['index']] = result
+    if valid:
+        response_cache.invalidate_all()
+
+    summary = {status: 0 for status in ('created', 'updated', 'deleted', 'error')}
+    for result in results:
+        summary[result['status']] += 1
+    return {'success': summary['error'] == 0, 'summary': summary, 'results': results}
@@ -0,0 +1,268 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from flask import Response, current_app, request
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from models import db, Jobs, User
+from serializers import dumps
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class LRUCacheBackend(CacheBackend):
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._items),
+                'max_size': self.max_size
+            }
+
+
+class AppResponseCache:
+    """The response cache of one app, kept in ``app.extensions['response_cache']``."""
+
+    def __init__(self, config):
+        self.backend = config.get('RESPONSE_CACHE_BACKEND') or LRUCacheBackend(config.get('RESPONSE_CACHE_SIZE', 1024))
+        self.ttl = config.get('RESPONSE_CACHE_TTL', 60)
+        self.enabled = config.get('RESPONSE_CACHE_ENABLED', True)
+        self._generations = {'jobs': 0, 'users': 0}
+        self._lock = threading.Lock()
+
+    def entity_key(self, namespace, view, entity_id):
+        return f'{namespace}:{view}:{entity_id}'
+
+    def list_key(self, namespace, view, args=None, depends_on=()):
+        """Key of a list view; it changes with ``namespace`` and every namespace in ``depends_on``."""
+        args = request.args if args is None else args
+        query = '&'.join(f'{name}={value}' for name, value in sorted(args.items(multi=True)))
+        generations = '.'.join(str(self._generations[name]) for name in (namespace, *depends_on))
+        return f'{namespace}:{view}:list:{generations}:{query}'
+
+    def json_response(self, key, build, version=None):
+        """Serve the body cached under ``key`` if it was built for ``version`` (the ETag)."""
+        if self.enabled:
+            cached = self.backend.get(key)
+            if cached is not None and cached[0] == version:
+                return Response(cached[1], status=200, mimetype='application/json')
+
+        payload, status = build()
+        body = dumps(payload) + b'\n'
+        if self.enabled and status == 200:
+            self.backend.set(key, (version, body), self.ttl)
+        return Response(body, status=status, mimetype='application/json')
+
+    def invalidate_job(self, job_id, team_leader_ids=()):
+        for view in ('v1', 'v2'):
+            self.backend.delete(self.entity_key('jobs', view, job_id))
+        for user_id in team_leader_ids:
+            self.backend.delete(self.entity_key('users', 'v1', user_id))
+        self._bump('jobs')
+        if team_leader_ids:
+            self._bump('users')
+
+    def invalidate_user(self, user_id):
+        for view in ('v1', 'v2'):
+            self.backend.delete(self.entity_key('users', view, user_id))
+        self._bump('users')
+
+    def invalidate_all(self):
+        self._bump('jobs')
+        self._bump('users')
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+    def _bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] += 1
+
+
+class ResponseCache:
+    """Gives views and session hooks the response cache of the current app."""
+
+    def init_app(self, app):
+        app.extensions['response_cache'] = AppResponseCache(app.config)
+
+    @property
+    def current(self):
+        return current_app.extensions['response_cache']
+
+    def entity_key(self, namespace, view, entity_id):
+        return self.current.entity_key(namespace, view, entity_id)
+
+    def list_key(self, namespace, view, args=None, depends_on=()):
+        return self.current.list_key(namespace, view, args, depends_on)
+
+    def json_response(self, key, build, version=None):
+        return self.current.json_response(key, build, version)
+
+    def invalidate_job(self, job_id, team_leader_ids=()):
+        self.current.invalidate_job(job_id, team_leader_ids)
+
+    def invalidate_user(self, user_id):
+        self.current.invalidate_user(user_id)
+
+    def invalidate_all(self):
+        self.current.invalidate_all()
+
+    def stats(self):
+        return self.current.stats()
+
+
+class SessionUser(UserMixin):
+    def __init__(self, id, name, email):
+        self.id = id
+        self.name = name
+        self.email = email
+
+
+class AppIdentityCache:
+    """The login identities of one app, kept in ``app.extensions['identity_cache']``."""
+
+    def __init__(self, config):
+        self.backend = config.get('IDENTITY_CACHE_BACKEND') or LRUCacheBackend(config.get('IDENTITY_CACHE_SIZE', 10000))
+        self.ttl = config.get('IDENTITY_CACHE_TTL', 300)
+
+    def load(self, user_id):
+        record = self.backend.get(user_id)
+        if record is None:
+            record = db.session.execute(
+                db.select(User.id, User.name, User.email).where(User.id == user_id)
+            ).first()
+            if record is None:
+                return None
+            record = tuple(record)
+            self.backend.set(user_id, record, self.ttl)
+        return SessionUser(*record)
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+class IdentityCache:
+    """Gives the login manager and session hooks the identity cache of the current app."""
+
+    def init_app(self, app):
+        app.extensions['identity_cache'] = AppIdentityCache(app.config)
+
+    @property
+    def current(self):
+        return current_app.extensions['identity_cache']
+
+    def load(self, user_id):
+        return self.current.load(user_id)
+
+    def invalidate(self, user_id):
+        self.current.invalidate(user_id)
+
+    def stats(self):
+        return self.current.stats()
+
+
+response_cache = ResponseCache()
+identity_cache = IdentityCache()
+
+
+def _attribute_values(instance, name):
+    history = inspect(instance).attrs[name].history
+    return {value for value in (*history.unchanged, *history.added, *history.deleted) if value is not None}
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_entities(session, flush_context):
+    changed = session.info.setdefault('response_cache_changed', [])
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Jobs):
+            changed.append(('jobs', instance.id, _attribute_values(instance, 'team_leader_id')))
+        elif isinstance(instance, User):
+            changed.append(('users', instance.id, ()))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_entities(session):
+    for namespace, entity_id, team_leader_ids in session.info.pop('response_cache_changed', []):
+        if namespace == 'jobs':
+            response_cache.invalidate_job(entity_id, team_leader_ids)
+        else:
+            response_cache.invalidate_user(entity_id)
+            identity_cache.invalidate(entity_id)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changed_entities(session, previous_transaction):
+    # A rolled back savepoint keeps its entities listed: invalidating them once more
+    # is harmless, losing the ones flushed before it in the same transaction is not.
+    if not previous_transaction.nested:
+        session.info.pop('response_cache_changed', None)
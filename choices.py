@@ -0,0 +1,68 @@
+import threading
+
+from flask import current_app, url_for
+from models import db, User, Category
+from forms import TypeaheadWidget, user_exists
+from versions import table_versions
+
+
+class AppChoicesCache:
+    """The form choices of one app's database, kept in ``app.extensions['choices_cache']``."""
+
+    def __init__(self, config):
+        self.max_user_choices = config.get('USER_CHOICES_LIMIT', 500)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def choices(self, table, model, limit=None):
+        version = table_versions((table,))[table][0]
+        entry = self._entries.get(table)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        choices = None
+        count = db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+        if limit is None or count <= limit:
+            choices = [tuple(row) for row in db.session.execute(
+                db.select(model.id, model.name).order_by(model.id)
+            )]
+        with self._lock:
+            self._entries[table] = (version, choices)
+        return choices
+
+    def user_choices(self):
+        return self.choices('users', User, self.max_user_choices)
+
+    def category_choices(self):
+        return self.choices('categories', Category)
+
+
+class ChoicesCache:
+    """Gives views the choices cache of the current app."""
+
+    def init_app(self, app):
+        app.extensions['choices_cache'] = AppChoicesCache(app.config)
+
+    @property
+    def current(self):
+        return current_app.extensions['choices_cache']
+
+    def user_choices(self):
+        return self.current.user_choices()
+
+    def category_choices(self):
+        return self.current.category_choices()
+
+
+choices_cache = ChoicesCache()
+
+
+def fill_user_choices(field):
+    choices = choices_cache.user_choices()
+    if choices is not None:
+        field.choices = choices
+        return
+    field.choices = []
+    field.validate_choice = False
+    field.validators = [*field.validators, user_exists]
+    field.widget = TypeaheadWidget(url_for('users_search'))
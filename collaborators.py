@@ -0,0 +1,45 @@
+from sqlalchemy import event, inspect
+from models import db, Jobs, job_collaborator
+
+
+def parse_collaborators(value):
+    user_ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) not in user_ids:
+            user_ids.append(int(part))
+    return user_ids
+
+
+def delete_collaborators(connection, job_ids):
+    job_ids = list(job_ids)
+    for start in range(0, len(job_ids), 900):
+        chunk = job_ids[start:start + 900]
+        connection.execute(job_collaborator.delete().where(job_collaborator.c.job_id.in_(chunk)))
+
+
+def sync_collaborators(connection, collaborators_by_job):
+    delete_collaborators(connection, collaborators_by_job)
+    rows = [{'job_id': job_id, 'user_id': user_id}
+            for job_id, value in collaborators_by_job.items() for user_id in parse_collaborators(value)]
+    if rows:
+        connection.execute(job_collaborator.insert(), rows)
+
+
+def backfill_collaborators(connection):
+    jobs = Jobs.__table__
+    rows = connection.execute(db.select(jobs.c.id, jobs.c.collaborators).where(jobs.c.collaborators.isnot(None)))
+    sync_collaborators(connection, {job_id: collaborators for job_id, collaborators in rows})
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_changed_collaborators(session, flush_context):
+    changed = {}
+    for instance in (*session.new, *session.dirty):
+        if isinstance(instance, Jobs) and inspect(instance).attrs.collaborators.history.has_changes():
+            changed[instance.id] = instance.collaborators
+    deleted = [instance.id for instance in session.deleted if isinstance(instance, Jobs)]
+    if changed:
+        sync_collaborators(session.connection(), changed)
+    if deleted:
+        delete_collaborators(session.connection(), deleted)
@@ -0,0 +1,54 @@
+from flask import current_app
+from sqlalchemy import func
+from models import db, Jobs, User, Category, job_category
+from listing import keyset_rows
+from serializers import job_schema, job_v1_schema, user_schema, user_v1_schema
+
+# List views served by plain Core selects instead of ORM instances; override with the
+# FAST_LIST_ENDPOINTS config key to route a view back through the ORM.
+FAST_LIST_ENDPOINTS = ('jobs-v1', 'jobs-v2', 'users-v1', 'users-v2')
+GROUP_SEPARATOR = '\x1f'
+
+
+def use_fast_path(view):
+    return view in current_app.config.get('FAST_LIST_ENDPOINTS', FAST_LIST_ENDPOINTS)
+
+
+def split_group(value, convert=str):
+    if not value:
+        return []
+    return [convert(part) for part in value.split(GROUP_SEPARATOR)]
+
+
+def job_category_group(column):
+    statement = db.select(func.group_concat(column, GROUP_SEPARATOR)).select_from(job_category)
+    if column.table is not job_category:
+        statement = statement.join(Category, Category.id == job_category.c.category_id)
+    return statement.where(job_category.c.job_id == Jobs.id).scalar_subquery()
+
+
+# Built once: only the filters and the keyset bounds vary per request.
+JOB_LIST_STATEMENTS = {
+    False: (job_schema, str, db.select(*job_schema.columns(Jobs), job_category_group(Category.name))),
+    True: (job_v1_schema, int, db.select(*job_v1_schema.columns(Jobs), job_category_group(job_category.c.category_id))),
+}
+USER_LIST_STATEMENT = db.select(*user_schema.columns(User))
+USER_V1_LIST_STATEMENT = db.select(
+    *user_v1_schema.columns(User),
+    db.select(func.group_concat(Jobs.id, GROUP_SEPARATOR)).where(Jobs.team_leader_id == User.id).scalar_subquery()
+)
+
+
+def fast_job_list(filters, after_id, limit, category_ids=False):
+    schema, convert, statement = JOB_LIST_STATEMENTS[category_ids]
+    rows, next_cursor = keyset_rows(statement.where(*filters), Jobs.id, after_id, limit)
+    return [schema.dump_row(row, categories=split_group(row[-1], convert)) for row in rows], next_cursor
+
+
+def fast_user_list():
+    return user_schema.dump_rows(db.session.connection().execute(USER_LIST_STATEMENT))
+
+
+def fast_user_v1_list():
+    rows = db.session.connection().execute(USER_V1_LIST_STATEMENT)
+    return [user_v1_schema.dump_row(row, jobs=sorted(split_group(row[-1], int))) for row in rows]
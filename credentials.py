@@ -0,0 +1,191 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+HASH_METHODS = ('scrypt', 'pbkdf2')
+
+
+class CredentialsBusy(Exception):
+    """Raised when the hashing queue is full or a hash timed out; callers should answer 503."""
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults so stored hashes can be compared with the configuration."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+
+def is_password_hash(value):
+    return value.count('$') >= 2 and value.split(':', 1)[0].split('$', 1)[0] in HASH_METHODS
+
+
+class AppCredentialService:
+    """Password hashing of one app, kept in ``app.extensions['credentials']``.
+
+    Hashes are computed on a small thread pool so that at most PASSWORD_HASH_WORKERS
+    run at once (hashlib releases the GIL while it works) and at most
+    PASSWORD_HASH_QUEUE more wait; beyond that ``CredentialsBusy`` is raised instead
+    of piling up request threads. A hash that takes longer than PASSWORD_HASH_TIMEOUT
+    also raises ``CredentialsBusy``, but keeps its place in the queue until it is
+    done, so callers that give up cannot overrun the pool. Passwords stored with
+    other parameters, or in plain text by older versions of the API, are rehashed
+    on the next successful login.
+    """
+
+    def __init__(self, config):
+        self.method = normalize_method(config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        self.salt_length = config.get('PASSWORD_SALT_LENGTH', 16)
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', 10)
+        workers = config.get('PASSWORD_HASH_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + config.get('PASSWORD_HASH_QUEUE', 16))
+
+    def _run(self, function, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise CredentialsBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            raise CredentialsBusy()
+
+    def hash_password(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def needs_rehash(self, stored):
+        return not stored.startswith(self.method + '$')
+
+    def set_password(self, user, password):
+        user.password = self.hash_password(password)
+
+    def check_password(self, user, password):
+        """Verify ``password`` for ``user``, upgrading the stored hash when it is outdated.
+
+        The caller commits the session so that an upgraded hash is saved.
+        """
+        stored = user.password or ''
+        if is_password_hash(stored):
+            valid = self._run(check_password_hash, stored, password)
+        else:
+            valid = hmac.compare_digest(stored.encode(), password.encode())
+        if valid and self.needs_rehash(stored):
+            self.set_password(user, password)
+        return valid
+
+
+class TokenBucketThrottle:
+    """Per-key token buckets: ``burst`` attempts at once, refilled at ``rate`` per second."""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """Take one token for ``key``; returns 0 when allowed, else seconds until the next token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class AppAuthThrottle:
+    """Login and registration attempts per client address and per email, for one app.
+
+    The buckets live in memory, so the limits apply per process: with N gunicorn
+    workers a client gets up to N times the configured rates. Behind a reverse proxy
+    set TRUSTED_PROXY_COUNT so that the client address is read from X-Forwarded-For
+    instead of every client sharing the proxy's bucket.
+    """
+
+    def __init__(self, config):
+        self.enabled = config.get('AUTH_THROTTLE_ENABLED', True)
+        self.by_ip = TokenBucketThrottle(config.get('AUTH_THROTTLE_IP_RATE', 0.5),
+                                         config.get('AUTH_THROTTLE_IP_BURST', 20))
+        self.by_email = TokenBucketThrottle(config.get('AUTH_THROTTLE_EMAIL_RATE', 0.1),
+                                            config.get('AUTH_THROTTLE_EMAIL_BURST', 5))
+
+    def retry_after(self, remote_addr, email):
+        """Charge one attempt to the client address and the email; seconds to wait if either is exhausted."""
+        if not self.enabled:
+            return 0
+        waits = [self.by_ip.consume(remote_addr or '-')]
+        if email:
+            waits.append(self.by_email.consume(email.strip().lower()))
+        return max(waits)
+
+    def reset(self):
+        self.by_ip.reset()
+        self.by_email.reset()
+
+
+class CredentialService:
+    """Gives views, forms and CLI commands the password hashing of the current app."""
+
+    def init_app(self, app):
+        app.extensions['credentials'] = AppCredentialService(app.config)
+
+    @property
+    def current(self):
+        return current_app.extensions['credentials']
+
+    def hash_password(self, password):
+        return self.current.hash_password(password)
+
+    def needs_rehash(self, stored):
+        return self.current.needs_rehash(stored)
+
+    def set_password(self, user, password):
+        self.current.set_password(user, password)
+
+    def check_password(self, user, password):
+        return self.current.check_password(user, password)
+
+
+class AuthThrottle:
+    """Gives the login and registration views the throttle of the current app."""
+
+    def init_app(self, app):
+        app.extensions['auth_throttle'] = AppAuthThrottle(app.config)
+
+    @property
+    def current(self):
+        return current_app.extensions['auth_throttle']
+
+    def retry_after(self, remote_addr, email):
+        return self.current.retry_after(remote_addr, email)
+
+    def reset(self):
+        self.current.reset()
+
+
+credentials = CredentialService()
+auth_throttle = AuthThrottle()
@@ -0,0 +1,330 @@
+import csv
+import itertools
+import json
+import os
+import random
+
+import click
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from sqlalchemy import inspect, text
+from models import db, utcnow
+from collaborators import parse_collaborators
+from search import install_search_indexes
+from stats import rebuild_stats
+from versions import bump_table_versions
+from listing import TRUE_VALUES
+
+# Load order and the columns read from / written to data files. job_collaborator is
+# not listed: it is derived from jobs.collaborators while the jobs are loaded.
+TABLES = {
+    'category': ('id', 'name'),
+    'user': ('id', 'email', 'password', 'name', 'city_from'),
+    'department': ('id', 'title', 'chief_id', 'members', 'email'),
+    'jobs': ('id', 'job_title', 'team_leader_id', 'work_size', 'collaborators', 'is_finished'),
+    'job_category': ('job_id', 'category_id'),
+}
+VERSIONED = {'user': 'users', 'jobs': 'jobs', 'category': 'categories'}
+
+LOAD_PRAGMAS = {'synchronous': 'OFF', 'cache_size': -262144, 'temp_store': 'MEMORY', 'threads': 4}
+LOAD_CHUNK_SIZE = 100_000
+SYNTHETIC_PASSWORD = 'password'
+
+CATEGORIES = ['Engineering', 'Science', 'Management', 'Support']
+FIXTURE = {
+    'category': [(index, name) for index, name in enumerate(CATEGORIES, start=1)],
+    'jobs': [
+        (1, 'Develop new AI model', 1, 40, '2,3', False),
+        (2, 'Write research paper', 2, 20, '1,4', True),
+        (3, 'Organize team meeting', 3, 5, '1,2,3,4', False),
+    ],
+    'job_category': [(1, 1), (1, 2), (2, 2), (3, 3), (3, 4)],
+}
+
+SYNTHETIC_CATEGORIES = CATEGORIES + [
+    'Research', 'Operations', 'Logistics', 'Medicine', 'Geology', 'Botany', 'Navigation', 'Communications',
+    'Construction', 'Energy', 'Robotics', 'Hydroponics', 'Security', 'Training', 'Maintenance', 'Exploration',
+]
+CITIES = ['Moscow', 'London', 'New York', 'Tokyo', 'Berlin', 'Paris', 'Beijing', 'Toronto', 'Sydney', 'Madrid']
+FIRST_NAMES = ['Ridley', 'Mark', 'Melissa', 'Rick', 'Beth', 'Chris', 'Annie', 'Vincent', 'Teddy', 'Alex']
+LAST_NAMES = ['Scott', 'Watney', 'Lewis', 'Martinez', 'Johanssen', 'Beck', 'Montrose', 'Kapoor', 'Sanders', 'Park']
+TITLE_VERBS = ['Deploy', 'Repair', 'Survey', 'Calibrate', 'Assemble', 'Analyse', 'Inspect', 'Upgrade', 'Test', 'Map']
+TITLE_NOUNS = ['solar array', 'rover', 'habitat module', 'water reclaimer', 'oxygenator', 'antenna', 'greenhouse',
+               'radiation sensors', 'drill rig', 'landing site', 'power grid', 'airlock', 'comms relay', 'soil samples']
+
+
+def synthetic_shape(job_count):
+    users = max(50, job_count // 20)
+    return {
+        'jobs': job_count,
+        'users': users,
+        'departments': max(5, users // 100),
+        'categories': len(SYNTHETIC_CATEGORIES),
+    }
+
+
+def synthetic_tables(job_count, seed=42):
+    """Deterministic rows for every table; each table has its own random stream.
+
+    Every synthetic user shares one hash of the password SYNTHETIC_PASSWORD, made with
+    werkzeug's default method so that no app is needed; logins rehash it when the app
+    is configured differently.
+    """
+    shape = synthetic_shape(job_count)
+    users, categories = shape['users'], shape['categories']
+    password = generate_password_hash(SYNTHETIC_PASSWORD)
+
+    def pick(rng, count, upper):
+        # Distinct ids in 1..upper; duplicates are dropped, so lists can be shorter than count.
+        return list(dict.fromkeys(int(rng.random() * upper) + 1 for _ in range(count)))
+
+    def user_rows(rng):
+        for user_id in range(1, users + 1):
+            name = f'{FIRST_NAMES[user_id % 10]} {LAST_NAMES[int(rng.random() * 10)]} {user_id}'
+            yield user_id, f'user{user_id}@example.com', password, name, CITIES[int(rng.random() * 10)]
+
+    def department_rows(rng):
+        for department_id in range(1, shape['departments'] + 1):
+            yield (department_id, f'{SYNTHETIC_CATEGORIES[department_id % categories]} department {department_id}',
+                   int(rng.random() * users) + 1, ','.join(map(str, sorted(pick(rng, 5, users)))),
+                   f'department{department_id}@example.com')
+
+    def job_rows(rng):
+        random_value = rng.random
+        for job_id in range(1, job_count + 1):
+            collaborators = pick(rng, int(random_value() * 5), users)
+            yield (job_id, f'{TITLE_VERBS[job_id % 10]} {TITLE_NOUNS[int(random_value() * 14)]} #{job_id}',
+                   int(random_value() * users) + 1, int(random_value() * 100) + 1, ','.join(map(str, collaborators)),
+                   random_value() < 0.3)
+
+    def job_category_rows(rng):
+        for job_id in range(1, job_count + 1):
+            for category_id in pick(rng, int(rng.random() * 4), categories):
+                yield job_id, category_id
+
+    return [
+        ('category', 'synthetic', list(enumerate(SYNTHETIC_CATEGORIES, start=1))),
+        ('user', f'synthetic-{job_count}-{seed}', user_rows(random.Random(f'{seed}-user'))),
+        ('department', f'synthetic-{job_count}-{seed}', department_rows(random.Random(f'{seed}-department'))),
+        ('jobs', f'synthetic-{job_count}-{seed}', job_rows(random.Random(f'{seed}-jobs'))),
+        ('job_category', f'synthetic-{job_count}-{seed}', job_category_rows(random.Random(f'{seed}-categories'))),
+    ]
+
+
+def column_parser(column):
+    if isinstance(column.type, db.Boolean):
+        return lambda value: None if value == '' else value.strip().lower() in TRUE_VALUES
+    if isinstance(column.type, db.Integer):
+        return lambda value: None if value == '' else int(value)
+    return lambda value: value
+
+
+def read_csv(path, table):
+    columns = TABLES[table]
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        missing = set(columns) - set(header)
+        if missing:
+            raise click.ClickException(f"{path}: missing columns {', '.join(sorted(missing))}")
+        positions = [header.index(name) for name in columns]
+        parsers = [column_parser(db.metadata.tables[table].c[name]) for name in columns]
+        for row in reader:
+            yield tuple(parse(row[position]) for parse, position in zip(parsers, positions))
+
+
+def read_ndjson(path, table):
+    columns = TABLES[table]
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise click.ClickException(f"{path}: invalid JSON on line {number}")
+            yield tuple(item.get(name) for name in columns)
+
+
+def file_sources(directory):
+    sources = []
+    for table in TABLES:
+        for extension, reader in (('csv', read_csv), ('ndjson', read_ndjson)):
+            path = os.path.join(directory, f'{table}.{extension}')
+            if os.path.exists(path):
+                stat = os.stat(path)
+                sources.append((table, f'{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}',
+                                reader(path, table)))
+    return sources
+
+
+def insert_statement(table):
+    columns = list(TABLES[table])
+    if table in ('user', 'jobs'):
+        columns += ['version', 'updated_at']
+    placeholders = ', '.join('?' for _ in columns)
+    return f'INSERT OR IGNORE INTO "{table}" ({", ".join(columns)}) VALUES ({placeholders})'
+
+
+def load_chunk(connection, table, rows):
+    if table in ('user', 'jobs'):
+        now = str(utcnow())
+        rows = [(*row, 1, now) for row in rows]
+    connection.exec_driver_sql(insert_statement(table), rows)
+    if table == 'jobs':
+        links = [(row[0], user_id) for row in rows for user_id in parse_collaborators(row[4])]
+        if links:
+            connection.exec_driver_sql('INSERT OR IGNORE INTO job_collaborator (job_id, user_id) VALUES (?, ?)', links)
+
+
+def loaded_tables(sources):
+    tables = [db.metadata.tables[table] for table in dict.fromkeys(table for table, _, _ in sources)]
+    if any(table.name == 'jobs' for table in tables):
+        tables.append(db.metadata.tables['job_collaborator'])
+    return tables
+
+
+def suspend_indexes(connection, tables):
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS data_load_progress (source VARCHAR(500) PRIMARY KEY, rows INTEGER)'
+    ))
+    for name in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars():
+        connection.execute(text(f'DROP TRIGGER "{name}"'))
+    for table in tables:
+        for index in table.indexes:
+            connection.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+    connection.commit()
+
+
+def restore_indexes(connection, tables, sources):
+    for table in tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    install_search_indexes(connection)
+    rebuild_stats(connection)
+    bump_table_versions(connection, {VERSIONED[table] for table, _, _ in sources if table in VERSIONED})
+    connection.commit()
+
+
+def load_tables(engine, sources, chunk_size=LOAD_CHUNK_SIZE, echo=None):
+    """Bulk-load ``(table, source key, rows)`` sources with INSERT OR IGNORE.
+
+    Rows are written in transactions of ``chunk_size`` together with the number of
+    rows consumed from their source, so an interrupted load resumes where the last
+    committed chunk ended and repeating a finished load inserts nothing. While rows
+    are written the search triggers and the secondary indexes of the loaded tables
+    are dropped; they are recreated, and the FTS indexes, statistics and table
+    versions rebuilt, once at the end, also when the load is interrupted, so the
+    database stays usable with whatever rows were committed (or by the next run if
+    the process was killed).
+    """
+    tables = loaded_tables(sources)
+    loaded = {}
+    suspended = False
+    with engine.connect() as connection:
+        previous = {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in LOAD_PRAGMAS}
+        for name, value in LOAD_PRAGMAS.items():
+            connection.exec_driver_sql(f'PRAGMA {name} = {value}')
+        try:
+            suspended = not connection.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'trigger'")).first()
+            progress = {}
+            if inspect(connection).has_table('data_load_progress'):
+                progress = dict(connection.execute(text('SELECT source, rows FROM data_load_progress')).all())
+            for table, source, rows in sources:
+                key = f'{table}:{source}'
+                done = progress.get(key, 0)
+                rows = iter(rows)
+                for _ in itertools.islice(rows, done):
+                    pass
+                while True:
+                    chunk = list(itertools.islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    if not suspended:
+                        suspend_indexes(connection, tables)
+                        suspended = True
+                    load_chunk(connection, table, chunk)
+                    done += len(chunk)
+                    connection.execute(text('INSERT OR REPLACE INTO data_load_progress (source, rows) '
+                                            'VALUES (:source, :rows)'), {'source': key, 'rows': done})
+                    connection.commit()
+                    loaded[table] = loaded.get(table, 0) + len(chunk)
+                    if echo:
+                        echo(f'{table}: {done} rows')
+        finally:
+            connection.rollback()
+            if suspended:
+                restore_indexes(connection, tables, sources)
+            for name, value in previous.items():
+                connection.exec_driver_sql(f'PRAGMA {name} = {value}')
+    return loaded
+
+
+def dump_rows(connection, table):
+    columns = ', '.join(f'"{name}"' for name in TABLES[table])
+    key = ', '.join(f'"{column.name}"' for column in db.metadata.tables[table].primary_key)
+    return connection.exec_driver_sql(f'SELECT {columns} FROM "{table}" ORDER BY {key}')
+
+
+@click.group('data')
+def data_cli():
+    """Seed, bulk-load and dump users, jobs, categories and departments."""
+
+
+@data_cli.command('seed')
+@click.option('--jobs', 'job_count', type=int, default=0,
+              help='Generate a synthetic dataset with this many jobs instead of the starter fixture.')
+@click.option('--seed', default=42, show_default=True, help='Random seed for --jobs.')
+@with_appcontext
+def seed_command(job_count, seed):
+    """Insert starter categories and jobs, or a synthetic dataset."""
+    if job_count:
+        sources = synthetic_tables(job_count, seed)
+    else:
+        sources = [(table, 'fixture', rows) for table, rows in FIXTURE.items()]
+    loaded = load_tables(db.engine, sources, echo=click.echo)
+    click.echo(f"Seeded: {', '.join(f'{table} {count}' for table, count in loaded.items()) or 'nothing new'}.")
+
+
+@data_cli.command('load')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--chunk-size', default=LOAD_CHUNK_SIZE, show_default=True)
+@with_appcontext
+def load_command(directory, chunk_size):
+    """Load <table>.csv or <table>.ndjson files from DIRECTORY.
+
+    Rows whose primary key already exists are skipped, and an interrupted load can
+    simply be run again. Passwords are stored as they are in the files: hashes (as
+    written by `data dump`) are kept, and plain-text passwords are hashed on the
+    user's next login, since hashing them here would take longer than the load.
+    """
+    sources = file_sources(directory)
+    if not sources:
+        raise click.ClickException(f"No {', '.join(TABLES)} .csv or .ndjson files in {directory}")
+    loaded = load_tables(db.engine, sources, chunk_size, echo=click.echo)
+    click.echo(f"Loaded: {', '.join(f'{table} {count}' for table, count in loaded.items()) or 'nothing new'}.")
+
+
+@data_cli.command('dump')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'data_format', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@with_appcontext
+def dump_command(directory, data_format):
+    """Write every table to DIRECTORY in a format `data load` reads back."""
+    os.makedirs(directory, exist_ok=True)
+    with db.engine.connect() as connection:
+        for table, columns in TABLES.items():
+            path = os.path.join(directory, f'{table}.{data_format}')
+            count = 0
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                if data_format == 'csv':
+                    writer = csv.writer(file)
+                    writer.writerow(columns)
+                for partition in dump_rows(connection, table).partitions(10000):
+                    if data_format == 'csv':
+                        writer.writerows(partition)
+                    else:
+                        file.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                                        for row in partition)
+                    count += len(partition)
+            click.echo(f'{path}: {count} rows')
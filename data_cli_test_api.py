@@ -0,0 +1,116 @@
+import csv
+import os
+import tempfile
+import unittest
+from main import create_app
+from models import db, Jobs, User, Category, job_category, job_collaborator
+from credentials import credentials, is_password_hash
+from data_cli import load_tables, synthetic_tables, TABLES
+
+
+def table_rows(app, table):
+    model = db.metadata.tables[table]
+    columns = [model.c[name] for name in TABLES[table]] if table in TABLES else [model]
+    with app.app_context():
+        with db.engine.connect() as connection:
+            return connection.execute(db.select(*columns).order_by(*model.primary_key)).all()
+
+
+class TestDataCommands(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = self.make_app('source.db')
+        self.runner = self.app.test_cli_runner()
+
+    def tearDown(self):
+        for app in getattr(self, 'apps', []):
+            app.extensions['task_queue'].stop(timeout=5)
+            with app.app_context():
+                db.engine.dispose()
+        self.directory.cleanup()
+
+    def make_app(self, name):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(self.directory.name, name)}'})
+        self.apps = getattr(self, 'apps', []) + [app]
+        return app
+
+    def test_seed_is_idempotent(self):
+        for _ in range(2):
+            result = self.runner.invoke(args=['data', 'seed'])
+            self.assertEqual(result.exit_code, 0, result.output)
+        with self.app.app_context():
+            self.assertEqual(Category.query.count(), 4)
+            self.assertEqual(Jobs.query.count(), 3)
+            self.assertEqual(db.session.query(job_category).count(), 5)
+            self.assertEqual(db.session.query(job_collaborator).count(), 8)
+        response = self.app.test_client().get('/api/v2/jobs/search?q=research')
+        self.assertEqual([job['id'] for job in response.get_json()['jobs']], [2])
+
+    def test_dump_and_load_round_trip(self):
+        with self.app.app_context():
+            load_tables(db.engine, synthetic_tables(300, seed=7))
+        for data_format in ('csv', 'ndjson'):
+            with self.subTest(data_format=data_format):
+                dump_directory = os.path.join(self.directory.name, data_format)
+                result = self.runner.invoke(args=['data', 'dump', dump_directory, '--format', data_format])
+                self.assertEqual(result.exit_code, 0, result.output)
+
+                target = self.make_app(f'{data_format}.db')
+                result = target.test_cli_runner().invoke(args=['data', 'load', dump_directory, '--chunk-size', 100])
+                self.assertEqual(result.exit_code, 0, result.output)
+                for table in (*TABLES, 'job_collaborator', 'leader_job_stats'):
+                    self.assertEqual(table_rows(target, table), table_rows(self.app, table), table)
+                stats = target.test_client().get('/api/v2/stats').get_json()
+                self.assertEqual(stats, self.app.test_client().get('/api/v2/stats').get_json())
+
+    def test_loaded_plain_passwords_are_hashed_on_login(self):
+        with self.app.app_context():
+            stored = credentials.hash_password('kept')
+        source = os.path.join(self.directory.name, 'users')
+        os.makedirs(source)
+        with open(os.path.join(source, 'user.csv'), 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows([('id', 'email', 'password', 'name', 'city_from'),
+                                        (1, 'plain@example.com', 'secret', 'Plain', 'Moscow'),
+                                        (2, 'hashed@example.com', stored, 'Hashed', 'Moscow')])
+        result = self.runner.invoke(args=['data', 'load', source])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with self.app.app_context():
+            plain, hashed = db.session.get(User, 1), db.session.get(User, 2)
+            self.assertEqual((plain.password, hashed.password), ('secret', stored))
+            self.assertTrue(credentials.check_password(plain, 'secret'))
+            db.session.commit()
+            self.assertTrue(is_password_hash(db.session.get(User, 1).password))
+
+    def test_interrupted_load_resumes(self):
+        def interrupted(rows, after):
+            for index, row in enumerate(rows):
+                if index == after:
+                    raise KeyboardInterrupt
+                yield row
+
+        sources = synthetic_tables(500, seed=3)
+        with self.app.app_context():
+            with self.assertRaises(KeyboardInterrupt):
+                load_tables(db.engine, [(table, key, interrupted(rows, 250) if table == 'jobs' else rows)
+                                        for table, key, rows in sources], chunk_size=100)
+            self.assertEqual(Jobs.query.count(), 200)
+            with db.engine.connect() as connection:
+                query = connection.exec_driver_sql
+                self.assertTrue(query("SELECT 1 FROM sqlite_master WHERE type = 'trigger'").first())
+                self.assertEqual(query('SELECT sum(jobs_count) FROM leader_job_stats').scalar(), 200)
+
+            loaded = load_tables(db.engine, synthetic_tables(500, seed=3), chunk_size=100)
+            self.assertEqual(loaded['jobs'], 300)
+            self.assertEqual(Jobs.query.count(), 500)
+            self.assertEqual(load_tables(db.engine, synthetic_tables(500, seed=3)), {})
+        self.assertEqual(table_rows(self.app, 'jobs')[-1].id, 500)
+        with self.app.app_context():
+            db.session.add(Jobs(job_title='Trigger check', team_leader_id=1, work_size=1))
+            db.session.commit()
+            self.assertEqual(User.query.count(), 50)
+        response = self.app.test_client().get('/api/v2/jobs/search?q=trigger')
+        self.assertEqual(len(response.get_json()['jobs']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
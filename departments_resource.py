@@ -0,0 +1,21 @@
+from flask import request
+from flask_restful import Resource
+from models import Department
+from listing import parse_search_args
+from search import search
+from serializers import department_schema
+
+
+class DepartmentsSearchResource(Resource):
+    def get(self):
+        try:
+            query, limit, offset = parse_search_args(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        ranked, next_offset = search('departments_fts', query, limit, offset)
+        departments = {department.id: department for department in Department.query
+                       .filter(Department.id.in_([department_id for department_id, _ in ranked]))}
+        departments_list = [department_schema.dump(departments[department_id], score=score)
+                            for department_id, score in ranked if department_id in departments]
+        return {'departments': departments_list, 'next_offset': next_offset}, 200
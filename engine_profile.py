@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+PROFILES = {
+    'default': {
+        'pragmas': {},
+        'pool_size': 5,
+        'max_overflow': 10,
+    },
+    'wal': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 268435456,
+            'cache_size': -65536,
+            'temp_store': 'MEMORY',
+        },
+        'pool_size': 10,
+        'max_overflow': 20,
+    },
+}
+
+
+def get_profile(config):
+    name = config.get('DATABASE_PROFILE', 'wal')
+    if name not in PROFILES:
+        raise ValueError(f"Unknown database profile: {name}")
+    profile = dict(PROFILES[name])
+    profile['pragmas'] = {**profile['pragmas'], **config.get('SQLITE_PRAGMAS', {})}
+    profile['pool_size'] = config.get('DATABASE_POOL_SIZE', profile['pool_size'])
+    profile['max_overflow'] = config.get('DATABASE_MAX_OVERFLOW', profile['max_overflow'])
+    return profile
+
+
+def is_memory_database(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def engine_options(profile, uri):
+    if not uri.startswith('sqlite') or is_memory_database(uri):
+        return {}
+    return {
+        'poolclass': QueuePool,
+        'pool_size': profile['pool_size'],
+        'max_overflow': profile['max_overflow'],
+        'connect_args': {'timeout': profile['pragmas'].get('busy_timeout', 5000) / 1000},
+    }
+
+
+def install_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def init_engine_profile(app, db):
+    profile = get_profile(app.config)
+    options = engine_options(profile, app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    db.init_app(app)
+    with app.app_context():
+        install_pragmas(db.engine, profile['pragmas'])
+
+
+def dispose_inherited_connections(app, db):
+    # Called in each forked worker: drop the pooled connections copied from the parent
+    # without closing them, since the parent process still owns those file handles.
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,7 +1,46 @@
 from flask_wtf import FlaskForm
+from markupsafe import Markup
 from wtforms import (StringField, PasswordField, IntegerField, BooleanField, SubmitField,
                      SelectField, SelectMultipleField)
-from wtforms.validators import DataRequired, Email, Length
+from wtforms.validators import DataRequired, Email, Length, ValidationError
+from wtforms.widgets import html_params
+from models import db, User
+
+
+class TypeaheadWidget:
+    def __init__(self, source_url):
+        self.source_url = source_url
+
+    def __call__(self, field, **kwargs):
+        kwargs.setdefault('id', field.id)
+        list_id = f'{field.id}-options'
+        params = html_params(name=field.name, value=field.data or '', list=list_id, autocomplete='off',
+                             placeholder='Start typing a name', **kwargs)
+        return Markup(
+            f'<input type="text" {params}>'
+            f'<datalist id="{list_id}"></datalist>'
+            '<script>'
+            f'document.getElementById("{field.id}").addEventListener("input", function (event) {{'
+            f'  fetch("{self.source_url}?q=" + encodeURIComponent(event.target.value))'
+            '    .then(function (response) { return response.json(); })'
+            '    .then(function (data) {'
+            f'      var options = document.getElementById("{list_id}");'
+            '      options.innerHTML = "";'
+            '      data.users.forEach(function (user) {'
+            '        var option = document.createElement("option");'
+            '        option.value = user.id;'
+            '        option.textContent = user.name;'
+            '        options.appendChild(option);'
+            '      });'
+            '    });'
+            '});'
+            '</script>'
+        )
+
+
+def user_exists(form, field):
+    if field.data is None or db.session.get(User, field.data) is None:
+        raise ValidationError('User does not exist')
 
 
 class LoginForm(FlaskForm):
@@ -0,0 +1,154 @@
+"""Group commit: writes from concurrent requests share one SQLite transaction.
+
+With GROUP_COMMIT_ENABLED a request does not commit its own write. It hands a
+function to the committer thread of its process and waits. The committer takes
+the first write, collects whatever else arrives within GROUP_COMMIT_WINDOW_MS
+(at most GROUP_COMMIT_MAX_BATCH writes), applies them in arrival order and
+flushes and commits them together, so the statistics, row-version and cache
+bookkeeping of the session hooks also runs once per batch. A write answering
+with an error status (404, 400) changes nothing and gets its own response. If
+the shared flush or commit fails (a constraint violation, a concurrent update),
+the batch is rolled back and replayed with every write in its own SAVEPOINT, so
+only the writes at fault fail.
+
+Durability is the same as committing each request separately:
+
+* a request is answered only after the COMMIT containing its write returned, so
+  no write is acknowledged early; a crash before that loses only writes whose
+  requests never got an answer;
+* the writes of one batch become visible together, and if the COMMIT itself
+  fails every request of the batch gets a 500 and none of them is applied;
+* what a COMMIT guarantees is still decided by the database profile. With the
+  default 'wal' profile (synchronous=NORMAL) a committed write survives a crash
+  of the process but the last commits may be lost on power failure; with
+  SQLITE_PRAGMAS = {'synchronous': 'FULL'} every commit is fsynced, and that is
+  where sharing one commit between many requests pays most.
+
+Batches only form between requests served by the same process and app at the
+same time, so this is meant for threaded servers (gunicorn with
+GUNICORN_THREADS > 1). Each app has its own committer, kept in
+``app.extensions['group_commit']``.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from models import db
+
+
+class RejectedWrite(Exception):
+    def __init__(self, response):
+        super().__init__(response)
+        self.response = response
+
+
+class GroupCommitter:
+    def __init__(self, app):
+        self.app = app
+        self.enabled = app.config.get('GROUP_COMMIT_ENABLED', False)
+        self.window = app.config.get('GROUP_COMMIT_WINDOW_MS', 5) / 1000
+        self.max_batch = app.config.get('GROUP_COMMIT_MAX_BATCH', 200)
+        self._queue = queue.SimpleQueue()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, write):
+        """Run ``write()`` in the next group transaction and return its response.
+
+        ``write`` is called on the committer thread, inside an app context, and must
+        return a ``(body, status)`` response; it must leave the session untouched when
+        the status is 400 or more.
+        """
+        self._start()
+        future = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, name='group-commit', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self.commit_batch(batch)
+            except Exception as e:
+                error = ({'error': f"Database error: {str(e)}"}, 500)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(error)
+
+    def commit_batch(self, batch):
+        try:
+            responses = self.apply(batch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Something broke the shared flush: replay every write in its own
+            # savepoint so that only the writes at fault fail.
+            responses = self.apply_isolated(batch)
+            db.session.commit()
+        for (_, future), response in zip(batch, responses):
+            future.set_result(response)
+
+    def apply(self, batch):
+        """Run the writes back to back and flush them once.
+
+        Writes must not change anything when they answer with an error status; a
+        write that raises makes the whole batch fall back to ``apply_isolated``.
+        """
+        with db.session.no_autoflush:
+            responses = [write() for write, _ in batch]
+        db.session.flush()
+        return responses
+
+    def apply_isolated(self, batch):
+        # pysqlite does not open a transaction before SAVEPOINT, so releasing the first
+        # savepoint would commit on its own; start the transaction explicitly.
+        db.session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+        responses = []
+        for write, _ in batch:
+            try:
+                with db.session.begin_nested():
+                    response = write()
+                    if response[1] >= 400:
+                        raise RejectedWrite(response)
+            except RejectedWrite as rejected:
+                response = rejected.response
+            except Exception as e:
+                response = ({'error': f"Database error: {str(e)}"}, 500)
+            responses.append(response)
+        return responses
+
+
+class GroupCommit:
+    """Gives views the group committer of the current app."""
+
+    def init_app(self, app, db):
+        app.extensions['group_commit'] = GroupCommitter(app)
+
+    @property
+    def enabled(self):
+        return current_app.extensions['group_commit'].enabled
+
+    def submit(self, write):
+        return current_app.extensions['group_commit'].submit(write)
+
+
+group_commit = GroupCommit()
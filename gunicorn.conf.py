@@ -0,0 +1,39 @@
+"""Multi-process gunicorn profile for wsgi:application.
+
+    gunicorn -c gunicorn.conf.py
+
+WEB_CONCURRENCY sets the worker count (default 2 * CPUs + 1) and GUNICORN_THREADS
+switches to threaded workers. All workers share one SQLite file: with the default
+'wal' database profile readers never block, writers queue on busy_timeout.
+FLASK_GROUP_COMMIT_ENABLED=true batches concurrent job updates per process (see
+group_commit.py), which needs threaded workers to form batches.
+Behind a reverse proxy set FLASK_TRUSTED_PROXY_COUNT to the number of proxies in
+front of gunicorn, so that login throttling sees client addresses. Set
+FLASK_METRICS_TOKEN and configure Prometheus to send it as a bearer token to scrape
+/metrics; the counters are per worker process.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app (and run migrations) once in the master, then fork.
+preload_app = True
+reload = False
+timeout = 30
+keepalive = 5
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def post_fork(server, worker):
+    from wsgi import application
+    from models import db
+    from engine_profile import dispose_inherited_connections
+
+    dispose_inherited_connections(application, db)
+    application.extensions['task_queue'].start()
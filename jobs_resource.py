@@ -1,6 +1,17 @@
+from flask import request, current_app
 from flask_restful import Resource, reqparse
-from models import db, Jobs, Category
-from sqlalchemy.orm import joinedload
+from models import db, Jobs, Category, User, job_collaborator
+from listing import (job_filters, parse_page_args, parse_int_arg, parse_search_args, keyset_page,
+                     category_names_by_job, ndjson_response, ndjson_lines, stream_partitions, paged_partitions)
+from loading import JOBS_LIST_LOADING
+from cache import response_cache
+from versions import conditional_response, list_validators, entity_validators
+from bulk_jobs import parse_items, run_bulk
+from search import search
+from serializers import job_schema
+from core_lists import use_fast_path, fast_job_list
+from group_commit import group_commit
+from tasks import task_queue, task_handler, wants_async, write_ndjson_result
 
 parser = reqparse.RequestParser()
 parser.add_argument('job_title', type=str, required=True, help="Job title cannot be blank!")
@@ -13,21 +24,26 @@ parser.add_argument('category_ids', type=int, action='append', required=False)
 
 class JobsListResource(Resource):
     def get(self):
+        return conditional_response(
+            list_validators('jobs-v2', ('jobs',)),
+            lambda etag: response_cache.json_response(response_cache.list_key('jobs', 'v2'), self.list_jobs, etag)
+        )
+
+    def list_jobs(self):
+        try:
+            after_id, limit = parse_page_args(request.args)
+            filters = job_filters(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
         try:
-            jobs = Jobs.query.options(joinedload(Jobs.categories)).all()
-            jobs_list = []
-            for job in jobs:
-                job_dict = {
-                    'id': job.id,
-                    'job_title': job.job_title,
-                    'team_leader_id': job.team_leader_id,
-                    'work_size': job.work_size,
-                    'collaborators': job.collaborators,
-                    'is_finished': job.is_finished,
-                    'categories': [category.name for category in job.categories]
-                }
-                jobs_list.append(job_dict)
-            return {'jobs': jobs_list}, 200
+            if use_fast_path('jobs-v2'):
+                jobs_list, next_cursor = fast_job_list(filters, after_id, limit)
+            else:
+                query = Jobs.query.options(*JOBS_LIST_LOADING).filter(*filters)
+                jobs, next_cursor = keyset_page(query, Jobs.id, after_id, limit)
+                jobs_list = job_schema.dump_many(jobs)
+            return {'jobs': jobs_list, 'next': next_cursor}, 200
         except Exception as e:
             return {'error': f"Database error: {str(e)}"}, 500
 
@@ -61,82 +77,67 @@ class JobsListResource(Resource):
             db.session.rollback()
             return {'error': f"Database error: {str(e)}"}, 500
 
-        return {
-            'success': True,
-            'job': {
-                'id': new_job.id,
-                'job_title': new_job.job_title,
-                'team_leader_id': new_job.team_leader_id,
-                'work_size': new_job.work_size,
-                'collaborators': new_job.collaborators,
-                'is_finished': new_job.is_finished,
-                'categories': [category.name for category in new_job.categories]
-            }
-        }, 201
+        return {'success': True, 'job': job_schema.dump(new_job)}, 201
 
 
 class JobsResource(Resource):
     def get(self, job_id):
+        key = response_cache.entity_key('jobs', 'v2', job_id)
+        return conditional_response(
+            entity_validators(Jobs, job_id, 'jobs-v2'),
+            lambda etag: response_cache.json_response(key, lambda: self.show_job(job_id), etag)
+        )
+
+    def show_job(self, job_id):
         try:
             job = db.session.get(Jobs, job_id)
             if not job:
                 return {'error': 'Job not found'}, 404
 
-            job_dict = {
-                'id': job.id,
-                'job_title': job.job_title,
-                'team_leader_id': job.team_leader_id,
-                'work_size': job.work_size,
-                'collaborators': job.collaborators,
-                'is_finished': job.is_finished,
-                'categories': [category.name for category in job.categories]
-            }
-            return {'job': job_dict}, 200
+            return {'job': job_schema.dump(job)}, 200
         except Exception as e:
             return {'error': f"Database error: {str(e)}"}, 500
 
     def put(self, job_id):
+        if db.session.execute(db.select(Jobs.id).where(Jobs.id == job_id)).first() is None:
+            return {'error': 'Job not found'}, 404
+        args = parser.parse_args()
+        if group_commit.enabled:
+            # End this request's read transaction: it would keep the committer from writing.
+            db.session.rollback()
+            return group_commit.submit(lambda: self.update_job(job_id, args))
         try:
-            job = db.session.get(Jobs, job_id)
-            if not job:
-                return {'error': 'Job not found'}, 404
-
-            args = parser.parse_args()
-            if args['job_title']:
-                job.job_title = args['job_title']
-            if args['team_leader_id']:
-                job.team_leader_id = args['team_leader_id']
-            if args['work_size']:
-                job.work_size = args['work_size']
-            if args['collaborators']:
-                job.collaborators = args['collaborators']
-            if args['is_finished'] is not None:
-                job.is_finished = args['is_finished']
-
-            if args['category_ids']:
-                categories = Category.query.filter(Category.id.in_(args['category_ids'])).all()
-                if len(categories) != len(args['category_ids']):
-                    return {'error': 'One or more categories do not exist'}, 400
-                job.categories = categories
-
-            db.session.commit()
+            response = self.update_job(job_id, args)
+            if response[1] == 200:
+                db.session.commit()
         except Exception as e:
             db.session.rollback()
             return {'error': f"Database error: {str(e)}"}, 500
+        return response
 
-        return {
-            'success': True,
-            'message': 'Job updated successfully',
-            'job': {
-                'id': job.id,
-                'job_title': job.job_title,
-                'team_leader_id': job.team_leader_id,
-                'work_size': job.work_size,
-                'collaborators': job.collaborators,
-                'is_finished': job.is_finished,
-                'categories': [category.name for category in job.categories]
-            }
-        }, 200
+    def update_job(self, job_id, args):
+        job = db.session.get(Jobs, job_id)
+        if not job:
+            return {'error': 'Job not found'}, 404
+
+        if args['category_ids']:
+            categories = Category.query.filter(Category.id.in_(args['category_ids'])).all()
+            if len(categories) != len(args['category_ids']):
+                return {'error': 'One or more categories do not exist'}, 400
+            job.categories = categories
+
+        if args['job_title']:
+            job.job_title = args['job_title']
+        if args['team_leader_id']:
+            job.team_leader_id = args['team_leader_id']
+        if args['work_size']:
+            job.work_size = args['work_size']
+        if args['collaborators']:
+            job.collaborators = args['collaborators']
+        if args['is_finished'] is not None:
+            job.is_finished = args['is_finished']
+
+        return {'success': True, 'message': 'Job updated successfully', 'job': job_schema.dump(job)}, 200
 
     def delete(self, job_id):
         try:
@@ -151,3 +152,113 @@ class JobsResource(Resource):
             return {'error': f"Database error: {str(e)}"}, 500
 
         return {'success': True, 'message': 'Job deleted successfully'}, 200
+
+
+def job_export_partitions(filters, read=stream_partitions):
+    for partition in read(db.select(*job_schema.columns(Jobs)).where(*filters), Jobs.id):
+        categories = category_names_by_job([row.id for row in partition])
+        yield [job_schema.dump_row(row, categories=categories[row.id]) for row in partition]
+
+
+def export_filters(args):
+    since_id = parse_int_arg(args, 'since_id', minimum=0)
+    filters = job_filters(args)
+    if since_id is not None:
+        filters.append(Jobs.id > since_id)
+    return filters
+
+
+class JobsExportResource(Resource):
+    def get(self):
+        try:
+            filters = export_filters(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        def generate():
+            for rows in job_export_partitions(filters):
+                yield ndjson_lines(rows)
+
+        return conditional_response(list_validators('jobs-export', ('jobs',)),
+                                    lambda etag: ndjson_response(generate()))
+
+    def post(self):
+        """Write the export to a file in the background; the task result links to it."""
+        args = request.args.to_dict()
+        try:
+            export_filters(args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return task_queue.accepted(task_queue.submit('export_jobs', {'args': args}))
+
+
+@task_handler('export_jobs')
+def export_jobs_task(run, payload):
+    return write_ndjson_result(run, job_export_partitions(export_filters(payload['args']), read=paged_partitions))
+
+
+class JobsBulkResource(Resource):
+    def post(self):
+        try:
+            chunk_size = parse_int_arg(request.args, 'chunk_size', minimum=1)
+            items = parse_items(request.get_data(as_text=True), ndjson=request.mimetype == 'application/x-ndjson')
+            run_async = wants_async(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if chunk_size is None:
+            chunk_size = current_app.config.get('BULK_CHUNK_SIZE', 1000)
+        if run_async:
+            return task_queue.accepted(task_queue.submit('bulk_jobs', {'items': items, 'chunk_size': chunk_size}))
+        return run_bulk(items, chunk_size), 200
+
+
+@task_handler('bulk_jobs')
+def bulk_jobs_task(run, payload):
+    resume = None
+    if run.progress:
+        resume = (run.progress['applied'], [result for entry in run.progress_log() for result in entry])
+    return run_bulk(payload['items'], payload['chunk_size'], resume=resume,
+                    checkpoint=lambda applied, settled: run.save_progress({'applied': applied}, settled))
+
+
+class UserJobsResource(Resource):
+    def get(self, user_id):
+        key = response_cache.list_key('jobs', f'user-{user_id}', depends_on=('users',))
+        return conditional_response(
+            list_validators(f'user-jobs-{user_id}', ('jobs', 'users')),
+            lambda etag: response_cache.json_response(key, lambda: self.list_user_jobs(user_id), etag)
+        )
+
+    def list_user_jobs(self, user_id):
+        try:
+            after_id, limit = parse_page_args(request.args)
+            role = request.args.get('role', 'any')
+            if role not in ('any', 'leader', 'collaborator'):
+                raise ValueError("Invalid value for role: expected any, leader or collaborator")
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if db.session.get(User, user_id) is None:
+            return {'error': 'User not found'}, 404
+
+        led = Jobs.team_leader_id == user_id
+        collaborated = Jobs.id.in_(
+            db.select(job_collaborator.c.job_id).where(job_collaborator.c.user_id == user_id)
+        )
+        condition = {'any': db.or_(led, collaborated), 'leader': led, 'collaborator': collaborated}[role]
+        query = Jobs.query.options(*JOBS_LIST_LOADING).filter(condition)
+        jobs, next_cursor = keyset_page(query, Jobs.id, after_id, limit)
+        return {'user_id': user_id, 'jobs': job_schema.dump_many(jobs), 'next': next_cursor}, 200
+
+
+class JobsSearchResource(Resource):
+    def get(self):
+        try:
+            query, limit, offset = parse_search_args(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        ranked, next_offset = search('jobs_fts', query, limit, offset)
+        jobs = {job.id: job for job in Jobs.query.options(*JOBS_LIST_LOADING)
+                .filter(Jobs.id.in_([job_id for job_id, _ in ranked]))}
+        jobs_list = [job_schema.dump(jobs[job_id], score=score) for job_id, score in ranked if job_id in jobs]
+        return {'jobs': jobs_list, 'next_offset': next_offset}, 200
@@ -1,7 +1,14 @@
 import unittest
 import json
-from main import app, db
-from models import Jobs, Category
+import sqlite3
+import threading
+from concurrent.futures import Future
+from sqlalchemy import event
+from main import create_app
+from models import db, Jobs, Category
+from jobs_resource import JobsResource
+
+app = create_app()
 
 
 class TestJobsAPI(unittest.TestCase):
@@ -125,6 +132,382 @@ class TestJobsAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertEqual(data['error'], 'Job not found')
 
+    def test_put_job_not_found(self):
+        """Тест: обновление несуществующей работы даёт 404 и при неполном теле запроса."""
+        response = self.app.put('/api/v2/jobs/999999', json={"work_size": 3})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.data)['error'], 'Job not found')
+
+    def test_get_jobs_keyset_pagination(self):
+        """Тест постраничного получения работ по курсору."""
+        job_ids = []
+        for work_size in (10, 20, 30):
+            job_data = {
+                "job_title": "Paginated job",
+                "team_leader_id": 1,
+                "work_size": work_size,
+                "collaborators": "2,3",
+                "category_ids": [1]
+            }
+            post_response = self.app.post('/api/v2/jobs', json=job_data)
+            job_ids.append(json.loads(post_response.data)['job']['id'])
+
+        response = self.app.get(f'/api/v2/jobs?after_id={job_ids[0] - 1}&limit=2')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([job['id'] for job in data['jobs']], job_ids[:2])
+        self.assertEqual(data['next'], job_ids[1])
+
+        response = self.app.get(f'/api/jobs?after_id={data["next"]}&limit=2')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['jobs'][0]['id'], job_ids[2])
+
+    def test_get_jobs_filters(self):
+        """Тест фильтрации списка работ."""
+        job_data = {
+            "job_title": "Filtered job",
+            "team_leader_id": 1,
+            "work_size": 7777,
+            "collaborators": "2",
+            "is_finished": True,
+            "category_ids": [4]
+        }
+        post_response = self.app.post('/api/v2/jobs', json=job_data)
+        job_id = json.loads(post_response.data)['job']['id']
+
+        response = self.app.get('/api/v2/jobs?min_work_size=7777&max_work_size=7777&category_id=4&team_leader_id=1')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(job_id, [job['id'] for job in data['jobs']])
+        self.assertTrue(all(job['work_size'] == 7777 for job in data['jobs']))
+
+        response = self.app.get('/api/jobs?min_work_size=7777&category_id=3')
+        data = json.loads(response.data)
+        self.assertNotIn(job_id, [job['id'] for job in data['jobs']])
+
+    def test_get_jobs_invalid_page_args(self):
+        """Тест некорректных параметров пагинации."""
+        response = self.app.get('/api/v2/jobs?limit=0')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/api/jobs?is_finished=maybe')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_jobs_ndjson(self):
+        """Тест потоковой выгрузки работ в формате NDJSON."""
+        job_data = {
+            "job_title": "Exported job",
+            "team_leader_id": 1,
+            "work_size": 8888,
+            "collaborators": "2",
+            "category_ids": [1, 2]
+        }
+        post_response = self.app.post('/api/v2/jobs', json=job_data)
+        job_id = json.loads(post_response.data)['job']['id']
+
+        response = self.app.get(f'/api/v2/jobs/export?since_id={job_id - 1}&min_work_size=8888')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(rows[0]['id'], job_id)
+        self.assertEqual(rows[0]['categories'], ["Engineering", "Science"])
+        self.assertTrue(all(row['id'] > job_id - 1 for row in rows))
+
+    def test_get_job_cached_until_update(self):
+        """Тест кэширования работы и сброса кэша после изменения."""
+        job_data = {
+            "job_title": "Cached job",
+            "team_leader_id": 1,
+            "work_size": 40,
+            "collaborators": "2,3",
+            "category_ids": [1]
+        }
+        post_response = self.app.post('/api/v2/jobs', json=job_data)
+        job_id = json.loads(post_response.data)['job']['id']
+
+        self.app.get(f'/api/jobs/{job_id}')
+        hits = json.loads(self.app.get('/api/v2/cache/stats').data)['responses']['hits']
+        response = self.app.get(f'/api/jobs/{job_id}')
+        self.assertEqual(json.loads(response.data)['job']['job_title'], "Cached job")
+        self.assertEqual(json.loads(self.app.get('/api/v2/cache/stats').data)['responses']['hits'], hits + 1)
+
+        self.app.put(f'/api/jobs/{job_id}', json={"job_title": "Updated cached job"})
+        response = self.app.get(f'/api/jobs/{job_id}')
+        self.assertEqual(json.loads(response.data)['job']['job_title'], "Updated cached job")
+        response = self.app.get(f'/api/v2/jobs/{job_id}')
+        self.assertEqual(json.loads(response.data)['job']['job_title'], "Updated cached job")
+
+    def test_get_job_conditional_etag(self):
+        """Тест условного запроса работы по ETag."""
+        job_data = {
+            "job_title": "Polled job",
+            "team_leader_id": 1,
+            "work_size": 40,
+            "collaborators": "2,3",
+            "category_ids": [1]
+        }
+        post_response = self.app.post('/api/v2/jobs', json=job_data)
+        job_id = json.loads(post_response.data)['job']['id']
+
+        response = self.app.get(f'/api/jobs/{job_id}')
+        etag = response.headers['ETag']
+        self.assertIsNotNone(response.last_modified)
+        response = self.app.get(f'/api/jobs/{job_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        list_etag = self.app.get('/api/v2/jobs').headers['ETag']
+        response = self.app.get('/api/v2/jobs', headers={'If-None-Match': list_etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.app.put(f'/api/v2/jobs/{job_id}', json={**job_data, "category_ids": [2]})
+        response = self.app.get(f'/api/jobs/{job_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['job']['categories'], [2])
+        response = self.app.get('/api/v2/jobs', headers={'If-None-Match': list_etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_follows_out_of_process_write(self):
+        """Тест: кэшированное тело не отдаётся под ETag новой версии после внешней записи."""
+        job_data = {"job_title": "Externally edited", "team_leader_id": 1, "work_size": 4, "category_ids": [1]}
+        job_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+        etag = self.app.get(f'/api/v2/jobs/{job_id}').headers['ETag']
+
+        with app.app_context():
+            path = db.engine.url.database
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute('UPDATE jobs SET job_title = ?, version = version + 1 WHERE id = ?',
+                               ('Edited elsewhere', job_id))
+        connection.close()
+
+        response = self.app.get(f'/api/v2/jobs/{job_id}', headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(json.loads(response.data)['job']['job_title'], 'Edited elsewhere')
+        response = self.app.get(f'/api/v2/jobs/{job_id}', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.app.delete(f'/api/v2/jobs/{job_id}')
+
+    def test_bulk_jobs(self):
+        """Тест пакетного создания, изменения и удаления работ."""
+        post_response = self.app.post('/api/v2/jobs', json={
+            "job_title": "Bulk target",
+            "team_leader_id": 1,
+            "work_size": 5,
+            "collaborators": "2",
+            "category_ids": [1]
+        })
+        job_id = json.loads(post_response.data)['job']['id']
+        items = [
+            {"job_title": "Bulk job 1", "team_leader_id": 1, "work_size": 10, "collaborators": "2",
+             "category_ids": [1, 2]},
+            {"job_title": "Bulk job 2", "team_leader_id": 2, "work_size": 20},
+            {"op": "update", "id": job_id, "is_finished": True, "category_ids": [3]},
+            {"job_title": "Broken job", "team_leader_id": 1, "work_size": 1, "category_ids": [999]},
+            {"op": "delete", "id": 999999},
+            {"job_title": "No size", "team_leader_id": 1}
+        ]
+        response = self.app.post('/api/v2/jobs/bulk?chunk_size=2', json=items)
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(data['success'])
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'created', 'updated', 'error', 'error', 'error'])
+        self.assertEqual(data['summary'], {'created': 2, 'updated': 1, 'deleted': 0, 'error': 3})
+
+        created_id = data['results'][0]['id']
+        job = json.loads(self.app.get(f'/api/v2/jobs/{created_id}').data)['job']
+        self.assertEqual(job['categories'], ["Engineering", "Science"])
+        job = json.loads(self.app.get(f'/api/v2/jobs/{job_id}').data)['job']
+        self.assertEqual(job['is_finished'], True)
+        self.assertEqual(job['categories'], ["Management"])
+
+        ndjson = '\n'.join(json.dumps({"op": "delete", "id": result['id']}) for result in data['results'][:3])
+        response = self.app.post('/api/v2/jobs/bulk', data=ndjson, content_type='application/x-ndjson')
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['summary']['deleted'], 3)
+        self.assertEqual(self.app.get(f'/api/v2/jobs/{job_id}').status_code, 404)
+
+    def test_bulk_jobs_rejects_bad_items_one_by_one(self):
+        job_id = json.loads(self.app.post('/api/v2/jobs', json={
+            "job_title": "Bulk order", "team_leader_id": 1, "work_size": 5
+        }).data)['job']['id']
+        items = [
+            {"job_title": "Good job", "team_leader_id": 1, "work_size": 1},
+            {"job_title": "Bad collaborators", "team_leader_id": 1, "work_size": 1, "collaborators": [2, 3]},
+            {"job_title": 7, "team_leader_id": 1, "work_size": 1},
+            {"job_title": "Bad size", "team_leader_id": 1, "work_size": "big"},
+            {"op": "delete", "id": job_id},
+            {"op": "update", "id": job_id, "work_size": 9},
+        ]
+        data = json.loads(self.app.post('/api/v2/jobs/bulk', json=items).data)
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'error', 'error', 'error', 'deleted', 'error'])
+        self.assertEqual(data['results'][1]['error'], 'Invalid data type for collaborators')
+        self.assertEqual(data['results'][5]['error'], 'Job is changed more than once')
+        self.assertEqual(self.app.get(f'/api/v2/jobs/{job_id}').status_code, 404)
+        self.app.delete(f"/api/v2/jobs/{data['results'][0]['id']}")
+
+    def test_search_jobs_by_title(self):
+        """Тест полнотекстового поиска работ по названию."""
+        job_data = {
+            "job_title": "Zephyrian telescope calibration",
+            "team_leader_id": 1,
+            "work_size": 12,
+            "collaborators": "2",
+            "category_ids": [2]
+        }
+        post_response = self.app.post('/api/v2/jobs', json=job_data)
+        job_id = json.loads(post_response.data)['job']['id']
+
+        response = self.app.get('/api/v2/jobs/search?q=zephyr')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([job['id'] for job in data['jobs']], [job_id])
+        self.assertEqual(data['jobs'][0]['categories'], ["Science"])
+
+        self.app.put(f'/api/jobs/{job_id}', json={"job_title": "Quasarian antenna repair"})
+        self.assertEqual(json.loads(self.app.get('/api/v2/jobs/search?q=zephyr').data)['jobs'], [])
+        data = json.loads(self.app.get('/api/v2/jobs/search?q=quasarian antenna').data)
+        self.assertEqual([job['id'] for job in data['jobs']], [job_id])
+
+        self.app.delete(f'/api/v2/jobs/{job_id}')
+        self.assertEqual(json.loads(self.app.get('/api/v2/jobs/search?q=quasarian').data)['jobs'], [])
+
+    def stats_for(self, group, key, group_id):
+        data = json.loads(self.app.get(f'/api/v2/stats/{group}').data)[group]
+        empty = {'jobs': 0, 'finished': 0, 'unfinished': 0, 'work_size': 0}
+        return next(({name: row[name] for name in empty} for row in data if row[key] == group_id), empty)
+
+    def test_stats_follow_job_writes(self):
+        """Тест инкрементального обновления статистики по работам."""
+        leader_before = self.stats_for('leaders', 'team_leader_id', 1)
+        science_before = self.stats_for('categories', 'category_id', 2)
+        management_before = self.stats_for('categories', 'category_id', 3)
+        totals_before = json.loads(self.app.get('/api/v2/stats').data)['totals']
+
+        job_data = {
+            "job_title": "Count the stars",
+            "team_leader_id": 1,
+            "work_size": 7,
+            "collaborators": "2",
+            "category_ids": [2]
+        }
+        job_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+        leader = self.stats_for('leaders', 'team_leader_id', 1)
+        self.assertEqual(leader['jobs'], leader_before['jobs'] + 1)
+        self.assertEqual(leader['unfinished'], leader_before['unfinished'] + 1)
+        self.assertEqual(leader['work_size'], leader_before['work_size'] + 7)
+        self.assertEqual(self.stats_for('categories', 'category_id', 2)['jobs'], science_before['jobs'] + 1)
+
+        self.app.put(f'/api/jobs/{job_id}', json={"is_finished": True, "work_size": 10, "categories": [3]})
+        leader = self.stats_for('leaders', 'team_leader_id', 1)
+        self.assertEqual(leader['finished'], leader_before['finished'] + 1)
+        self.assertEqual(leader['work_size'], leader_before['work_size'] + 10)
+        self.assertEqual(self.stats_for('categories', 'category_id', 2), science_before)
+        management = self.stats_for('categories', 'category_id', 3)
+        self.assertEqual(management['finished'], management_before['finished'] + 1)
+        self.assertEqual(management['work_size'], management_before['work_size'] + 10)
+
+        bulk = [{"op": "update", "id": job_id, "is_finished": False},
+                {"job_title": "Bulk counted", "team_leader_id": 1, "work_size": 5, "category_ids": [2]}]
+        response = self.app.post('/api/v2/jobs/bulk', json=bulk)
+        bulk_id = json.loads(response.data)['results'][1]['id']
+        leader = self.stats_for('leaders', 'team_leader_id', 1)
+        self.assertEqual(leader['jobs'], leader_before['jobs'] + 2)
+        self.assertEqual(leader['unfinished'], leader_before['unfinished'] + 2)
+        self.assertEqual(leader['work_size'], leader_before['work_size'] + 15)
+
+        self.app.delete(f'/api/v2/jobs/{job_id}')
+        self.app.post('/api/v2/jobs/bulk', json=[{"op": "delete", "id": bulk_id}])
+        self.assertEqual(self.stats_for('leaders', 'team_leader_id', 1), leader_before)
+        self.assertEqual(self.stats_for('categories', 'category_id', 2), science_before)
+        self.assertEqual(self.stats_for('categories', 'category_id', 3), management_before)
+        self.assertEqual(json.loads(self.app.get('/api/v2/stats').data)['totals'], totals_before)
+
+    def test_stats_rebuild_matches_incremental(self):
+        """Тест совпадения пересчитанной статистики с инкрементальной."""
+        self.app.post('/api/v2/jobs', json={"job_title": "Rebuild check", "team_leader_id": 1, "work_size": 3,
+                                            "collaborators": "", "category_ids": [1, 3]})
+        incremental = {group: json.loads(self.app.get(f'/api/v2/stats/{group}').data)[group]
+                       for group in ('leaders', 'categories', 'departments')}
+        result = app.test_cli_runner().invoke(args=['rebuild-stats'])
+        self.assertEqual(result.exit_code, 0)
+        for group, rows in incremental.items():
+            self.assertEqual(json.loads(self.app.get(f'/api/v2/stats/{group}').data)[group], rows)
+        self.assertEqual(self.app.get('/api/v2/stats/unknown').status_code, 404)
+
+
+class TestGroupCommit(unittest.TestCase):
+    def setUp(self):
+        self.group_app = create_app({'GROUP_COMMIT_ENABLED': True, 'GROUP_COMMIT_WINDOW_MS': 100})
+        self.client = self.group_app.test_client()
+        self.job_ids = [json.loads(self.client.post('/api/v2/jobs', json={
+            "job_title": f"Group commit {number}", "team_leader_id": 1, "work_size": 1, "category_ids": [1]
+        }).data)['job']['id'] for number in range(6)]
+        self.commits = []
+        with self.group_app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'commit', self.count_commit)
+
+    def tearDown(self):
+        event.remove(self.engine, 'commit', self.count_commit)
+        for job_id in self.job_ids:
+            self.client.delete(f'/api/v2/jobs/{job_id}')
+
+    def count_commit(self, connection):
+        self.commits.append(connection)
+
+    def test_concurrent_updates_share_one_commit(self):
+        """Тест объединения параллельных обновлений в одну транзакцию."""
+        finished_before = json.loads(self.client.get('/api/v2/stats').data)['totals']['finished']
+        self.assertFalse(json.loads(self.client.get(f'/api/v2/jobs/{self.job_ids[0]}').data)['job']['is_finished'])
+        update = {"job_title": "Group commit", "team_leader_id": 1, "work_size": 1, "is_finished": True}
+        requests = [(job_id, update) for job_id in self.job_ids]
+        requests += [(999999, update), (self.job_ids[0], {**update, "is_finished": False, "category_ids": [999]})]
+        responses = [None] * len(requests)
+        barrier = threading.Barrier(len(requests))
+
+        def put(index, job_id, data):
+            client = self.group_app.test_client()
+            barrier.wait()
+            responses[index] = client.put(f'/api/v2/jobs/{job_id}', json=data)
+
+        threads = [threading.Thread(target=put, args=(index, *request)) for index, request in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200] * 6 + [404, 400])
+        self.assertLess(len(self.commits), 6)
+        self.assertEqual(json.loads(responses[0].data)['job']['categories'], ["Engineering"])
+        for job_id in self.job_ids:
+            self.assertTrue(json.loads(self.client.get(f'/api/v2/jobs/{job_id}').data)['job']['is_finished'])
+        totals = json.loads(self.client.get('/api/v2/stats').data)['totals']
+        self.assertEqual(totals['finished'], finished_before + 6)
+
+    def test_failing_write_only_fails_itself(self):
+        """Тест изоляции ошибочной записи внутри общей транзакции."""
+        args = {"job_title": "Group commit", "team_leader_id": 1, "work_size": 5, "collaborators": None,
+                "is_finished": True, "category_ids": None}
+
+        def broken():
+            db.session.get(Jobs, self.job_ids[1]).work_size = 99
+            raise RuntimeError('broken write')
+
+        batch = [(lambda: JobsResource().update_job(self.job_ids[0], args), Future()),
+                 (broken, Future()),
+                 (lambda: JobsResource().update_job(self.job_ids[2], args), Future())]
+        with self.group_app.app_context():
+            self.group_app.extensions['group_commit'].commit_batch(batch)
+        self.assertEqual([future.result()[1] for _, future in batch], [200, 500, 200])
+        self.assertEqual(batch[1][1].result()[0]['error'], 'Database error: broken write')
+        jobs = [json.loads(self.client.get(f'/api/v2/jobs/{job_id}').data)['job'] for job_id in self.job_ids[:3]]
+        self.assertEqual([(job['work_size'], job['is_finished']) for job in jobs], [(5, True), (1, False), (5, True)])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,147 @@
+from flask import Response, current_app, stream_with_context
+from models import db, Jobs, Category, job_category, job_collaborator
+from serializers import dumps
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+def parse_bool_arg(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid value for {name}: expected true or false")
+
+
+def parse_int_arg(args, name, minimum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid value for {name}: expected an integer")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"Invalid value for {name}: must be at least {minimum}")
+    return value
+
+
+def parse_search_args(args, default_limit=20, max_limit=100):
+    offset = parse_int_arg(args, 'offset', minimum=0) or 0
+    limit = parse_int_arg(args, 'limit', minimum=1) or default_limit
+    return args.get('q', ''), min(limit, max_limit), offset
+
+
+def parse_page_args(args, default_limit=DEFAULT_PAGE_LIMIT):
+    after_id = parse_int_arg(args, 'after_id', minimum=0)
+    limit = parse_int_arg(args, 'limit', minimum=1)
+    if limit is None:
+        limit = default_limit
+    return after_id, min(limit, MAX_PAGE_LIMIT)
+
+
+def job_filters(args):
+    filters = []
+    is_finished = parse_bool_arg(args, 'is_finished')
+    if is_finished is not None:
+        filters.append(Jobs.is_finished == is_finished)
+    team_leader_id = parse_int_arg(args, 'team_leader_id')
+    if team_leader_id is not None:
+        filters.append(Jobs.team_leader_id == team_leader_id)
+    min_work_size = parse_int_arg(args, 'min_work_size')
+    if min_work_size is not None:
+        filters.append(Jobs.work_size >= min_work_size)
+    max_work_size = parse_int_arg(args, 'max_work_size')
+    if max_work_size is not None:
+        filters.append(Jobs.work_size <= max_work_size)
+    category_id = parse_int_arg(args, 'category_id')
+    if category_id is not None:
+        filters.append(Jobs.id.in_(
+            job_category.select()
+            .with_only_columns(job_category.c.job_id)
+            .where(job_category.c.category_id == category_id)
+        ))
+    collaborator_id = parse_int_arg(args, 'collaborator_id')
+    if collaborator_id is not None:
+        filters.append(Jobs.id.in_(
+            job_collaborator.select()
+            .with_only_columns(job_collaborator.c.job_id)
+            .where(job_collaborator.c.user_id == collaborator_id)
+        ))
+    return filters
+
+
+def keyset_page(query, id_column, after_id, limit):
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
+
+
+def keyset_rows(statement, id_column, after_id, limit):
+    if after_id is not None:
+        statement = statement.where(id_column > after_id)
+    statement = statement.order_by(id_column).limit(limit + 1)
+    rows = db.session.connection().execute(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+    return rows, next_cursor
+
+
+def stream_partitions(statement, id_column):
+    """Rows of ``statement`` in id order, EXPORT_BATCH_SIZE at a time, from one cursor."""
+    size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    return db.session.execute(statement.order_by(id_column).execution_options(yield_per=size)).partitions()
+
+
+def paged_partitions(statement, id_column):
+    """Like ``stream_partitions``, but every batch is its own keyset query.
+
+    No cursor stays open between batches, so the caller may commit in between (as
+    task handlers do to renew their lease); the batches are not one snapshot.
+    """
+    size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    after_id = None
+    while True:
+        rows, after_id = keyset_rows(statement, id_column, after_id, size)
+        if rows:
+            yield rows
+        if after_id is None:
+            return
+
+
+def category_names_by_job(job_ids):
+    names = {job_id: [] for job_id in job_ids}
+    if not job_ids:
+        return names
+    rows = db.session.execute(
+        db.select(job_category.c.job_id, Category.name)
+        .join(Category, Category.id == job_category.c.category_id)
+        .where(job_category.c.job_id.in_(job_ids))
+        .order_by(job_category.c.job_id, Category.id)
+    )
+    for job_id, name in rows:
+        names[job_id].append(name)
+    return names
+
+
+def ndjson_response(chunks):
+    return Response(stream_with_context(chunks), mimetype='application/x-ndjson')
+
+
+def ndjson_lines(rows):
+    return b''.join(dumps(row) + b'\n' for row in rows)
@@ -0,0 +1,18 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models import Jobs, User
+
+# Loader options for each list endpoint: to-many relationships are fetched with one
+# batched "SELECT ... WHERE id IN (...)" per page, so the query count does not depend
+# on the number of rows returned.
+JOBS_LIST_LOADING = (
+    selectinload(Jobs.categories),
+)
+
+JOBS_INDEX_LOADING = (
+    joinedload(Jobs.team_leader),
+    selectinload(Jobs.categories),
+)
+
+USERS_LIST_LOADING = (
+    selectinload(User.jobs).load_only(Jobs.id),
+)
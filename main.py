@@ -1,70 +1,202 @@
 # from flask import send_from_directory
-from flask import Flask, render_template, redirect, url_for, flash, jsonify
+from flask import (Flask, current_app, render_template, stream_template, redirect, url_for, flash, jsonify, request,
+                   abort)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from models import db, User, Jobs, Department, Category
 from forms import LoginForm, RegisterForm, AddJobForm, AddDepartmentForm, EditDepartmentForm
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.orm import Session
 from blueprints.jobs_api import jobs_api_blueprint
 from blueprints.users_api import users_api_blueprint
-from users_resource import UsersListResource, UsersResource
-from jobs_resource import JobsListResource, JobsResource
+from users_resource import UsersListResource, UsersResource, UsersExportResource, UsersSearchResource
+from jobs_resource import (JobsListResource, JobsResource, JobsExportResource, JobsBulkResource, UserJobsResource,
+                           JobsSearchResource)
+from departments_resource import DepartmentsSearchResource
+from stats_resource import StatsResource
+from tasks import TaskResource, task_queue
+from group_commit import group_commit
 from flask_restful import Api
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your_secret_key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import is_running_from_reloader
+from loading import JOBS_INDEX_LOADING
+from listing import job_filters, parse_page_args, keyset_page
+from cache import response_cache, identity_cache
+from migrations import upgrade_database
+from engine_profile import init_engine_profile
+from choices import choices_cache, fill_user_choices
+from stats import rebuild_stats_command
+from data_cli import data_cli
+from serializers import FastJSONProvider, output_json
+from metrics import request_metrics
+from profiler import request_profiler
+from credentials import credentials, auth_throttle, CredentialsBusy
+
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your_secret_key',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///database.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'DATABASE_PROFILE': 'wal',
+}
+
+# Overrides for multi-process deployments (see wsgi.py and gunicorn.conf.py). The response
+# and identity caches are per process and only invalidated by writes handled in that
+# process, so other workers may serve a cached body for up to RESPONSE_CACHE_TTL seconds
+# and keep a deleted or renamed user logged in for up to IDENTITY_CACHE_TTL seconds.
+PRODUCTION_CONFIG = {
+    'DEBUG': False,
+    'TESTING': False,
+    'TEMPLATES_AUTO_RELOAD': False,
+    'EXPLAIN_TEMPLATE_LOADING': False,
+    'RESPONSE_CACHE_TTL': 5,
+    'IDENTITY_CACHE_TTL': 5,
+    'TASK_AUTOSTART': True,
+    'SECRET_KEY_REQUIRED': True,
+}
 
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-app.register_blueprint(jobs_api_blueprint)
-app.register_blueprint(users_api_blueprint)
 
-api = Api(app)
-api.add_resource(UsersListResource, '/api/v2/users')
-api.add_resource(UsersResource, '/api/v2/users/<int:user_id>')
+def create_app(config=None):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_prefixed_env()
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    if app.config.get('SECRET_KEY_REQUIRED') and app.config['SECRET_KEY'] in (None, '', DEFAULT_CONFIG['SECRET_KEY']):
+        raise ValueError("Set FLASK_SECRET_KEY: the production profile does not sign sessions with the default key")
+
+    trusted_proxies = app.config.get('TRUSTED_PROXY_COUNT', 0)
+    if trusted_proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies,
+                                x_host=trusted_proxies)
+    init_engine_profile(app, db)
+    request_metrics.init_app(app, db)
+    request_profiler.init_app(app, db)
+    credentials.init_app(app)
+    auth_throttle.init_app(app)
+    task_queue.init_app(app, db)
+    group_commit.init_app(app, db)
+    response_cache.init_app(app)
+    identity_cache.init_app(app)
+    choices_cache.init_app(app)
+    with app.app_context():
+        upgrade_database()
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(data_cli)
+    login_manager.init_app(app)
+
+    app.register_blueprint(jobs_api_blueprint)
+    app.register_blueprint(users_api_blueprint)
+    register_api(app)
+    register_pages(app)
+    return app
+
+
+def register_api(app):
+    api = Api(app)
+    api.representations['application/json'] = output_json
+    api.add_resource(UsersListResource, '/api/v2/users')
+    api.add_resource(UsersResource, '/api/v2/users/<int:user_id>')
+    api.add_resource(UsersExportResource, '/api/v2/users/export')
+    api.add_resource(UsersSearchResource, '/api/v2/users/search', endpoint='users_search')
+    api.add_resource(UserJobsResource, '/api/v2/users/<int:user_id>/jobs')
+
+    api.add_resource(JobsListResource, '/api/v2/jobs')
+    api.add_resource(JobsResource, '/api/v2/jobs/<int:job_id>')
+    api.add_resource(JobsExportResource, '/api/v2/jobs/export')
+    api.add_resource(JobsBulkResource, '/api/v2/jobs/bulk')
+    api.add_resource(JobsSearchResource, '/api/v2/jobs/search')
+
+    api.add_resource(DepartmentsSearchResource, '/api/v2/departments/search')
+
+    api.add_resource(StatsResource, '/api/v2/stats', '/api/v2/stats/<string:group>')
+    api.add_resource(TaskResource, '/api/v2/tasks/<int:task_id>')
+    app.add_url_rule('/api/v2/cache/stats', view_func=cache_stats)
+
+
+def register_pages(app):
+    app.register_error_handler(404, handle_404_error)
+    app.register_error_handler(500, handle_500_error)
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/login', view_func=login, methods=['GET', 'POST'])
+    app.add_url_rule('/register', view_func=register, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', view_func=logout)
+    app.add_url_rule('/addjob', view_func=add_job, methods=['GET', 'POST'])
+    app.add_url_rule('/editjob/<int:job_id>', view_func=edit_job, methods=['GET', 'POST'])
+    app.add_url_rule('/deletejob/<int:job_id>', view_func=delete_job, methods=['POST'])
+    app.add_url_rule('/departments', view_func=list_departments)
+    app.add_url_rule('/add_department', view_func=add_department, methods=['GET', 'POST'])
+    app.add_url_rule('/edit_department/<int:department_id>', view_func=edit_department, methods=['GET', 'POST'])
+    app.add_url_rule('/delete_department/<int:department_id>', view_func=delete_department, methods=['POST'])
 
-api.add_resource(JobsListResource, '/api/v2/jobs')
-api.add_resource(JobsResource, '/api/v2/jobs/<int:job_id>')
 
 # @app.route('/favicon1.ico')
 # def favicon():
 #     return send_from_directory(app.static_folder, 'favicon1.ico', mimetype='image/vnd.microsoft.icon')
 
 
-@app.errorhandler(404)
+def cache_stats():
+    return jsonify({'responses': response_cache.stats(), 'identities': identity_cache.stats()})
+
+
 def handle_404_error(error):
     return jsonify({'error': 'Job not found', 'description': str(error)}), 404
 
 
-@app.errorhandler(500)
 def handle_500_error(error):
     return jsonify({'error': 'Internal Server Error', 'description': str(error)}), 500
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    session = Session(db.engine)
-    return session.get(User, int(user_id))
+    return identity_cache.load(int(user_id))
 
 
-@app.route('/')
 @login_required
 def index():
-    jobs = db.session.all()
-    return render_template('index.html', jobs=jobs)
+    try:
+        after_id, limit = parse_page_args(request.args, current_app.config.get('DASHBOARD_PAGE_SIZE', 50))
+        filters = job_filters(request.args)
+    except ValueError:
+        abort(400)
+
+    query = Jobs.query.options(*JOBS_INDEX_LOADING).filter(*filters)
+    jobs, next_cursor = keyset_page(query, Jobs.id, after_id, limit)
+    page_args = {name: value for name, value in request.args.items() if name != 'after_id'}
+    return stream_template('index.html', jobs=jobs, next_cursor=next_cursor, after_id=after_id,
+                           page_args=page_args)
+
+
+def throttled(template, form, retry_after):
+    flash('Слишком много попыток. Попробуйте позже.', 'danger')
+    response = current_app.make_response((render_template(template, form=form), 429))
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    return response
+
+
+def credentials_busy(template, form):
+    flash('Сервер перегружен. Попробуйте позже.', 'danger')
+    response = current_app.make_response((render_template(template, form=form), 503))
+    response.headers['Retry-After'] = '1'
+    return response
 
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
+        retry_after = auth_throttle.retry_after(request.remote_addr, form.email.data)
+        if retry_after:
+            return throttled('login.html', form, retry_after)
         user = User.query.filter_by(email=form.email.data).first()
-        if user and check_password_hash(user.password, form.password.data):
+        try:
+            valid = user is not None and credentials.check_password(user, form.password.data)
+        except CredentialsBusy:
+            return credentials_busy('login.html', form)
+        if valid:
+            if db.session.dirty:
+                db.session.commit()
             login_user(user, remember=form.remember.data)
             flash('Вы успешно вошли!', 'success')
             return redirect(url_for('index'))
@@ -73,15 +205,20 @@ def login():
     return render_template('login.html', form=form)
 
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
+        retry_after = auth_throttle.retry_after(request.remote_addr, form.email.data)
+        if retry_after:
+            return throttled('register.html', form, retry_after)
         if User.query.filter_by(email=form.email.data).first():
             flash('Пользователь с таким email уже существует.', 'danger')
             return redirect(url_for('register'))
 
-        hashed_password = generate_password_hash(form.password.data)
+        try:
+            hashed_password = credentials.hash_password(form.password.data)
+        except CredentialsBusy:
+            return credentials_busy('register.html', form)
         new_user = User(
             email=form.email.data,
             password=hashed_password,
@@ -102,7 +239,6 @@ def register():
     return render_template('register.html', form=form)
 
 
-@app.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -110,14 +246,11 @@ def logout():
     return redirect(url_for('login'))
 
 
-@app.route('/addjob', methods=['GET', 'POST'])
 @login_required
 def add_job():
     form = AddJobForm()
-    users = User.query.all()
-    form.team_leader_id.choices = [(user.id, user.name) for user in users]
-    categories = Category.query.all()
-    form.category_ids.choices = [(category.id, category.name) for category in categories]
+    fill_user_choices(form.team_leader_id)
+    form.category_ids.choices = choices_cache.category_choices()
 
     if form.validate_on_submit():
         new_job = Jobs(
@@ -137,7 +270,6 @@ def add_job():
     return render_template('addjob.html', form=form, title='Add Job')
 
 
-@app.route('/editjob/<int:job_id>', methods=['GET', 'POST'])
 @login_required
 def edit_job(job_id):
     job = db.session.get_or_404(Jobs, job_id)
@@ -146,10 +278,8 @@ def edit_job(job_id):
         return redirect(url_for('index'))
 
     form = AddJobForm()
-    users = User.query.all()
-    form.team_leader_id.choices = [(user.id, user.name) for user in users]
-    categories = Category.query.all()
-    form.category_ids.choices = [(category.id, category.name) for category in categories]
+    fill_user_choices(form.team_leader_id)
+    form.category_ids.choices = choices_cache.category_choices()
     if form.validate_on_submit():
         job.job_title = form.job_title.data
         job.team_leader_id = form.team_leader_id.data
@@ -172,7 +302,6 @@ def edit_job(job_id):
     return render_template('addjob.html', form=form, title='Edit Job')
 
 
-@app.route('/deletejob/<int:job_id>', methods=['POST'])
 @login_required
 def delete_job(job_id):
     job = db.session.get_or_404(Jobs, job_id)
@@ -186,19 +315,16 @@ def delete_job(job_id):
     return redirect(url_for('index'))
 
 
-@app.route('/departments')
 @login_required
 def list_departments():
     departments = Department.query.all()
     return render_template('departments.html', departments=departments)
 
 
-@app.route('/add_department', methods=['GET', 'POST'])
 @login_required
 def add_department():
     form = AddDepartmentForm()
-    users = User.query.all()
-    form.chief_id.choices = [(user.id, user.name) for user in users]
+    fill_user_choices(form.chief_id)
     if form.validate_on_submit():
         new_department = Department(
             title=form.title.data,
@@ -213,13 +339,11 @@ def add_department():
     return render_template('add_department.html', form=form, title='Add Department')
 
 
-@app.route('/edit_department/<int:department_id>', methods=['GET', 'POST'])
 @login_required
 def edit_department(department_id):
     department = Department.query.get_or_404(department_id)
     form = EditDepartmentForm()
-    users = User.query.all()
-    form.chief_id.choices = [(user.id, user.name) for user in users]
+    fill_user_choices(form.chief_id)
     if form.validate_on_submit():
         department.title = form.title.data
         department.chief_id = form.chief_id.data
@@ -236,7 +360,6 @@ def edit_department(department_id):
     return render_template('edit_department.html', form=form, title='Edit Department')
 
 
-@app.route('/delete_department/<int:department_id>', methods=['POST'])
 @login_required
 def delete_department(department_id):
     department = Department.query.get_or_404(department_id)
@@ -251,4 +374,7 @@ def delete_department(department_id):
 
 
 if __name__ == '__main__':
+    app = create_app()
+    if is_running_from_reloader():
+        app.extensions['task_queue'].start()
     app.run(debug=True)
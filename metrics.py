@@ -0,0 +1,203 @@
+import hmac
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+from profiler import is_admin
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+slow_query_log = logging.getLogger('slow_queries')
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{format_labels((*labels, ("le", bound)))}}} {cumulative}'
+        yield f'{name}_sum{{{format_labels(labels)}}} {self.sum}'
+        yield f'{name}_count{{{format_labels(labels)}}} {self.count}'
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.sampled = 0
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+class AppMetrics:
+    """The settings and counters of one app, kept in ``app.extensions['metrics']``."""
+
+    def __init__(self, config):
+        self.enabled = config.get('METRICS_ENABLED', True)
+        self.sample_rate = config.get('METRICS_SAMPLE_RATE', 0.1)
+        self.slow_query_threshold = config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+        self.token = config.get('METRICS_TOKEN')
+        self.slow_queries = 0
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def authorized(self, authorization):
+        """Whether an Authorization header carries METRICS_TOKEN (never when no token is set)."""
+        scheme, _, token = authorization.partition(' ')
+        if not self.token or scheme.lower() != 'bearer':
+            return False
+        return hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    def _start_request(self):
+        # [start time, [statements, seconds] for requests sampled for SQL timing]
+        g.metrics = [time.perf_counter(), [0, 0.0] if random.random() < self.sample_rate else None]
+
+    def _finish_request(self, response):
+        state = g.pop('metrics', None)
+        if state is not None:
+            self.observe_request(state, response.status_code, response.content_length)
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop('metrics', None)
+        if state is not None and exc is not None:
+            self.observe_request(state, 500, None)
+
+    def observe_request(self, state, status, size):
+        started, sql = state
+        elapsed = time.perf_counter() - started
+        current = request._get_current_object()
+        key = (current.endpoint or 'unmatched', current.method)
+        with self._lock:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = EndpointMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            if status >= 500:
+                metrics.errors += 1
+            metrics.latency.observe(elapsed)
+            if size is not None:
+                metrics.response_size.observe(size)
+            if sql is not None:
+                metrics.sampled += 1
+                metrics.sql_statements += sql[0]
+                metrics.sql_seconds += sql[1]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_started'].pop()
+        in_request = has_request_context()
+        if in_request:
+            state = g.get('metrics')
+            if state is not None and state[1] is not None:
+                state[1][0] += 1
+                state[1][1] += elapsed
+        if elapsed >= self.slow_query_threshold:
+            with self._lock:
+                self.slow_queries += 1
+            slow_query_log.warning(
+                'Slow query (%.1f ms) on %s: %s; parameters: %.1000r',
+                elapsed * 1000, request.endpoint if in_request else '-', statement, parameters
+            )
+
+    def render(self):
+        with self._lock:
+            endpoints = sorted(self._endpoints.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+            lines = [
+                '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (endpoint, method), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    labels = (('endpoint', endpoint), ('method', method), ('status', status))
+                    lines.append(f'http_requests_total{{{format_labels(labels)}}} {count}')
+            lines += [
+                '# HELP http_request_errors_total Requests that ended in a 5xx response or an unhandled exception.',
+                '# TYPE http_request_errors_total counter',
+            ]
+            lines += [f'http_request_errors_total{{{format_labels((("endpoint", endpoint), ("method", method)))}}} '
+                      f'{metrics.errors}' for (endpoint, method), metrics in endpoints]
+            for name, kind, help_text in (
+                ('http_request_duration_seconds', 'latency', 'Time spent in the Flask app per request.'),
+                ('http_response_size_bytes', 'response_size', 'Response body size, when known up front.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (endpoint, method), metrics in endpoints:
+                    lines.extend(getattr(metrics, kind).samples(name, (('endpoint', endpoint), ('method', method))))
+            for name, attribute, help_text in (
+                ('http_requests_sampled_total', 'sampled', 'Requests sampled for SQL instrumentation.'),
+                ('http_request_sql_statements_total', 'sql_statements', 'SQL statements run by sampled requests.'),
+                ('http_request_sql_seconds_total', 'sql_seconds', 'Time spent in SQL by sampled requests.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{{format_labels((("endpoint", endpoint), ("method", method)))}}} '
+                          f'{getattr(metrics, attribute)}' for (endpoint, method), metrics in endpoints]
+            lines += [
+                '# HELP sql_slow_queries_total Statements slower than SLOW_QUERY_THRESHOLD_MS.',
+                '# TYPE sql_slow_queries_total counter',
+                f'sql_slow_queries_total {self.slow_queries}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.slow_queries = 0
+
+
+class RequestMetrics:
+    def init_app(self, app, db):
+        metrics = app.extensions['metrics'] = AppMetrics(app.config)
+        if not metrics.enabled:
+            return
+        app.before_request(metrics._start_request)
+        app.after_request(metrics._finish_request)
+        app.teardown_request(metrics._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', metrics._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', metrics._after_cursor_execute)
+
+    def metrics_view(self):
+        """Prometheus text format, for ``Authorization: Bearer <METRICS_TOKEN>`` or a logged-in admin.
+
+        Requests answered by the async views of asgi.py never reach the Flask hooks and
+        are not counted.
+        """
+        metrics = current_app.extensions['metrics']
+        if not (metrics.authorized(request.headers.get('Authorization', '')) or is_admin()):
+            return jsonify({'error': 'Admin access or the metrics token required'}), 403
+        return Response(metrics.render(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+request_metrics = RequestMetrics()
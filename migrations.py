@@ -0,0 +1,73 @@
+from sqlalchemy import inspect, text
+from models import db, utcnow
+from collaborators import backfill_collaborators
+from search import install_search_indexes
+from stats import rebuild_stats
+
+
+def add_column(connection, table, column, definition):
+    inspector = inspect(connection)
+    if not inspector.has_table(table):
+        return
+    if column not in {existing['name'] for existing in inspector.get_columns(table)}:
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+
+
+def create_index(connection, name, table, columns):
+    if inspect(connection).has_table(table):
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+
+
+def add_row_versions(connection):
+    for table in ('user', 'jobs'):
+        add_column(connection, table, 'version', 'INTEGER NOT NULL DEFAULT 1')
+        add_column(connection, table, 'updated_at', 'DATETIME')
+
+
+def add_user_name_index(connection):
+    create_index(connection, 'ix_user_name', 'user', ['name'])
+
+
+def add_lookup_indexes(connection):
+    create_index(connection, 'ix_jobs_team_leader_id_is_finished', 'jobs', ['team_leader_id', 'is_finished'])
+    create_index(connection, 'ix_jobs_is_finished', 'jobs', ['is_finished'])
+    create_index(connection, 'ix_department_chief_id', 'department', ['chief_id'])
+    create_index(connection, 'ix_job_category_category_id', 'job_category', ['category_id', 'job_id'])
+
+
+def add_work_size_index(connection):
+    create_index(connection, 'ix_jobs_work_size', 'jobs', ['work_size'])
+
+
+def add_team_leader_order_index(connection):
+    # Pages of one leader's jobs in id order, without sorting all of them.
+    create_index(connection, 'ix_jobs_team_leader_id_id', 'jobs', ['team_leader_id', 'id'])
+
+
+MIGRATIONS = [
+    ('0001_row_versions', add_row_versions),
+    ('0002_user_name_index', add_user_name_index),
+    ('0003_job_collaborators', backfill_collaborators),
+    ('0004_lookup_indexes', add_lookup_indexes),
+    ('0005_search_indexes', install_search_indexes),
+    ('0006_job_stats', rebuild_stats),
+    ('0007_work_size_index', add_work_size_index),
+    ('0008_team_leader_order_index', add_team_leader_order_index),
+]
+
+
+def upgrade_database():
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migration (name VARCHAR(100) PRIMARY KEY, applied_at DATETIME)'
+        ))
+        applied = set(connection.execute(text('SELECT name FROM schema_migration')).scalars())
+        db.metadata.create_all(connection)
+        for name, migration in MIGRATIONS:
+            if name in applied:
+                continue
+            migration(connection)
+            connection.execute(
+                text('INSERT INTO schema_migration (name, applied_at) VALUES (:name, :applied_at)'),
+                {'name': name, 'applied_at': utcnow()}
+            )
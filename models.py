@@ -1,18 +1,27 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
 db = SQLAlchemy()
 
 
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'user'
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(100), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)
     city_from = db.Column(db.String(100), nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     jobs = db.relationship('Jobs', backref='team_leader', lazy=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
 
 class Category(db.Model):
     __tablename__ = 'category'
@@ -23,7 +32,15 @@ class Category(db.Model):
 job_category = db.Table(
     'job_category',
     db.Column('job_id', db.Integer, db.ForeignKey('jobs.id'), primary_key=True),
-    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True),
+    db.Index('ix_job_category_category_id', 'category_id', 'job_id')
+)
+
+
+job_collaborator = db.Table(
+    'job_collaborator',
+    db.Column('job_id', db.Integer, db.ForeignKey('jobs.id'), primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
 )
 
 
@@ -35,12 +52,22 @@ class Jobs(db.Model):
     work_size = db.Column(db.Integer, nullable=False)
     collaborators = db.Column(db.String)
     is_finished = db.Column(db.Boolean, default=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+    __mapper_args__ = {'version_id_col': version}
+    __table_args__ = (
+        db.Index('ix_jobs_team_leader_id_is_finished', 'team_leader_id', 'is_finished'),
+        db.Index('ix_jobs_team_leader_id_id', 'team_leader_id', 'id'),
+        db.Index('ix_jobs_is_finished', 'is_finished'),
+        db.Index('ix_jobs_work_size', 'work_size'),
+    )
 
     categories = db.relationship(
         'Category',
         secondary=job_category,
         backref=db.backref('jobs', lazy='dynamic'),
-        lazy='dynamic'
+        lazy='select'
     )
 
 
@@ -48,7 +75,60 @@ class Department(db.Model):
     __tablename__ = 'department'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    chief_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    chief_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     members = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=False)
-    chief = db.relationship('User', foreign_keys=[chief_id])
\ No newline at end of file
+    chief = db.relationship('User', foreign_keys=[chief_id])
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=utcnow)
+
+
+class LeaderJobStats(db.Model):
+    __tablename__ = 'leader_job_stats'
+    team_leader_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    jobs_count = db.Column(db.Integer, nullable=False, default=0)
+    finished_count = db.Column(db.Integer, nullable=False, default=0)
+    work_size_total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CategoryJobStats(db.Model):
+    __tablename__ = 'category_job_stats'
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    jobs_count = db.Column(db.Integer, nullable=False, default=0)
+    finished_count = db.Column(db.Integer, nullable=False, default=0)
+    work_size_total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Task(db.Model):
+    __tablename__ = 'task'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False)
+    progress = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=utcnow)
+    lease_expires = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_task_status_run_after', 'status', 'run_after'),
+    )
+
+
+class TaskProgress(db.Model):
+    """Append-only progress entries of a running task, kept until it finishes."""
+    __tablename__ = 'task_progress'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False, index=True)
+    entry = db.Column(db.Text, nullable=False)
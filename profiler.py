@@ -0,0 +1,184 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, request, send_file
+from flask_login import current_user
+from sqlalchemy import event
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ARG = '_profile'
+
+
+def is_admin():
+    return current_user.is_authenticated and current_user.id == 1
+
+
+class ProfileStore:
+    """Bounded ring buffer of request profiles on disk.
+
+    Each profile is a pstats dump (``<id>.prof``, readable by pstats, snakeviz or
+    flameprof) next to a JSON summary (``<id>.json``) with the request, timings and
+    the SQL statements it issued. Only the newest ``keep`` profiles are retained.
+    """
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def path(self, profile_id, extension):
+        if not profile_id.isdigit():
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.{extension}')
+        return path if os.path.exists(path) else None
+
+    def ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+
+    def save(self, profile, summary):
+        profile_id = str(time.time_ns())
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+            summary_path = os.path.join(self.directory, f'{profile_id}.json')
+            with open(summary_path + '.tmp', 'w') as file:
+                json.dump({'id': profile_id, **summary}, file, indent=1, default=repr)
+            os.replace(summary_path + '.tmp', summary_path)
+            for old_id in self.ids()[self.keep:]:
+                for extension in ('prof', 'json'):
+                    try:
+                        os.remove(os.path.join(self.directory, f'{old_id}.{extension}'))
+                    except FileNotFoundError:
+                        pass
+        return profile_id
+
+    def summary(self, profile_id):
+        path = self.path(profile_id, 'json')
+        if path is None:
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+
+class AppProfiler:
+    """The profile store and settings of one app, kept in ``app.extensions['profiler']``."""
+
+    def __init__(self, app):
+        self.store = ProfileStore(app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'),
+                                  app.config.get('PROFILE_KEEP', 20))
+        self.max_statements = app.config.get('PROFILE_MAX_STATEMENTS', 500)
+
+    def requested(self):
+        flag = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_ARG)
+        return flag not in (None, '', '0') and is_admin()
+
+    def _start_request(self):
+        if not self.requested():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread.
+            return
+        g.profile = (profile, [], time.perf_counter())
+
+    def _finish_request(self, response):
+        state = g.pop('profile', None)
+        if state is not None:
+            profile_id = self.save(state, response.status_code)
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop('profile', None)
+        if state is not None:
+            self.save(state, 500)
+
+    def save(self, state, status):
+        profile, statements, started = state
+        profile.disable()
+        elapsed = time.perf_counter() - started
+        top = io.StringIO()
+        pstats.Stats(profile, stream=top).sort_stats('cumulative').print_stats(25)
+        return self.store.save(profile, {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 3),
+            'sql_count': len(statements),
+            'sql_ms': round(sum(statement['duration_ms'] for statement in statements), 3),
+            'sql': statements[:self.max_statements],
+            'top_functions': top.getvalue(),
+        })
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profile' in g:
+            conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not (has_request_context() and 'profile' in g):
+            return
+        started = conn.info.get('profile_query_started')
+        if not started:
+            return
+        g.profile[1].append({
+            'statement': statement,
+            'parameters': parameters,
+            'duration_ms': round((time.perf_counter() - started.pop()) * 1000, 3),
+        })
+
+    def list_view(self):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        profiles = []
+        for profile_id in self.store.ids():
+            summary = self.store.summary(profile_id)
+            if summary is not None:
+                profiles.append({key: summary[key] for key in
+                                 ('id', 'method', 'path', 'endpoint', 'status', 'duration_ms', 'sql_count', 'sql_ms')})
+        return jsonify({'profiles': profiles})
+
+    def show_view(self, profile_id):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        summary = self.store.summary(profile_id)
+        if summary is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return jsonify({'profile': summary})
+
+    def download_view(self, profile_id):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        path = self.store.path(profile_id, 'prof')
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+
+
+class RequestProfiler:
+    def init_app(self, app, db):
+        if not app.config.get('PROFILER_ENABLED', True):
+            return
+        profiler = app.extensions['profiler'] = AppProfiler(app)
+        app.before_request(profiler._start_request)
+        app.after_request(profiler._finish_request)
+        app.teardown_request(profiler._teardown_request)
+        app.add_url_rule('/api/v2/profiles', 'profiles', profiler.list_view)
+        app.add_url_rule('/api/v2/profiles/<profile_id>', 'profile', profiler.show_view)
+        app.add_url_rule('/api/v2/profiles/<profile_id>/pstats', 'profile_pstats', profiler.download_view)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', profiler._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', profiler._after_cursor_execute)
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,180 @@
+import tempfile
+import unittest
+import json
+from contextlib import contextmanager
+from sqlalchemy import event
+from main import create_app
+from models import db, User
+from choices import choices_cache
+
+app = create_app()
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+class TestQueryCounts(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        with app.app_context():
+            db.create_all()
+        user_data = {
+            "email": "queries@example.com",
+            "password": "securepassword",
+            "name": "Query Counter",
+            "city_from": "Moscow"
+        }
+        response = self.app.post('/api/v2/users', json=user_data)
+        if response.status_code == 201:
+            self.user_id = json.loads(response.data)['user']['id']
+        else:
+            users = json.loads(self.app.get('/api/v2/users/search?q=Query Counter').data)['users']
+            self.user_id = users[0]['id']
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+
+    def add_jobs(self, count):
+        for index in range(count):
+            job_data = {
+                "job_title": f"Query count job {index}",
+                "team_leader_id": self.user_id,
+                "work_size": 10,
+                "collaborators": "1",
+            }
+            self.app.post('/api/v2/jobs', json=job_data)
+
+    def assert_fixed_query_count(self, url, expected):
+        self.add_jobs(2)
+        with count_queries() as few:
+            self.assertEqual(self.app.get(url).status_code, 200)
+        self.add_jobs(5)
+        with count_queries() as many:
+            self.assertEqual(self.app.get(url).status_code, 200)
+        self.assertEqual(len(few), expected)
+        self.assertEqual(len(many), expected)
+
+    def test_jobs_blueprint_list_query_count(self):
+        self.assert_fixed_query_count('/api/jobs?limit=1000', 2)
+
+    def test_jobs_resource_list_query_count(self):
+        self.assert_fixed_query_count('/api/v2/jobs?limit=1000', 2)
+
+    def test_users_blueprint_list_query_count(self):
+        self.assert_fixed_query_count('/api/users', 2)
+
+    def test_orm_list_query_count(self):
+        app.config['FAST_LIST_ENDPOINTS'] = ()
+        try:
+            self.assert_fixed_query_count('/api/v2/jobs?limit=1000', 3)
+            self.assert_fixed_query_count('/api/users', 3)
+        finally:
+            del app.config['FAST_LIST_ENDPOINTS']
+
+    def test_fast_lists_match_orm_lists(self):
+        self.add_jobs(3)
+        self.app.post('/api/v2/jobs', json={"job_title": "Categorized", "team_leader_id": self.user_id,
+                                            "work_size": 3, "collaborators": "", "category_ids": [2, 1, 4]})
+        urls = ['/api/jobs?limit=1000', '/api/v2/jobs?limit=1000', f'/api/v2/jobs?team_leader_id={self.user_id}',
+                '/api/v2/jobs?category_id=1&limit=5', '/api/users', '/api/v2/users']
+        app.extensions['response_cache'].enabled = False
+        try:
+            fast = [json.loads(self.app.get(url).data) for url in urls]
+            app.config['FAST_LIST_ENDPOINTS'] = ()
+            orm = [json.loads(self.app.get(url).data) for url in urls]
+            for user in orm[urls.index('/api/users')]['users']:
+                user['jobs'].sort()
+        finally:
+            app.extensions['response_cache'].enabled = True
+            app.config.pop('FAST_LIST_ENDPOINTS', None)
+        for url, fast_data, orm_data in zip(urls, fast, orm):
+            with self.subTest(url=url):
+                self.assertEqual(fast_data, orm_data)
+
+    def test_index_query_count(self):
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+        self.app.get('/')
+        self.assert_fixed_query_count('/', 2)
+
+    def test_index_paginated(self):
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+        self.add_jobs(3)
+        response = self.app.get(f'/?team_leader_id={self.user_id}&limit=2')
+        self.assertEqual(response.status_code, 200)
+        page = response.data.decode()
+        self.assertEqual(page.count('<table'), 1)
+        self.assertEqual(page.count('Edit</a>'), 2)
+        self.assertIn('Next page', page)
+
+    def login(self):
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+
+    def test_form_choices_cached(self):
+        self.login()
+        self.app.get('/addjob')
+        with count_queries() as statements:
+            self.assertEqual(self.app.get('/addjob').status_code, 200)
+        self.assertFalse(any('FROM user ORDER BY' in statement for statement in statements))
+
+        self.app.post('/api/v2/users', json={
+            "email": "choices@example.com",
+            "password": "securepassword",
+            "name": "Choices User",
+            "city_from": "Moscow"
+        })
+        self.assertIn('Choices User', self.app.get('/add_department').data.decode())
+
+    def test_form_switches_to_typeahead(self):
+        self.login()
+        choices = app.extensions['choices_cache']
+        limit = choices.max_user_choices
+        choices.max_user_choices = 0
+        choices._entries.clear()
+        try:
+            page = self.app.get('/addjob').data.decode()
+        finally:
+            choices.max_user_choices = limit
+            choices._entries.clear()
+        self.assertIn('<datalist id="team_leader_id-options">', page)
+        self.assertNotIn('<select class="form-select" id="team_leader_id"', page)
+
+    def test_choices_are_per_app(self):
+        with tempfile.TemporaryDirectory() as directory:
+            apps = [create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/{name}.db'}) for name in 'ab']
+            try:
+                for other_app, name in zip(apps, ('Alice-A', 'Alice-B')):
+                    with other_app.app_context():
+                        db.session.add(User(name=name, email=f'{name}@example.com', password='x', city_from='Omsk'))
+                        db.session.commit()
+                for other_app, name in zip(apps, ('Alice-A', 'Alice-B')):
+                    with other_app.app_context():
+                        self.assertEqual(choices_cache.user_choices(), [(1, name)])
+            finally:
+                for other_app in apps:
+                    with other_app.app_context():
+                        db.engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
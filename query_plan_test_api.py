@@ -0,0 +1,120 @@
+import unittest
+import json
+from sqlalchemy import event
+from main import create_app
+from models import db
+
+app = create_app()
+
+PAGINATION_ENDPOINTS = [
+    '/api/v2/jobs',
+    '/api/v2/jobs?after_id=1&limit=10',
+]
+
+HOT_ENDPOINTS = PAGINATION_ENDPOINTS + [
+    '/api/v2/jobs?is_finished=true',
+    '/api/v2/jobs?team_leader_id={user_id}',
+    '/api/v2/jobs?team_leader_id={user_id}&is_finished=false',
+    '/api/v2/jobs?category_id=1',
+    '/api/v2/jobs?collaborator_id={user_id}',
+    '/api/v2/jobs?min_work_size=10&max_work_size=20',
+    '/api/v2/jobs/{job_id}',
+    '/api/jobs?is_finished=false&category_id=2',
+    '/api/jobs/{job_id}',
+    '/api/v2/users/{user_id}',
+    '/api/users/{user_id}',
+    '/api/v2/users/{user_id}/jobs',
+    '/api/v2/users/search?q=Plan',
+]
+
+
+# What plain pagination should do: read jobs in rowid order and stop after a page.
+ROWID_WALKS = {'SCAN jobs', 'SEARCH jobs USING INTEGER PRIMARY KEY (rowid>?)'}
+
+# Filters no single index can return in id order: a work_size range, and a leader's
+# jobs OR'ed with the jobs they collaborate on. These sort only the rows they match.
+SORTING_ENDPOINTS = {
+    '/api/v2/jobs?min_work_size=10&max_work_size=20',
+    '/api/v2/users/{user_id}/jobs',
+}
+
+
+def full_scans(connection, statement, parameters):
+    """Plan steps reading a whole table, or a rowid range of it, instead of an index,
+    and sorts of everything matched (a keyset page must come out of an index in order)."""
+    plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in plan
+            if (row[-1].startswith('SCAN ') and 'CONSTANT ROW' not in row[-1])
+            or 'INTEGER PRIMARY KEY (rowid>' in row[-1] or 'INTEGER PRIMARY KEY (rowid<' in row[-1]
+            or row[-1].startswith('USE TEMP B-TREE')]
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        app.extensions['response_cache'].enabled = False
+        with app.app_context():
+            db.create_all()
+        user_data = {
+            "email": "plans@example.com",
+            "password": "securepassword",
+            "name": "Plan Checker",
+            "city_from": "Moscow"
+        }
+        response = self.app.post('/api/v2/users', json=user_data)
+        if response.status_code == 201:
+            self.user_id = json.loads(response.data)['user']['id']
+        else:
+            users = json.loads(self.app.get('/api/v2/users/search?q=Plan Checker').data)['users']
+            self.user_id = users[0]['id']
+        job_data = {
+            "job_title": "Planned job",
+            "team_leader_id": self.user_id,
+            "work_size": 15,
+            "collaborators": str(self.user_id),
+            "category_ids": [1, 2]
+        }
+        self.job_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+
+    def tearDown(self):
+        app.extensions['response_cache'].enabled = True
+        with app.app_context():
+            db.session.remove()
+
+    def capture_selects(self, url):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and not executemany:
+                statements.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            response = self.app.get(url)
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(response.status_code, 200, url)
+        return statements
+
+    def test_hot_queries_use_indexes(self):
+        for template in HOT_ENDPOINTS:
+            url = template.format(user_id=self.user_id, job_id=self.job_id)
+            statements = self.capture_selects(url)
+            self.assertTrue(statements, url)
+            with app.app_context():
+                with db.engine.connect() as connection:
+                    for statement, parameters in statements:
+                        with self.subTest(url=url, statement=statement):
+                            scans = full_scans(connection, statement, parameters)
+                            if template in PAGINATION_ENDPOINTS:
+                                scans = [step for step in scans if step not in ROWID_WALKS]
+                            if template in SORTING_ENDPOINTS:
+                                scans = [step for step in scans if not step.startswith('USE TEMP B-TREE')]
+                            self.assertEqual(scans, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import re
+
+from sqlalchemy import DDL, event, text
+from models import db, Jobs, User, Department, job_collaborator
+
+COLLABORATOR_NAMES = (
+    "(SELECT coalesce(group_concat(u.name, ' '), '') FROM job_collaborator jc "
+    'JOIN "user" u ON u.id = jc.user_id WHERE jc.job_id = {job_id})'
+)
+
+CREATE_JOBS_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(job_title, collaborator_names, prefix='3')"
+)
+
+JOBS_FTS_DDL = [
+    CREATE_JOBS_FTS,
+    'CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON jobs BEGIN '
+    'INSERT INTO jobs_fts (rowid, job_title, collaborator_names) '
+    f'VALUES (new.id, new.job_title, {COLLABORATOR_NAMES.format(job_id="new.id")}); END',
+    'CREATE TRIGGER IF NOT EXISTS jobs_fts_update AFTER UPDATE OF job_title ON jobs BEGIN '
+    'UPDATE jobs_fts SET job_title = new.job_title WHERE rowid = new.id; END',
+    'CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON jobs BEGIN '
+    'DELETE FROM jobs_fts WHERE rowid = old.id; END',
+]
+
+COLLABORATOR_FTS_DDL = [
+    CREATE_JOBS_FTS,
+    'CREATE TRIGGER IF NOT EXISTS job_collaborator_fts_insert AFTER INSERT ON job_collaborator BEGIN '
+    f'UPDATE jobs_fts SET collaborator_names = {COLLABORATOR_NAMES.format(job_id="new.job_id")} '
+    'WHERE rowid = new.job_id; END',
+    'CREATE TRIGGER IF NOT EXISTS job_collaborator_fts_delete AFTER DELETE ON job_collaborator BEGIN '
+    f'UPDATE jobs_fts SET collaborator_names = {COLLABORATOR_NAMES.format(job_id="old.job_id")} '
+    'WHERE rowid = old.job_id; END',
+]
+
+USER_FTS_DDL = [CREATE_JOBS_FTS] + [
+    f'CREATE TRIGGER IF NOT EXISTS user_fts_{name} AFTER {trigger_event} ON "user" BEGIN '
+    f'UPDATE jobs_fts SET collaborator_names = {COLLABORATOR_NAMES.format(job_id="jobs_fts.rowid")} '
+    f'WHERE rowid IN (SELECT job_id FROM job_collaborator WHERE user_id = {row}.id); END'
+    for name, trigger_event, row in (('insert', 'INSERT', 'new'), ('update', 'UPDATE OF name', 'new'),
+                                     ('delete', 'DELETE', 'old'))
+]
+
+DEPARTMENTS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS departments_fts USING fts5(title, members, prefix='3')",
+    'CREATE TRIGGER IF NOT EXISTS departments_fts_insert AFTER INSERT ON department BEGIN '
+    'INSERT INTO departments_fts (rowid, title, members) VALUES (new.id, new.title, new.members); END',
+    'CREATE TRIGGER IF NOT EXISTS departments_fts_update AFTER UPDATE OF title, members ON department BEGIN '
+    'UPDATE departments_fts SET title = new.title, members = new.members WHERE rowid = new.id; END',
+    'CREATE TRIGGER IF NOT EXISTS departments_fts_delete AFTER DELETE ON department BEGIN '
+    'DELETE FROM departments_fts WHERE rowid = old.id; END',
+]
+
+SEARCH_DDL = {
+    Jobs.__table__: (JOBS_FTS_DDL, 'jobs_fts'),
+    job_collaborator: (COLLABORATOR_FTS_DDL, None),
+    User.__table__: (USER_FTS_DDL, None),
+    Department.__table__: (DEPARTMENTS_FTS_DDL, 'departments_fts'),
+}
+
+for table, (statements, fts_table) in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    if fts_table:
+        event.listen(table, 'before_drop', DDL(f'DROP TABLE IF EXISTS {fts_table}').execute_if(dialect='sqlite'))
+
+
+def install_search_indexes(connection):
+    tables = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+    if not {'jobs', 'job_collaborator', 'user', 'department'} <= tables:
+        return
+    for statement in (*JOBS_FTS_DDL, *COLLABORATOR_FTS_DDL, *USER_FTS_DDL, *DEPARTMENTS_FTS_DDL):
+        connection.execute(text(statement))
+    rebuild_search_indexes(connection)
+
+
+def rebuild_search_indexes(connection):
+    # Recreating the tables is much cheaper than DELETE on a large index, and bulk
+    # inserts run faster with automerge off followed by a single optimize.
+    for fts_table, create, fill in (
+        ('jobs_fts', CREATE_JOBS_FTS,
+         'INSERT INTO jobs_fts (rowid, job_title, collaborator_names) '
+         f'SELECT jobs.id, jobs.job_title, {COLLABORATOR_NAMES.format(job_id="jobs.id")} FROM jobs'),
+        ('departments_fts', DEPARTMENTS_FTS_DDL[0],
+         'INSERT INTO departments_fts (rowid, title, members) SELECT id, title, members FROM department'),
+    ):
+        connection.execute(text(f'DROP TABLE IF EXISTS {fts_table}'))
+        connection.execute(text(create))
+        connection.execute(text(f"INSERT INTO {fts_table} ({fts_table}, rank) VALUES ('automerge', 0)"))
+        connection.execute(text(fill))
+        connection.execute(text(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('optimize')"))
+        connection.execute(text(f"INSERT INTO {fts_table} ({fts_table}, rank) VALUES ('automerge', 4)"))
+
+
+def fts_query(value):
+    words = re.findall(r'\w+', value or '')
+    terms = [f'"{word}"' for word in words]
+    if words and len(words[-1]) >= 3:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search(fts_table, value, limit, offset):
+    query = fts_query(value)
+    if not query:
+        return [], None
+    rows = db.session.execute(
+        text(f'SELECT rowid, bm25({fts_table}) AS score FROM {fts_table} WHERE {fts_table} MATCH :query '
+             'ORDER BY score LIMIT :limit OFFSET :offset'),
+        {'query': query, 'limit': limit + 1, 'offset': offset}
+    ).all()
+    next_offset = offset + limit if len(rows) > limit else None
+    return [(row.rowid, row.score) for row in rows[:limit]], next_offset
@@ -0,0 +1,89 @@
+import json
+
+from flask import make_response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def compile_fields(fields):
+    attributes = ', '.join(f'{name!r}: obj.{name}' for name in fields)
+    positions = ', '.join(f'{name!r}: row[{index}]' for index, name in enumerate(fields))
+    source = (f'def dump_fields(obj):\n    return {{{attributes}}}\n'
+              f'def dump_row(row):\n    return {{{positions}}}\n')
+    namespace = {}
+    exec(compile(source, f'<serializer {",".join(fields)}>', 'exec'), namespace)
+    return namespace['dump_fields'], namespace['dump_row']
+
+
+class Serializer:
+    def __init__(self, fields, **computed):
+        self.fields = tuple(fields)
+        self.computed = computed
+        self._dump_fields, self._dump_row = compile_fields(self.fields)
+
+    def columns(self, model):
+        return [getattr(model, name) for name in self.fields]
+
+    def dump(self, obj, **extra):
+        data = self._dump_fields(obj)
+        for name, compute in self.computed.items():
+            if name not in extra:
+                data[name] = compute(obj)
+        if extra:
+            data.update(extra)
+        return data
+
+    def dump_row(self, row, **extra):
+        data = self._dump_row(row)
+        if extra:
+            data.update(extra)
+        return data
+
+    def dump_many(self, objects):
+        return [self.dump(obj) for obj in objects]
+
+    def dump_rows(self, rows):
+        dump_row = self._dump_row
+        return [dump_row(row) for row in rows]
+
+    def encode(self, obj, **extra):
+        return dumps(self.dump(obj, **extra))
+
+
+JOB_FIELDS = ('id', 'job_title', 'team_leader_id', 'work_size', 'collaborators', 'is_finished')
+
+job_schema = Serializer(JOB_FIELDS, categories=lambda job: [category.name for category in job.categories])
+job_v1_schema = Serializer(JOB_FIELDS, categories=lambda job: [category.id for category in job.categories])
+user_schema = Serializer(('id', 'email', 'name', 'city_from'))
+user_v1_schema = Serializer(('id', 'email', 'name'), jobs=lambda user: [job.id for job in user.jobs])
+user_summary_schema = Serializer(('id', 'name', 'email'))
+department_schema = Serializer(('id', 'title', 'chief_id', 'members', 'email'))
+
+
+def output_json(data, code, headers=None):
+    response = make_response(dumps(data) + b'\n', code)
+    response.headers.extend(headers or {})
+    response.mimetype = 'application/json'
+    return response
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
@@ -0,0 +1,179 @@
+from collections import defaultdict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, event, func, inspect
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Jobs, User, Category, Department, job_category, LeaderJobStats, CategoryJobStats
+
+STAT_COLUMNS = ('jobs_count', 'finished_count', 'work_size_total')
+JOB_STAT_FIELDS = ('team_leader_id', 'work_size', 'is_finished')
+
+
+class StatsDelta:
+    def __init__(self):
+        self.leaders = defaultdict(lambda: [0, 0, 0])
+        self.categories = defaultdict(lambda: [0, 0, 0])
+
+    def add(self, team_leader_id, category_ids, work_size, is_finished, sign=1):
+        groups = [self.categories[category_id] for category_id in category_ids]
+        if team_leader_id is not None:
+            groups.append(self.leaders[team_leader_id])
+        for totals in groups:
+            totals[0] += sign
+            totals[1] += sign if is_finished else 0
+            totals[2] += sign * (work_size or 0)
+
+    def remove(self, team_leader_id, category_ids, work_size, is_finished):
+        self.add(team_leader_id, category_ids, work_size, is_finished, sign=-1)
+
+    def apply(self, connection):
+        for model, key, deltas in ((LeaderJobStats, LeaderJobStats.team_leader_id, self.leaders),
+                                   (CategoryJobStats, CategoryJobStats.category_id, self.categories)):
+            rows = [{key.name: group_id, **dict(zip(STAT_COLUMNS, totals))}
+                    for group_id, totals in deltas.items() if any(totals)]
+            if not rows:
+                continue
+            statement = insert(model)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[key],
+                set_={column: getattr(model, column) + statement.excluded[column] for column in STAT_COLUMNS}
+            ), rows)
+            connection.execute(delete(model).where(key.in_([row[key.name] for row in rows]),
+                                                   model.jobs_count <= 0))
+
+
+def job_stat_values(connection, job_ids):
+    jobs = Jobs.__table__
+    job_ids = list(job_ids)
+    values = {}
+    for start in range(0, len(job_ids), 900):
+        chunk = job_ids[start:start + 900]
+        rows = connection.execute(
+            db.select(jobs.c.id, *(jobs.c[field] for field in JOB_STAT_FIELDS)).where(jobs.c.id.in_(chunk))
+        )
+        for job_id, team_leader_id, work_size, is_finished in rows:
+            values[job_id] = [team_leader_id, set(), work_size, is_finished]
+        links = connection.execute(
+            db.select(job_category.c.job_id, job_category.c.category_id).where(job_category.c.job_id.in_(chunk))
+        )
+        for job_id, category_id in links:
+            values[job_id][1].add(category_id)
+    return values
+
+
+def rebuild_stats(connection):
+    jobs = Jobs.__table__
+    finished = func.coalesce(func.sum(case((jobs.c.is_finished, 1), else_=0)), 0)
+    work_size = func.coalesce(func.sum(jobs.c.work_size), 0)
+    connection.execute(delete(LeaderJobStats))
+    connection.execute(db.insert(LeaderJobStats).from_select(
+        ['team_leader_id', *STAT_COLUMNS],
+        db.select(jobs.c.team_leader_id, func.count(), finished, work_size).group_by(jobs.c.team_leader_id)
+    ))
+    connection.execute(delete(CategoryJobStats))
+    connection.execute(db.insert(CategoryJobStats).from_select(
+        ['category_id', *STAT_COLUMNS],
+        db.select(job_category.c.category_id, func.count(), finished, work_size)
+        .join(jobs, jobs.c.id == job_category.c.job_id)
+        .group_by(job_category.c.category_id)
+    ))
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the job statistics tables from the jobs table."""
+    with db.engine.begin() as connection:
+        rebuild_stats(connection)
+    click.echo('Job statistics rebuilt.')
+
+
+def totals_dict(row):
+    return {
+        'jobs': row.jobs_count,
+        'finished': row.finished_count,
+        'unfinished': row.jobs_count - row.finished_count,
+        'work_size': row.work_size_total
+    }
+
+
+def stats_totals():
+    row = db.session.execute(db.select(
+        *(func.coalesce(func.sum(getattr(LeaderJobStats, column)), 0).label(column) for column in STAT_COLUMNS)
+    )).one()
+    return totals_dict(row)
+
+
+def leader_stats():
+    rows = db.session.execute(
+        db.select(LeaderJobStats, User.name)
+        .outerjoin(User, User.id == LeaderJobStats.team_leader_id)
+        .order_by(LeaderJobStats.team_leader_id)
+    )
+    return [{'team_leader_id': stats.team_leader_id, 'name': name, **totals_dict(stats)} for stats, name in rows]
+
+
+def category_stats():
+    rows = db.session.execute(
+        db.select(CategoryJobStats, Category.name)
+        .outerjoin(Category, Category.id == CategoryJobStats.category_id)
+        .order_by(CategoryJobStats.category_id)
+    )
+    return [{'category_id': stats.category_id, 'name': name, **totals_dict(stats)} for stats, name in rows]
+
+
+def department_chief_stats():
+    columns = [func.coalesce(getattr(LeaderJobStats, column), 0).label(column) for column in STAT_COLUMNS]
+    rows = db.session.execute(
+        db.select(Department.id, Department.title, Department.chief_id, *columns)
+        .outerjoin(LeaderJobStats, LeaderJobStats.team_leader_id == Department.chief_id)
+        .order_by(Department.id)
+    )
+    return [{'department_id': row.id, 'title': row.title, 'chief_id': row.chief_id, **totals_dict(row)}
+            for row in rows]
+
+
+def _job_values(session, instance, previous):
+    state = inspect(instance)
+    values = []
+    for name in JOB_STAT_FIELDS:
+        history = state.attrs[name].history
+        current = history.deleted if previous else history.added
+        current = current or history.unchanged
+        if previous and not current:
+            row = session.execute(
+                db.select(*(getattr(Jobs, field) for field in JOB_STAT_FIELDS)).where(Jobs.id == instance.id)
+            ).one()
+            values = list(row)
+            break
+        values.append(current[0] if current else None)
+    if 'categories' in state.unloaded:
+        instance.categories
+    history = state.attrs.categories.history
+    categories = (*history.unchanged, *(history.deleted if previous else history.added))
+    team_leader_id, work_size, is_finished = values
+    return team_leader_id, {category.id for category in categories}, work_size, is_finished
+
+
+def _stats_changed(instance):
+    state = inspect(instance)
+    return any(state.attrs[name].history.has_changes() for name in (*JOB_STAT_FIELDS, 'categories'))
+
+
+@event.listens_for(db.session, 'before_flush')
+def _count_changed_jobs(session, flush_context, instances):
+    delta = StatsDelta()
+    with session.no_autoflush:
+        for instance in session.new:
+            if isinstance(instance, Jobs):
+                delta.add(*_job_values(session, instance, previous=False))
+        for instance in session.dirty:
+            if isinstance(instance, Jobs) and _stats_changed(instance):
+                delta.remove(*_job_values(session, instance, previous=True))
+                delta.add(*_job_values(session, instance, previous=False))
+        for instance in session.deleted:
+            if isinstance(instance, Jobs):
+                delta.remove(*_job_values(session, instance, previous=True))
+    if delta.leaders or delta.categories:
+        delta.apply(session.connection())
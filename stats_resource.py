@@ -0,0 +1,37 @@
+from flask_restful import Resource
+from models import db
+from stats import stats_totals, leader_stats, category_stats, department_chief_stats, rebuild_stats
+from tasks import task_queue, task_handler
+
+STATS_GROUPS = {
+    'leaders': leader_stats,
+    'categories': category_stats,
+    'departments': department_chief_stats,
+}
+
+
+class StatsResource(Resource):
+    def get(self, group=None):
+        if group is None:
+            return {'totals': stats_totals()}, 200
+        if group not in STATS_GROUPS:
+            return {'error': f"Unknown statistics group: {group}"}, 404
+        try:
+            return {group: STATS_GROUPS[group]()}, 200
+        except Exception as e:
+            return {'error': f"Database error: {str(e)}"}, 500
+
+    def post(self, group=None):
+        """Recompute the statistics tables from the jobs table in the background."""
+        if group is not None:
+            return {'error': 'Statistics are rebuilt as a whole'}, 405
+        return task_queue.accepted(task_queue.submit('rebuild_stats', {}))
+
+
+@task_handler('rebuild_stats')
+def rebuild_stats_task(run, payload):
+    rebuild_stats(db.session.connection())
+    # Commits the rebuild together with the lease check: an attempt that lost its
+    # task to another worker rolls back instead.
+    run.renew_lease()
+    return {'totals': stats_totals()}
@@ -0,0 +1,343 @@
+"""Persistent background tasks.
+
+Long-running operations (bulk job imports, exports, statistics rebuilds) are
+stored as rows of the ``task`` table and answered with ``202 Accepted`` and a
+Location of ``/api/v2/tasks/<id>``. A serving process runs TASK_WORKERS worker
+threads which claim due tasks with a conditional UPDATE, so all gunicorn workers
+can share the table. Workers are started with ``app.extensions['task_queue'].start()``:
+gunicorn.conf.py does it after forking each worker, asgi.py on lifespan startup and
+``python main.py`` before serving. With TASK_AUTOSTART (set in PRODUCTION_CONFIG)
+a process that has no workers yet starts them when it submits its first task, which
+covers other WSGI servers; tasks left queued by a previous run are then picked up
+only once the process submits a task of its own. Apps built for tests, benchmarks
+or CLI commands never poll the database in the background.
+
+A claimed task holds a lease of TASK_LEASE_SECONDS that is renewed whenever the
+handler saves progress or calls ``run.renew_lease()``, so long handlers renew it
+after every batch of work. When the process running a task dies, the task is
+claimed again after the lease expires, so queued and interrupted tasks survive
+restarts. Progress that grows with the work (like the outcomes of each committed
+chunk) is appended to ``task_progress`` rather than rewritten into
+``task.progress``. A handler that raises is retried after
+TASK_RETRY_BACKOFF * 2 ** (attempt - 1) seconds, up to the task's max_attempts.
+Handlers may therefore run more than once and resume from ``run.progress``.
+"""
+import os
+import threading
+from datetime import timedelta
+
+from flask import current_app, jsonify, request, send_file, url_for
+from flask_restful import Resource
+from sqlalchemy import and_, or_
+
+from models import db, Task, TaskProgress, utcnow
+from listing import parse_bool_arg, ndjson_lines
+from serializers import Serializer, dumps
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    from json import loads
+
+TASK_HANDLERS = {}
+
+
+class TaskLost(Exception):
+    """Raised when another worker has claimed the task after its lease expired."""
+
+
+def task_handler(kind):
+    """Register ``function(run, payload)`` as the handler of tasks of ``kind``."""
+    def register(function):
+        TASK_HANDLERS[kind] = function
+        return function
+    return register
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+task_schema = Serializer(
+    ('id', 'kind', 'status', 'attempts', 'max_attempts', 'error'),
+    created_at=lambda task: isoformat(task.created_at),
+    started_at=lambda task: isoformat(task.started_at),
+    finished_at=lambda task: isoformat(task.finished_at),
+    run_after=lambda task: isoformat(task.run_after) if task.status == 'queued' else None,
+    result=lambda task: loads(task.result) if task.result else None,
+)
+
+
+class TaskRun:
+    """What a handler gets to know about the attempt it is running."""
+
+    def __init__(self, queue, task):
+        self.queue = queue
+        self.task_id = task.id
+        self.attempt = task.attempts
+        self.progress = loads(task.progress) if task.progress else None
+
+    def renew_lease(self):
+        """Extend the lease and commit; raises TaskLost if another worker has taken over."""
+        self._update_running(lease_expires=self.queue.lease_deadline())
+        db.session.commit()
+
+    def _update_running(self, **values):
+        updated = db.session.execute(
+            db.update(Task)
+            .where(Task.id == self.task_id, Task.status == 'running', Task.attempts == self.attempt)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount != 1:
+            raise TaskLost()
+
+    def save_progress(self, progress, entry=None):
+        """Record ``progress`` and renew the lease as part of the caller's next commit.
+
+        ``entry``, if given, is appended to the task's progress log in the same
+        transaction; ``progress_log()`` returns the entries saved so far.
+        """
+        self._update_running(progress=dumps(progress).decode(), lease_expires=self.queue.lease_deadline())
+        if entry is not None:
+            db.session.add(TaskProgress(task_id=self.task_id, entry=dumps(entry).decode()))
+        self.progress = progress
+
+    def progress_log(self):
+        entries = db.session.execute(
+            db.select(TaskProgress.entry).where(TaskProgress.task_id == self.task_id).order_by(TaskProgress.id)
+        ).scalars()
+        return [loads(entry) for entry in entries]
+
+    def result_path(self, extension):
+        os.makedirs(self.queue.result_dir, exist_ok=True)
+        return os.path.join(self.queue.result_dir, f'{self.task_id}.{extension}')
+
+
+class AppTaskQueue:
+    """The settings and worker threads of one app, kept in ``app.extensions['task_queue']``."""
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get('TASK_WORKERS', 2)
+        self.poll_interval = app.config.get('TASK_POLL_INTERVAL', 1.0)
+        self.max_attempts = app.config.get('TASK_MAX_ATTEMPTS', 3)
+        self.retry_backoff = app.config.get('TASK_RETRY_BACKOFF', 2.0)
+        self.lease_seconds = app.config.get('TASK_LEASE_SECONDS', 300)
+        self.autostart = app.config.get('TASK_AUTOSTART', False)
+        self.result_dir = app.config.get('TASK_RESULT_DIR') or os.path.join(app.instance_path, 'task_results')
+        self._threads = []
+        self._pid = None
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def lease_deadline(self):
+        return utcnow() + timedelta(seconds=self.lease_seconds)
+
+    def submit(self, kind, payload, max_attempts=None):
+        """Queue a task in its own transaction and return it; running workers are woken up.
+
+        With TASK_AUTOSTART the workers of this process are started first if needed.
+        """
+        if kind not in TASK_HANDLERS:
+            raise ValueError(f"Unknown task kind: {kind}")
+        task = Task(kind=kind, payload=dumps(payload).decode(),
+                    max_attempts=max_attempts or self.max_attempts)
+        db.session.add(task)
+        db.session.commit()
+        if self.autostart:
+            self.start()
+        self._wakeup.set()
+        return task
+
+    def accepted(self, task):
+        """The ``202 Accepted`` answer for a just-submitted task."""
+        location = url_for('taskresource', task_id=task.id)
+        return {'task': task_schema.dump(task)}, 202, {'Location': location}
+
+    def start(self):
+        """Start this process's workers; a forked child starts its own."""
+        if not self.workers or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._work, args=(self._stopping,), name=f'task-worker-{number}', daemon=True)
+                for number in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if timeout is not None:
+            for thread in self._threads:
+                thread.join(timeout)
+        self._threads = []
+        self._pid = None
+
+    def _work(self, stopping):
+        while not stopping.is_set():
+            try:
+                with self.app.app_context():
+                    ran = self.run_next()
+            except Exception:
+                self.app.logger.exception('Task worker failed to claim a task')
+                ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claimable(self, now):
+        return or_(
+            and_(Task.status == 'queued', Task.run_after <= now),
+            and_(Task.status == 'running', Task.lease_expires < now),
+        )
+
+    def claim(self):
+        """Take the next due task, or one whose lease expired, and return it (or None)."""
+        while True:
+            now = utcnow()
+            task_id = db.session.execute(
+                db.select(Task.id).where(self._claimable(now)).order_by(Task.run_after, Task.id).limit(1)
+            ).scalar()
+            if task_id is None:
+                db.session.rollback()
+                return None
+            claimed = db.session.execute(
+                db.update(Task)
+                .where(Task.id == task_id, self._claimable(now))
+                .values(status='running', attempts=Task.attempts + 1, started_at=now, error=None,
+                        lease_expires=now + timedelta(seconds=self.lease_seconds))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Task, task_id)
+
+    def run_next(self):
+        """Claim and run one task; returns False when nothing was due."""
+        task = self.claim()
+        if task is None:
+            return False
+        if task.attempts > task.max_attempts:
+            return self.finish(task, 'failed', error='Lease expired on the last attempt')
+        run = TaskRun(self, task)
+        try:
+            result = TASK_HANDLERS[task.kind](run, loads(task.payload))
+        except TaskLost:
+            db.session.rollback()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Task %s (%s) failed', task.id, task.kind)
+            if task.attempts < task.max_attempts:
+                return self.retry(task, str(e))
+            return self.finish(task, 'failed', error=str(e))
+        return self.finish(task, 'succeeded', result=result)
+
+    def retry(self, task, error):
+        delay = self.retry_backoff * 2 ** (task.attempts - 1)
+        return self._update(task, status='queued', error=error, lease_expires=None,
+                            run_after=utcnow() + timedelta(seconds=delay))
+
+    def finish(self, task, status, result=None, error=None):
+        db.session.execute(db.delete(TaskProgress).where(TaskProgress.task_id == task.id))
+        return self._update(task, status=status, error=error, lease_expires=None, finished_at=utcnow(),
+                            result=dumps(result).decode() if result is not None else None)
+
+    def _update(self, task, **values):
+        db.session.execute(
+            db.update(Task)
+            .where(Task.id == task.id, Task.status == 'running', Task.attempts == task.attempts)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return True
+
+    def run_pending(self):
+        """Run every due task in the calling thread (for TASK_WORKERS = 0 and tests)."""
+        count = 0
+        while self.run_next():
+            count += 1
+        return count
+
+    def result_view(self, task_id):
+        task = db.session.get(Task, task_id)
+        if task is None:
+            return jsonify({'error': 'Task not found'}), 404
+        result = loads(task.result) if task.result else {}
+        if task.status != 'succeeded' or 'file' not in result:
+            return jsonify({'error': 'Task has no result file'}), 404
+        path = os.path.join(self.result_dir, os.path.basename(result['file']))
+        if not os.path.exists(path):
+            return jsonify({'error': 'Result file has been removed'}), 410
+        return send_file(path, mimetype=result.get('mimetype', 'application/octet-stream'), as_attachment=True,
+                         download_name=result['file'])
+
+
+class TaskQueue:
+    """Gives views and task handlers the task queue of the current app."""
+
+    def init_app(self, app, db):
+        queue = app.extensions['task_queue'] = AppTaskQueue(app)
+        app.add_url_rule('/api/v2/tasks/<int:task_id>/result', 'task_result', queue.result_view)
+
+    @property
+    def current(self):
+        return current_app.extensions['task_queue']
+
+    def submit(self, kind, payload, max_attempts=None):
+        return self.current.submit(kind, payload, max_attempts)
+
+    def accepted(self, task):
+        return self.current.accepted(task)
+
+
+class TaskResource(Resource):
+    def get(self, task_id):
+        task = db.session.get(Task, task_id)
+        if task is None:
+            return {'error': 'Task not found'}, 404
+        data = task_schema.dump(task)
+        if data['result'] and 'file' in data['result']:
+            data['result']['download'] = url_for('task_result', task_id=task.id)
+        return {'task': data}, 200
+
+
+def write_ndjson_result(run, partitions):
+    """Write batches of rows to the task's result file and describe it as the task result.
+
+    The lease is renewed after every batch, so ``partitions`` must not keep a cursor
+    open between batches (see ``listing.paged_partitions``). Each attempt writes its
+    own temporary file, so an attempt whose lease expired cannot clobber the next one.
+    """
+    path = run.result_path('ndjson')
+    temporary = f'{path}.{run.attempt}.tmp'
+    rows = 0
+    try:
+        with open(temporary, 'wb') as file:
+            for batch in partitions:
+                file.write(ndjson_lines(batch))
+                rows += len(batch)
+                run.renew_lease()
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return {'rows': rows, 'file': os.path.basename(path), 'mimetype': 'application/x-ndjson'}
+
+
+def wants_async(args):
+    """``?async=true`` or ``Prefer: respond-async`` asks for a task instead of an inline answer."""
+    return parse_bool_arg(args, 'async') or 'respond-async' in request.headers.get('Prefer', '')
+
+
+task_queue = TaskQueue()
@@ -0,0 +1,183 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from main import create_app
+from models import db, Jobs, Task, TaskProgress, utcnow
+from bulk_jobs import run_bulk
+from tasks import task_handler, TaskRun, TaskLost, TASK_HANDLERS
+
+FAILURES = {'remaining': 0}
+
+
+@task_handler('test_flaky')
+def flaky_task(run, payload):
+    if FAILURES['remaining']:
+        FAILURES['remaining'] -= 1
+        raise RuntimeError('temporarily unavailable')
+    return {'attempt': run.attempt}
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class TestTaskQueue(unittest.TestCase):
+    def setUp(self):
+        self.results = tempfile.TemporaryDirectory()
+        self.app = create_app({'TASK_WORKERS': 0, 'TASK_RESULT_DIR': self.results.name, 'TASK_RETRY_BACKOFF': 0})
+        self.queue = self.app.extensions['task_queue']
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            self.first_task_id = db.session.query(db.func.max(Task.id)).scalar() or 0
+            self.first_job_id = db.session.query(db.func.max(Jobs.id)).scalar() or 0
+
+    def tearDown(self):
+        with self.app.app_context():
+            job_ids = db.session.execute(db.select(Jobs.id).where(Jobs.id > self.first_job_id)).scalars().all()
+            run_bulk([{'op': 'delete', 'id': job_id} for job_id in job_ids])
+            db.session.execute(db.delete(TaskProgress).where(TaskProgress.task_id > self.first_task_id))
+            db.session.execute(db.delete(Task).where(Task.id > self.first_task_id))
+            db.session.commit()
+        self.queue.stop(timeout=5)
+        self.results.cleanup()
+
+    def run_tasks(self):
+        with self.app.app_context():
+            return self.queue.run_pending()
+
+    def new_jobs(self, count):
+        return [{'job_title': f'Queued job {number}', 'team_leader_id': 1, 'work_size': number}
+                for number in range(1, count + 1)]
+
+    def test_bulk_import_as_task(self):
+        response = self.client.post('/api/v2/jobs/bulk?async=true', json=self.new_jobs(3))
+        self.assertEqual(response.status_code, 202)
+        task = response.get_json()['task']
+        self.assertEqual((task['kind'], task['status']), ('bulk_jobs', 'queued'))
+        self.assertTrue(response.headers['Location'].endswith(f"/api/v2/tasks/{task['id']}"))
+
+        self.assertEqual(self.run_tasks(), 1)
+        task = self.client.get(response.headers['Location']).get_json()['task']
+        self.assertEqual(task['status'], 'succeeded')
+        self.assertEqual(task['result']['summary']['created'], 3)
+        self.assertEqual(self.client.get('/api/v2/tasks/999999').status_code, 404)
+
+    def test_autostart_on_first_submit(self):
+        self.queue.workers, self.queue.autostart, self.queue.poll_interval = 1, True, 0.05
+        response = self.client.post('/api/v2/jobs/bulk?async=true', json=self.new_jobs(1))
+        self.assertEqual(response.status_code, 202)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            task = self.client.get(response.headers['Location']).get_json()['task']
+            if task['status'] == 'succeeded':
+                break
+            time.sleep(0.05)
+        self.assertEqual(task['status'], 'succeeded')
+        self.assertEqual(self.queue._pid, os.getpid())
+
+    def test_failed_tasks_are_retried_until_max_attempts(self):
+        FAILURES['remaining'] = 1
+        with self.app.app_context():
+            task_id = self.queue.submit('test_flaky', {}).id
+        self.assertEqual(self.run_tasks(), 2)
+        task = self.client.get(f'/api/v2/tasks/{task_id}').get_json()['task']
+        self.assertEqual((task['status'], task['attempts'], task['result']), ('succeeded', 2, {'attempt': 2}))
+
+        FAILURES['remaining'] = 5
+        with self.app.app_context():
+            self.queue.retry_backoff = 60
+            task_id = self.queue.submit('test_flaky', {}, max_attempts=2).id
+            self.assertEqual(self.queue.run_pending(), 1)
+            task = db.session.get(Task, task_id)
+            self.assertEqual((task.status, task.error), ('queued', 'temporarily unavailable'))
+            self.assertGreater(task.run_after, utcnow() + timedelta(seconds=50))
+            task.run_after = utcnow()
+            db.session.commit()
+            self.assertEqual(self.queue.run_pending(), 1)
+        task = self.client.get(f'/api/v2/tasks/{task_id}').get_json()['task']
+        self.assertEqual((task['status'], task['attempts']), ('failed', 2))
+
+    def test_interrupted_bulk_import_resumes_after_lease_expires(self):
+        response = self.client.post('/api/v2/jobs/bulk?async=true&chunk_size=2', json=self.new_jobs(5))
+        task_id = response.get_json()['task']['id']
+        with self.app.app_context():
+            task = self.queue.claim()
+            run = TaskRun(self.queue, task)
+            save_progress = run.save_progress
+
+            def crash_on_second_chunk(progress, entry):
+                if run.progress is not None:
+                    raise Interrupted()
+                save_progress(progress, entry)
+
+            run.save_progress = crash_on_second_chunk
+            with self.assertRaises(Interrupted):
+                run_bulk(self.new_jobs(5), 2, checkpoint=lambda applied, settled:
+                         run.save_progress({'applied': applied}, settled))
+            db.session.rollback()
+            self.assertEqual(Jobs.query.filter(Jobs.id > self.first_job_id).count(), 2)
+            self.assertEqual([len(entry) for entry in run.progress_log()], [2])
+
+            self.assertEqual(self.queue.run_pending(), 0)
+            db.session.execute(db.update(Task).where(Task.id == task_id).values(lease_expires=utcnow()))
+            db.session.commit()
+            self.assertEqual(self.queue.run_pending(), 1)
+            self.assertEqual(Jobs.query.filter(Jobs.id > self.first_job_id).count(), 5)
+            self.assertEqual(run.progress_log(), [])
+        task = self.client.get(f'/api/v2/tasks/{task_id}').get_json()['task']
+        self.assertEqual((task['status'], task['attempts']), ('succeeded', 2))
+        self.assertEqual(task['result']['summary']['created'], 5)
+        self.assertEqual(len({result['id'] for result in task['result']['results']}), 5)
+
+    def test_export_as_task(self):
+        for path in ('/api/v2/jobs/export', '/api/v2/users/export'):
+            with self.subTest(path=path):
+                response = self.client.post(path + '?since_id=0')
+                self.assertEqual(response.status_code, 202)
+                self.run_tasks()
+                result = self.client.get(response.headers['Location']).get_json()['task']['result']
+                download = self.client.get(result['download'])
+                self.assertEqual(download.mimetype, 'application/x-ndjson')
+                self.assertEqual(download.data, self.client.get(path).data)
+                self.assertEqual(result['rows'], len(download.data.splitlines()))
+        self.assertEqual(self.client.post('/api/v2/jobs/export?is_finished=maybe').status_code, 400)
+
+    def test_export_renews_lease_per_batch(self):
+        self.app.config['EXPORT_BATCH_SIZE'] = 1
+        self.client.post('/api/v2/jobs/bulk', json=self.new_jobs(3))
+        payload = {'args': {'since_id': str(self.first_job_id)}}
+        with self.app.app_context():
+            self.queue.submit('export_jobs', payload)
+            run = TaskRun(self.queue, self.queue.claim())
+            renewals = []
+            renew_lease = run.renew_lease
+            run.renew_lease = lambda: renewals.append(renew_lease())
+            self.assertEqual(TASK_HANDLERS['export_jobs'](run, payload)['rows'], 3)
+            self.assertEqual(len(renewals), 3)
+
+            # Another worker took the task over: this attempt stops and leaves no files.
+            db.session.execute(db.update(Task).where(Task.id == run.task_id).values(attempts=Task.attempts + 1))
+            db.session.commit()
+            with self.assertRaises(TaskLost):
+                TASK_HANDLERS['export_jobs'](run, payload)
+        self.assertEqual(os.listdir(self.results.name), [f'{run.task_id}.ndjson'])
+
+    def test_worker_threads_run_submitted_tasks(self):
+        self.queue.workers = 1
+        self.queue.start()
+        response = self.client.post('/api/v2/stats')
+        self.assertEqual(response.status_code, 202)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            task = self.client.get(response.headers['Location']).get_json()['task']
+            if task['status'] == 'succeeded':
+                break
+            time.sleep(0.05)
+        self.assertEqual(task['status'], 'succeeded')
+        self.assertEqual(task['result']['totals'], self.client.get('/api/v2/stats').get_json()['totals'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,13 @@
+from flask import request
 from flask_restful import Resource, reqparse
 from models import db, User
+from listing import parse_int_arg, ndjson_response, ndjson_lines, stream_partitions, paged_partitions
+from cache import response_cache
+from versions import conditional_response, list_validators, entity_validators
+from serializers import user_schema, user_summary_schema
+from core_lists import use_fast_path, fast_user_list
+from credentials import credentials, CredentialsBusy
+from tasks import task_queue, task_handler, write_ndjson_result
 
 parser = reqparse.RequestParser()
 parser.add_argument('email', type=str, required=True, help="Email cannot be blank!")
@@ -10,26 +18,28 @@ parser.add_argument('city_from', type=str, required=True, help="City From cannot
 
 class UsersListResource(Resource):
     def get(self):
-        users = User.query.all()
-        users_list = []
-        for user in users:
-            user_dict = {
-                'id': user.id,
-                'email': user.email,
-                'name': user.name,
-                'city_from': user.city_from
-            }
-            users_list.append(user_dict)
-        return {'users': users_list}, 200
+        return conditional_response(
+            list_validators('users-v2', ('users',)),
+            lambda etag: response_cache.json_response(response_cache.list_key('users', 'v2'), self.list_users, etag)
+        )
+
+    def list_users(self):
+        if use_fast_path('users-v2'):
+            return {'users': fast_user_list()}, 200
+        return {'users': user_schema.dump_many(User.query.all())}, 200
 
     def post(self):
         args = parser.parse_args()
         if User.query.filter_by(email=args['email']).first():
             return {'error': 'User with this email already exists'}, 400
 
+        try:
+            password = credentials.hash_password(args['password'])
+        except CredentialsBusy:
+            return {'error': 'Too many password operations in progress, retry shortly'}, 503
         new_user = User(
             email=args['email'],
-            password=args['password'],
+            password=password,
             name=args['name'],
             city_from=args['city_from']
         )
@@ -40,30 +50,23 @@ class UsersListResource(Resource):
         except Exception as e:
             db.session.rollback()
             return {'error': f"Database error: {str(e)}"}, 500
-        return {
-            'success': True,
-            'user': {
-                'id': new_user.id,
-                'email': new_user.email,
-                'name': new_user.name,
-                'city_from': new_user.city_from
-            }
-        }, 201
+        return {'success': True, 'user': user_schema.dump(new_user)}, 201
 
 
 class UsersResource(Resource):
     def get(self, user_id):
+        key = response_cache.entity_key('users', 'v2', user_id)
+        return conditional_response(
+            entity_validators(User, user_id, 'users-v2'),
+            lambda etag: response_cache.json_response(key, lambda: self.show_user(user_id), etag)
+        )
+
+    def show_user(self, user_id):
         user = User.query.get(user_id)
         if not user:
             return {'error': 'User not found'}, 404
 
-        user_dict = {
-            'id': user.id,
-            'email': user.email,
-            'name': user.name,
-            'city_from': user.city_from
-        }
-        return {'user': user_dict}, 200
+        return {'user': user_schema.dump(user)}, 200
 
     def put(self, user_id):
         user = User.query.get(user_id)
@@ -77,28 +80,21 @@ class UsersResource(Resource):
                     return {'error': "Email already exists"}, 400
                 user.email = args['email']
             if args['password']:
-                user.password = args['password']
+                credentials.set_password(user, args['password'])
             if args['name']:
                 user.name = args['name']
             if args['city_from']:
                 user.city_from = args['city_from']
         except (ValueError, TypeError):
             return {'error': "Invalid data type for one or more fields"}, 400
+        except CredentialsBusy:
+            return {'error': 'Too many password operations in progress, retry shortly'}, 503
         try:
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             return {'error': f"Database error: {str(e)}"}, 500
-        return {
-            'success': True,
-            'message': 'User updated successfully',
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': user.name,
-                'city_from': user.city_from
-            }
-        }, 200
+        return {'success': True, 'message': 'User updated successfully', 'user': user_schema.dump(user)}, 200
 
     def delete(self, user_id):
         user = User.query.get(user_id)
@@ -112,3 +108,58 @@ class UsersResource(Resource):
             db.session.rollback()
             return {'error': f"Database error: {str(e)}"}, 500
         return {'success': True, 'message': 'User deleted successfully'}, 200
+
+
+class UsersSearchResource(Resource):
+    def get(self):
+        prefix = request.args.get('q', '').strip()
+        try:
+            limit = parse_int_arg(request.args, 'limit', minimum=1) or 20
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if not prefix:
+            return {'users': []}, 200
+
+        rows = db.session.execute(
+            db.select(*user_summary_schema.columns(User))
+            .where(User.name >= prefix, User.name < prefix + '\U0010ffff')
+            .order_by(User.name)
+            .limit(min(limit, 100))
+        )
+        return {'users': user_summary_schema.dump_rows(rows)}, 200
+
+
+def user_export_partitions(since_id, read=stream_partitions):
+    statement = db.select(*user_schema.columns(User))
+    if since_id is not None:
+        statement = statement.where(User.id > since_id)
+    for partition in read(statement, User.id):
+        yield user_schema.dump_rows(partition)
+
+
+class UsersExportResource(Resource):
+    def get(self):
+        try:
+            since_id = parse_int_arg(request.args, 'since_id', minimum=0)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        def generate():
+            for rows in user_export_partitions(since_id):
+                yield ndjson_lines(rows)
+
+        return conditional_response(list_validators('users-export', ('users',)),
+                                    lambda etag: ndjson_response(generate()))
+
+    def post(self):
+        """Write the export to a file in the background; the task result links to it."""
+        try:
+            since_id = parse_int_arg(request.args, 'since_id', minimum=0)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        return task_queue.accepted(task_queue.submit('export_users', {'since_id': since_id}))
+
+
+@task_handler('export_users')
+def export_users_task(run, payload):
+    return write_ndjson_result(run, user_export_partitions(payload['since_id'], read=paged_partitions))
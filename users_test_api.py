@@ -1,7 +1,10 @@
 import unittest
 import json
-from main import app, db
-from models import User
+from main import create_app
+from models import db, User, Department
+from cache import response_cache
+
+app = create_app()
 
 
 class TestAPI(unittest.TestCase):
@@ -102,6 +105,149 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertEqual(data['error'], 'User not found')
 
+    def test_export_users_ndjson(self):
+        for index in range(3):
+            user_data = {
+                "email": f"export{index}@example.com",
+                "password": "securepassword",
+                "name": f"Export User {index}",
+                "city_from": "Moscow"
+            }
+            self.app.post('/api/v2/users', json=user_data)
+        response = self.app.get('/api/v2/users/export')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([row['email'] for row in rows],
+                         ["export0@example.com", "export1@example.com", "export2@example.com"])
+
+        response = self.app.get(f'/api/v2/users/export?since_id={rows[0]["id"]}')
+        rows = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(len(rows), 2)
+
+    def test_get_users_cache_invalidated_on_write(self):
+        self.assertEqual(json.loads(self.app.get('/api/users').data)['users'], [])
+        user_data = {
+            "email": "cached@example.com",
+            "password": "securepassword",
+            "name": "Cached User",
+            "city_from": "Moscow"
+        }
+        response = self.app.post('/api/v2/users', json=user_data)
+        user_id = json.loads(response.data)['user']['id']
+        users = json.loads(self.app.get('/api/users').data)['users']
+        self.assertEqual([user['id'] for user in users], [user_id])
+
+        self.app.get(f'/api/v2/users/{user_id}')
+        self.app.put(f'/api/users/{user_id}', json={"name": "Renamed User"})
+        response = self.app.get(f'/api/v2/users/{user_id}')
+        self.assertEqual(json.loads(response.data)['user']['name'], "Renamed User")
+
+    def test_identity_cache_invalidated_on_update(self):
+        user_data = {
+            "email": "identity@example.com",
+            "password": "securepassword",
+            "name": "Identity User",
+            "city_from": "Moscow"
+        }
+        post_response = self.app.post('/api/v2/users', json=user_data)
+        user_id = json.loads(post_response.data)['user']['id']
+        with self.app.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        self.assertIn('Hello, Identity User', self.app.get('/').data.decode())
+        self.app.put(f'/api/users/{user_id}', json={"name": "Renamed Identity"})
+        self.assertIn('Hello, Renamed Identity', self.app.get('/').data.decode())
+
+        self.app.delete(f'/api/users/{user_id}')
+        self.assertEqual(self.app.get('/').status_code, 302)
+
+    def test_search_users_by_name_prefix(self):
+        for name in ("Anna", "Andrey", "Boris"):
+            user_data = {
+                "email": f"{name.lower()}@example.com",
+                "password": "securepassword",
+                "name": name,
+                "city_from": "Moscow"
+            }
+            self.app.post('/api/v2/users', json=user_data)
+        response = self.app.get('/api/v2/users/search?q=An')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['name'] for user in data['users']], ["Andrey", "Anna"])
+
+    def test_get_user_jobs_by_collaborator(self):
+        user_data = {
+            "email": "collaborator@example.com",
+            "password": "securepassword",
+            "name": "Collaborator",
+            "city_from": "Moscow"
+        }
+        post_response = self.app.post('/api/v2/users', json=user_data)
+        user_id = json.loads(post_response.data)['user']['id']
+        job_data = {"job_title": "Shared job", "team_leader_id": 999, "work_size": 10,
+                    "collaborators": f"{user_id}, 998"}
+        shared_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+        job_data = {"job_title": "Led job", "team_leader_id": user_id, "work_size": 10, "collaborators": "998"}
+        led_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+
+        response = self.app.get(f'/api/v2/users/{user_id}/jobs')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([job['id'] for job in data['jobs']], [shared_id, led_id])
+        data = json.loads(self.app.get(f'/api/v2/users/{user_id}/jobs?role=collaborator').data)
+        self.assertEqual([job['id'] for job in data['jobs']], [shared_id])
+        data = json.loads(self.app.get(f'/api/v2/jobs?collaborator_id=998').data)
+        self.assertEqual([job['id'] for job in data['jobs']], [shared_id, led_id])
+
+        self.app.put(f'/api/jobs/{shared_id}', json={"collaborators": "998"})
+        data = json.loads(self.app.get(f'/api/v2/users/{user_id}/jobs?role=collaborator').data)
+        self.assertEqual(data['jobs'], [])
+        self.assertEqual(self.app.get('/api/v2/users/999/jobs').status_code, 404)
+
+        with app.test_request_context(f'/api/v2/users/{user_id}/jobs'):
+            key = response_cache.list_key('jobs', f'user-{user_id}', depends_on=('users',))
+        response = self.app.put(f'/api/v2/users/{user_id}', json={**user_data, "name": "Renamed"})
+        self.assertEqual(response.status_code, 200)
+        with app.test_request_context(f'/api/v2/users/{user_id}/jobs'):
+            self.assertNotEqual(response_cache.list_key('jobs', f'user-{user_id}', depends_on=('users',)), key)
+
+    def test_search_jobs_by_collaborator_name(self):
+        user_data = {
+            "email": "valentina@example.com",
+            "password": "securepassword",
+            "name": "Valentina",
+            "city_from": "Moscow"
+        }
+        post_response = self.app.post('/api/v2/users', json=user_data)
+        user_id = json.loads(post_response.data)['user']['id']
+        job_data = {"job_title": "Orbital survey", "team_leader_id": user_id, "work_size": 10,
+                    "collaborators": str(user_id)}
+        job_id = json.loads(self.app.post('/api/v2/jobs', json=job_data).data)['job']['id']
+
+        data = json.loads(self.app.get('/api/v2/jobs/search?q=valentina').data)
+        self.assertEqual([job['id'] for job in data['jobs']], [job_id])
+        self.app.put(f'/api/users/{user_id}', json={"name": "Tereshkova"})
+        self.assertEqual(json.loads(self.app.get('/api/v2/jobs/search?q=valentina').data)['jobs'], [])
+        data = json.loads(self.app.get('/api/v2/jobs/search?q=tereshkova').data)
+        self.assertEqual([job['id'] for job in data['jobs']], [job_id])
+
+    def test_search_departments(self):
+        with app.app_context():
+            db.session.add_all([
+                Department(title="Geological exploration", chief_id=1, members="1,2", email="geo@mars.org"),
+                Department(title="Terraforming", chief_id=1, members="geologists", email="terra@mars.org")
+            ])
+            db.session.commit()
+        response = self.app.get('/api/v2/departments/search?q=geolog&limit=1')
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['departments']), 1)
+        self.assertEqual(data['next_offset'], 1)
+        data = json.loads(self.app.get('/api/v2/departments/search?q=geolog&offset=1').data)
+        self.assertEqual(len(data['departments']), 1)
+        self.assertIsNone(data['next_offset'])
+
 
 if __name__ == '__main__':
     unittest.main()
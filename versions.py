@@ -0,0 +1,127 @@
+import hashlib
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Jobs, User, Category, TableVersion, utcnow
+
+VERSIONED_TABLES = {Jobs: 'jobs', User: 'users', Category: 'categories'}
+ROW_VERSIONED_MODELS = (Jobs, User)
+
+
+def bump_table_versions(connection, names):
+    now = utcnow()
+    for name in sorted(names):
+        statement = insert(TableVersion).values(name=name, version=1, updated_at=now)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[TableVersion.name],
+            set_={'version': TableVersion.version + 1, 'updated_at': now}
+        ))
+
+
+def table_versions_statement(names):
+    return (
+        db.select(TableVersion.name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.name.in_(names))
+    )
+
+
+def collect_table_versions(names, rows):
+    versions = {name: (0, None) for name in names}
+    for name, version, updated_at in rows:
+        versions[name] = (version, updated_at)
+    return versions
+
+
+def table_versions(names):
+    return collect_table_versions(names, db.session.execute(table_versions_statement(names)))
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:24]
+
+
+def list_etag(view, args, tables, versions):
+    """ETag and Last-Modified of a list view queried with ``args``, given its table versions."""
+    query = sorted(args.items(multi=True))
+    etag = make_etag(view, query, *(versions[name][0] for name in tables))
+    modified = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    return etag, max(modified) if modified else None
+
+
+def list_validators(view, tables):
+    return list_etag(view, request.args, tables, table_versions(tables))
+
+
+def entity_version_statement(model, entity_id):
+    return db.select(model.version, model.updated_at).where(model.id == entity_id)
+
+
+def entity_etag(view, entity_id, row, tables=(), versions=None):
+    """ETag and Last-Modified of an entity view, given its version row (None if it is missing)."""
+    if row is None:
+        return None, None
+    versions = versions or {}
+    etag = make_etag(view, entity_id, row.version, *(versions[name][0] for name in tables))
+    modified = [row.updated_at] + [updated_at for _, updated_at in versions.values()]
+    modified = [updated_at for updated_at in modified if updated_at is not None]
+    return etag, max(modified) if modified else None
+
+
+def entity_validators(model, entity_id, view, tables=()):
+    row = db.session.execute(entity_version_statement(model, entity_id)).first()
+    if row is None:
+        return None, None
+    return entity_etag(view, entity_id, row, tables, table_versions(tables) if tables else {})
+
+
+def matches_client_copy(if_none_match, if_modified_since, etag, last_modified):
+    if if_none_match:
+        return if_none_match.contains(etag)
+    if if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def is_not_modified(etag, last_modified):
+    return matches_client_copy(request.if_none_match, request.if_modified_since, etag, last_modified)
+
+
+def conditional_response(validators, respond):
+    """Answer 304 when the client's copy is current, else ``respond(etag)``.
+
+    ``respond`` gets the ETag so a cached body can be keyed by it: a body stored under
+    one version is never sent with the ETag of another.
+    """
+    etag, last_modified = validators
+    if etag is not None and is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = respond(etag)
+    if etag is not None and response.status_code in (200, 304):
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+    return response
+
+
+@event.listens_for(db.session, 'before_flush')
+def _touch_changed_entities(session, flush_context, instances):
+    changed_tables = set()
+    now = utcnow()
+    for instance in session.dirty:
+        name = VERSIONED_TABLES.get(type(instance))
+        if name is None:
+            continue
+        if isinstance(instance, ROW_VERSIONED_MODELS):
+            if session.is_modified(instance):
+                instance.updated_at = now
+                changed_tables.add(name)
+        elif session.is_modified(instance, include_collections=False):
+            changed_tables.add(name)
+    for instance in (*session.new, *session.deleted):
+        name = VERSIONED_TABLES.get(type(instance))
+        if name:
+            changed_tables.add(name)
+    if changed_tables:
+        bump_table_versions(session.connection(), changed_tables)
@@ -0,0 +1,15 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py
+
+or with any other WSGI server pointed at ``wsgi:application``. The app is built with
+PRODUCTION_CONFIG, so the debugger, reloader and template auto-reload are all off;
+settings can be overridden through FLASK_-prefixed environment variables, e.g.
+FLASK_DATABASE_PROFILE. FLASK_SECRET_KEY is required: the app refuses to start with
+the development key. gunicorn.conf.py starts the task workers of each worker process;
+under other servers TASK_AUTOSTART starts them when a process submits its first task
+(see tasks.py).
+"""
+from main import create_app, PRODUCTION_CONFIG
+
+application = app = create_app(PRODUCTION_CONFIG)